@@ -0,0 +1,84 @@
+import random
+from itertools import accumulate
+from typing import Iterator, List
+from langchain.schema import Document
+
+_SYLLABLES = "ka lo mi ren tas vo dur pel sin gat hu bre no fis zal te".split()
+
+# Domain words lead the vocabulary, so they are the most frequent
+_WORDS = """revenue margin growth quarter vehicle energy storage battery factory
+production delivery capacity cost price model demand supply chain software
+autonomy network inference training data policy safety principle agent tool
+memory retrieval context prompt answer evaluation benchmark latency throughput
+customer market region europe china america guidance outlook capital cash flow
+operating expense research development service charging solar grid fleet""".split()
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    """Domain words followed by pronounceable pseudo-words, size in total."""
+    words = list(_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choices(_SYLLABLES, k=rng.randint(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+
+def synthetic_documents(
+    num_chunks: int,
+    chunks_per_source: int = 100,
+    words_per_chunk: int = 150,
+    vocabulary_size: int = 50000,
+    seed: int = 0,
+) -> Iterator[Document]:
+    """
+    Yield synthetic chunks grouped by source, as DataLoader yields them.
+
+    Args:
+        num_chunks: Total number of chunks
+        chunks_per_source: Chunks sharing a source and its topic words
+        words_per_chunk: Words per chunk (150 words are about CHUNK_SIZE characters)
+        vocabulary_size: Distinct words, drawn with Zipf frequencies like real text
+        seed: Random seed; the same seed yields the same corpus
+
+    Returns:
+        Iterator over chunks with "source" and "page" metadata
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(vocabulary_size, rng)
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    for start in range(0, num_chunks, chunks_per_source):
+        source = f"synthetic/doc-{start // chunks_per_source:06d}.txt"
+        topic = [f"{rng.choice(_WORDS)}{rng.randrange(1000)}" for _ in range(5)]
+        for page in range(min(chunks_per_source, num_chunks - start)):
+            words = rng.choices(
+                vocabulary, cum_weights=cum_weights, k=words_per_chunk - 3
+            ) + rng.sample(topic, 3)
+            rng.shuffle(words)
+            yield Document(
+                page_content=" ".join(words).capitalize() + ".",
+                metadata={"source": source, "page": page},
+            )
+
+
+def sample_queries(documents: List[Document], count: int, seed: int = 0) -> List[str]:
+    """
+    Draw queries from chunk text, so each has a matching chunk in the corpus.
+
+    Args:
+        documents: Chunks to sample from
+        count: Number of queries
+        seed: Random seed
+
+    Returns:
+        Queries of about a dozen words each
+    """
+    rng = random.Random(seed)
+    queries = []
+    for doc in rng.choices(documents, k=count):
+        words = doc.page_content.split()
+        start = rng.randrange(max(len(words) - 12, 1))
+        queries.append(" ".join(words[start : start + 12]))
+    return queries
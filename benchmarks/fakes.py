@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import time
+from typing import Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src import instrumentation
+from src.llm_interface import GenerationStats
+from src.sparse_index import tokenize
+
+
+def _fraction(text: str) -> float:
+    """Map text to a stable number in [0, 1)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class FakeLLMInterface:
+    def __init__(
+        self,
+        route_latency: float = 0.3,
+        generate_latency: float = 0.8,
+        token_latency: float = 0.0,
+        answer_tokens: int = 64,
+        local_ratio: float = 0.8,
+    ):
+        """
+        Deterministic stand-in for LLMInterface with simulated latency.
+
+        Args:
+            route_latency: Seconds per local-knowledge check
+            generate_latency: Seconds per answer, before the first token when streaming
+            token_latency: Seconds between streamed tokens
+            answer_tokens: Tokens per answer
+            local_ratio: Share of queries judged answerable locally
+        """
+        self.route_latency = route_latency
+        self.generate_latency = generate_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.local_ratio = local_ratio
+        self.crew_llm = None
+
+    def check_local_knowledge(self, query: str, context: str) -> bool:
+        with instrumentation.stage("llm.route"):
+            time.sleep(self.route_latency)
+        return self._is_local(query)
+
+    async def acheck_local_knowledge(self, query: str, context: str) -> bool:
+        with instrumentation.stage("llm.route"):
+            await asyncio.sleep(self.route_latency)
+        return self._is_local(query)
+
+    def generate_answer(self, context: str, query: str) -> str:
+        with instrumentation.stage("llm.generate"):
+            time.sleep(self.generate_latency + self.token_latency * self.answer_tokens)
+        return self._answer(query)
+
+    async def agenerate_answer(self, context: str, query: str) -> str:
+        with instrumentation.stage("llm.generate"):
+            await asyncio.sleep(
+                self.generate_latency + self.token_latency * self.answer_tokens
+            )
+        return self._answer(query)
+
+    def stream_answer(
+        self, context: str, query: str, stats: Optional[GenerationStats] = None
+    ) -> Iterator[str]:
+        stats = stats if stats is not None else GenerationStats()
+        with instrumentation.stage("llm.stream"):
+            time.sleep(self.generate_latency)
+            for token in self._answer(query).split(" "):
+                if stats.first_token_at is None:
+                    stats.first_token_at = time.perf_counter()
+                else:
+                    time.sleep(self.token_latency)
+                stats.tokens += 1
+                yield token + " "
+            stats.finished_at = time.perf_counter()
+
+    def _is_local(self, query: str) -> bool:
+        return _fraction(query) < self.local_ratio
+
+    def _answer(self, query: str) -> str:
+        return " ".join(["answer"] * (self.answer_tokens - 1) + [query[:20]])
+
+
+class FakeWebAgents:
+    def __init__(self, latency: float = 5.0, content_chars: int = 4000):
+        """
+        Deterministic stand-in for WebAgents with simulated latency.
+
+        Args:
+            latency: Seconds per crew run
+            content_chars: Length of the returned content
+        """
+        self.latency = latency
+        self.content_chars = content_chars
+
+    def get_web_content(self, query: str) -> str:
+        with instrumentation.stage("web.crew"):
+            time.sleep(self.latency)
+        slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+        text = f"Source: https://example.com/{slug} Findings about {query}. "
+        return (text * (self.content_chars // len(text) + 1))[: self.content_chars]
+
+    def warm_up(self) -> None:
+        pass
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Feature-hashed bag-of-words embeddings.
+
+    Deterministic and model-free, so synthetic corpora of a million chunks
+    can be indexed in minutes. Texts sharing words get similar vectors,
+    which keeps retrieval results meaningful.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "big")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, List, Optional
+import numpy as np
+from src import instrumentation
+from src.app import RAGApplication
+from src.embeddings import LazyEmbeddings
+from src.vector_store import VectorStore
+from config.config import DATA_DIR
+from .corpus import sample_queries, synthetic_documents
+from .fakes import FakeLLMInterface, FakeWebAgents, HashEmbeddings
+
+WORKLOADS = ("ingest", "retrieve", "query", "async", "batch")
+
+# Metrics compared against a baseline, and whether higher values are better
+_COMPARED = {
+    "throughput": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+@dataclass
+class WorkloadResult:
+    name: str
+    operations: int = 0
+    seconds: float = 0.0
+    # Milliseconds per operation; empty for workloads timed as a whole
+    latencies: List[float] = field(default_factory=list)
+    peak_rss_mb: Optional[float] = None
+    # Mean milliseconds per call of each instrumented stage
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> Dict:
+        summary = {
+            "operations": self.operations,
+            "seconds": self.seconds,
+            "throughput": self.operations / self.seconds if self.seconds else 0.0,
+            "peak_rss_mb": self.peak_rss_mb,
+            "stages": self.stages,
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99])
+            summary.update(p50_ms=p50, p95_ms=p95, p99_ms=p99)
+        return summary
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident set size of this process so far."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def stage_means() -> Dict[str, float]:
+    """Return the mean milliseconds of each stage recorded since the last reset."""
+    histograms = instrumentation.metrics.snapshot()["histograms"]
+    return {
+        stage: histogram["sum"] * 1000 / histogram["count"]
+        for stage, histogram in sorted(histograms.items())
+        if histogram["count"]
+    }
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace, storage_path: str):
+        """
+        Set up an application whose LLM and web layers are offline stand-ins.
+
+        Args:
+            args: Parsed command line arguments
+            storage_path: Directory receiving the benchmark's vector store
+        """
+        self.args = args
+        vector_store = VectorStore(storage_path=storage_path)
+        if args.embeddings == "hash":
+            vector_store.embeddings = LazyEmbeddings(HashEmbeddings)
+        elif not args.embedding_cache:
+            # Cached vectors from earlier runs would hide the embedding cost
+            vector_store.embeddings = LazyEmbeddings()
+        self.app = RAGApplication(
+            vector_store=vector_store,
+            llm_interface=FakeLLMInterface(
+                route_latency=args.route_latency,
+                generate_latency=args.generate_latency,
+                token_latency=args.token_latency,
+                local_ratio=args.local_ratio,
+            ),
+            web_agents=FakeWebAgents(latency=args.web_latency),
+        )
+        if not args.semantic_cache:
+            self.app.semantic_cache = None
+        self.queries: List[str] = []
+
+    def documents(self):
+        if self.args.corpus == "synthetic":
+            return synthetic_documents(self.args.chunks, seed=self.args.seed)
+        return self.app.data_loader.load_documents(self.args.corpus)
+
+    def run(self, name: str) -> WorkloadResult:
+        """Run one workload with fresh stage metrics."""
+        instrumentation.metrics.reset()
+        result = getattr(self, f"_run_{name}")()
+        result.peak_rss_mb = peak_rss_mb()
+        result.stages = stage_means()
+        return result
+
+    def _run_ingest(self) -> WorkloadResult:
+        start = time.perf_counter()
+        chunks = 0
+
+        def counted(documents):
+            nonlocal chunks
+            for doc in documents:
+                chunks += 1
+                yield doc
+
+        self.app.vector_store.create_vector_store(counted(self.documents()))
+        return WorkloadResult("ingest", chunks, time.perf_counter() - start)
+
+    def _ensure_queries(self) -> List[str]:
+        if not self.queries:
+            # Sampling from a prefix keeps large corpora out of memory
+            sample = list(islice(self.documents(), 10000))
+            self.queries = sample_queries(
+                sample, self.args.queries, seed=self.args.seed
+            )
+        return self.queries
+
+    def _run_retrieve(self) -> WorkloadResult:
+        result = WorkloadResult("retrieve")
+        queries = self._ensure_queries()
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            self.app.vector_store.retrieve(query)
+            result.latencies.append((time.perf_counter() - query_start) * 1000)
+        result.seconds = time.perf_counter() - start
+        result.operations = len(queries)
+        return result
+
+    def _run_query(self) -> WorkloadResult:
+        result = WorkloadResult("query")
+        queries = self._ensure_queries()
+        start = time.perf_counter()
+        for index, query in enumerate(queries):
+            session_id = f"bench-{index}"
+            query_start = time.perf_counter()
+            self.app.process_query(query, session_id)
+            result.latencies.append((time.perf_counter() - query_start) * 1000)
+            self.app.end_session(session_id)
+        result.seconds = time.perf_counter() - start
+        result.operations = len(queries)
+        return result
+
+    def _run_async(self) -> WorkloadResult:
+        result = WorkloadResult("async")
+        queries = self._ensure_queries()
+
+        async def workload():
+            slots = asyncio.Semaphore(self.args.concurrency)
+
+            async def one(index: int, query: str):
+                async with slots:
+                    session_id = f"bench-async-{index}"
+                    query_start = time.perf_counter()
+                    await self.app.aprocess_query(query, session_id)
+                    result.latencies.append((time.perf_counter() - query_start) * 1000)
+                    self.app.end_session(session_id)
+
+            await asyncio.gather(*(one(i, query) for i, query in enumerate(queries)))
+
+        start = time.perf_counter()
+        asyncio.run(workload())
+        result.seconds = time.perf_counter() - start
+        result.operations = len(queries)
+        return result
+
+    def _run_batch(self) -> WorkloadResult:
+        result = WorkloadResult("batch")
+        queries = self._ensure_queries()
+        start = time.perf_counter()
+        for batch_result in self.app.process_queries(
+            queries, max_concurrency=self.args.concurrency
+        ):
+            if batch_result.error:
+                raise ValueError(batch_result.error)
+            # Completion time within the batch
+            result.latencies.append((time.perf_counter() - start) * 1000)
+        result.seconds = time.perf_counter() - start
+        result.operations = len(queries)
+        return result
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float
+) -> List[str]:
+    """
+    Print results next to a baseline and return the regressions.
+
+    Args:
+        results: Summaries of this run, by workload
+        baseline: Summaries of the baseline run, by workload
+        tolerance: Relative change allowed before a metric counts as regressed
+
+    Returns:
+        Descriptions of the metrics that regressed beyond the tolerance
+    """
+    regressions = []
+    print(
+        f"\n{'workload':<10}{'metric':<14}{'baseline':>12}{'current':>12}{'change':>9}"
+    )
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, higher_is_better in _COMPARED.items():
+            old, new = reference.get(metric), summary.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            print(
+                f"{name:<10}{metric:<14}{old:>12.2f}{new:>12.2f}{change:>+9.1%}"
+                + ("  REGRESSION" if regressed else "")
+            )
+            if regressed:
+                regressions.append(f"{name} {metric} {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingestion and queries offline, with simulated LLM and web latency"
+    )
+    parser.add_argument(
+        "--corpus",
+        default=str(DATA_DIR),
+        help="Document file, directory or glob pattern, or 'synthetic'",
+    )
+    parser.add_argument(
+        "--chunks", type=int, default=10000, help="Chunks of the synthetic corpus"
+    )
+    parser.add_argument(
+        "--embeddings",
+        choices=("model", "hash"),
+        default="model",
+        help="The configured embedding model, or model-free hashed embeddings",
+    )
+    parser.add_argument(
+        "--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS)
+    )
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Queries in flight (async, batch)"
+    )
+    parser.add_argument("--route-latency", type=float, default=0.3)
+    parser.add_argument("--generate-latency", type=float, default=0.8)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--web-latency", type=float, default=5.0)
+    parser.add_argument(
+        "--local-ratio",
+        type=float,
+        default=0.8,
+        help="Share of queries answered locally; the rest go to the fake web",
+    )
+    parser.add_argument("--semantic-cache", action="store_true")
+    parser.add_argument(
+        "--embedding-cache",
+        action="store_true",
+        help="Reuse cached embeddings of the model from earlier runs",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="Save the results as a baseline")
+    parser.add_argument(
+        "--baseline",
+        help="Compare with a saved baseline and exit with status 1 on regressions",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change allowed before a metric counts as regressed",
+    )
+    args = parser.parse_args()
+
+    workloads = [name for name in WORKLOADS if name in args.workloads]
+    settings = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "save_baseline", "baseline", "tolerance")
+    }
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as storage_path:
+        benchmark = Benchmark(args, storage_path)
+        if "ingest" not in workloads:
+            # Every other workload needs an index
+            benchmark.run("ingest")
+        for name in workloads:
+            result = benchmark.run(name)
+            results[name] = result.summary()
+            summary = results[name]
+            line = (
+                f"{name:<10}{result.operations:>8} ops {result.seconds:>9.2f}s "
+                f"{summary['throughput']:>10.1f}/s"
+            )
+            if result.latencies:
+                line += (
+                    f"  p50 {summary['p50_ms']:.1f}ms  p95 {summary['p95_ms']:.1f}ms"
+                    f"  p99 {summary['p99_ms']:.1f}ms"
+                )
+            if result.peak_rss_mb is not None:
+                line += f"  peak RSS {result.peak_rss_mb:.0f}MB"
+            print(line)
+
+    report = {"settings": settings, "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = {
+            key: (value, settings.get(key))
+            for key, value in baseline.get("settings", {}).items()
+            if settings.get(key) != value
+        }
+        if changed:
+            print(f"\nSettings differ from the baseline: {changed}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,19 +11,174 @@ DATA_DIR = BASE_DIR / "data"
 MODELS_DIR = BASE_DIR / "models"
 
 # Model configurations
-EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"  # or e.g. "sentence-transformers/all-MiniLM-L6-v2", smaller and faster
 LLM_MODEL = "llama-3.1-8b-instant"
 CREW_LLM_MODEL = "gemini/gemini-1.5-flash"
 
+# Embedding backend settings
+EMBEDDING_BACKEND = "huggingface"  # "huggingface" (PyTorch) or "onnx" (ONNX Runtime)
+EMBEDDING_THREADS = os.cpu_count() or 1  # ONNX Runtime intra-op threads
+EMBEDDING_BATCH_SIZE = 32  # Texts per ONNX inference call
+EMBEDDING_MAX_SEQ_LENGTH = 384  # Tokens kept per text by the ONNX backend
+ONNX_MODELS_DIR = str(MODELS_DIR / "onnx")  # Exported models are cached here
+ONNX_QUANTIZE = True  # Use int8 weights with the ONNX backend
+
+# Embedding cache settings: vectors are reused across index rebuilds and repeated queries
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = str(
+    MODELS_DIR / "embedding_cache"
+)  # Chunk vectors, one directory per model
+EMBEDDING_QUERY_CACHE_SIZE = 10000  # Query vectors kept in an in-memory LRU
+
 # Vector store settings
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 50
 NUM_RETRIEVAL_DOCS = 5
 
+# PDF parsing settings
+PDF_PAGE_CACHE_PATH = str(
+    BASE_DIR / "page_cache.sqlite"
+)  # Extracted page text; None disables
+PDF_PARSE_WORKERS = os.cpu_count() or 1  # Processes extracting the pages of a large PDF
+PDF_PARALLEL_MIN_PAGES = 100  # PDFs with fewer pages are parsed in-process
+PDF_PAGES_PER_TASK = 25  # Pages extracted per worker task
+
+# Hybrid retrieval settings
+RETRIEVAL_MODE = "hybrid"  # "dense" (FAISS only) or "hybrid" (FAISS + BM25 fused)
+HYBRID_CANDIDATES = 20  # Hits taken from each retriever before fusion
+RRF_K = 60  # Reciprocal-rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_COMMON_TERM_RATIO = (
+    0.5  # Terms in more chunks than this share are skipped if the query has rarer ones
+)
+
+# Partitioned search settings: chunks are also indexed per value of this metadata
+# key, so searches filtered on it scan only the matching partitions
+PARTITION_KEY = "source"  # e.g. "tenant"; None disables partitions
+FILTER_OVERFETCH = 4  # Candidate multiplier when filtering on other metadata keys
+
+# Sharded search settings: vectors are split over shard processes, each searched
+# in parallel, and their top-k lists merged by distance
+SHARD_COUNT = 0  # Local shard worker processes; 0 searches the in-process index
+SHARD_ADDRESSES = (
+    []
+)  # "host:port" of shard servers started with `python -m src.shards serve`
+# Shared secret of shard servers and their clients; required for SHARD_ADDRESSES
+# and `python -m src.shards serve`, local workers get a random key per run
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY")
+
+# Context assembly settings
+CONTEXT_TOKEN_BUDGET = 3000  # Tokens of history plus retrieved content per prompt
+CONTEXT_HISTORY_TOKEN_BUDGET = 600  # Part of the budget kept for conversation history
+CONTEXT_DUPLICATE_THRESHOLD = (
+    0.8  # Share of repeated word trigrams marking a near-duplicate chunk
+)
+CONTEXT_TOKENIZER = "cl100k_base"  # tiktoken encoding; ~4 chars/token if unavailable
+
+# FAISS index settings
+INDEX_TYPE = "flat"  # "flat", "ivf_flat", "hnsw" or "ivf_pq"
+INDEX_MIN_TRAIN_POINTS = 10000  # Corpora smaller than this stay on an exact flat index
+INDEX_TRAIN_SAMPLE_SIZE = 50000  # Vectors sampled to train IVF/PQ indexes
+IVF_NLIST = 1024  # Number of IVF clusters
+IVF_NPROBE = 16  # Clusters visited per query
+HNSW_M = 32  # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64  # Candidate list size per query
+PQ_M = 64  # Sub-quantizers per vector for IVF-PQ
+PQ_NBITS = 8  # Bits per sub-quantizer code
+
+# Semantic answer cache settings
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.97  # Minimum query cosine similarity for a hit
+SEMANTIC_CACHE_TTL = 24 * 60 * 60  # Seconds
+SEMANTIC_CACHE_MAX_ENTRIES = 10000
+SEMANTIC_CACHE_PATH = None  # e.g. str(BASE_DIR / "semantic_cache.sqlite")
+
+# Bulk ingestion settings
+INGEST_BATCH_SIZE = 64  # Chunks per embedding batch
+INGEST_SORT_WINDOW = 8  # Batches buffered and sorted by length before embedding
+INGEST_WORKERS = os.cpu_count() or 1  # Processes parsing PDFs
+INGEST_EMBEDDING_THREADS = os.cpu_count() or 1  # Threads used by the embedder
+INGEST_CHECKPOINT_BATCHES = 20  # Batches between on-disk checkpoints
+
 # LLM settings
 LLM_TEMPERATURE = 0
 LLM_MAX_TOKENS = 500
 LLM_MAX_RETRIES = 2
+GROQ_REQUESTS_PER_MINUTE = 30  # Groq free-tier limit; raise for paid plans, 0 disables
+
+# Routing settings
+ROUTER_MODE = "llm"  # "llm" always asks the LLM judge; "score" decides from retrieval scores first
+ROUTER_ACCEPT_THRESHOLD = 0.65  # Top similarity answered locally without the judge
+ROUTER_REJECT_THRESHOLD = (
+    0.25  # Top similarity below which the web is used without the judge
+)
+ROUTER_MARGIN_THRESHOLD = (
+    0.2  # Top-over-rest margin answered locally inside the uncertain band
+)
+ROUTER_TARGET_PRECISION = (
+    0.95  # Precision required of score-only decisions when calibrating
+)
+ROUTER_THRESHOLDS_PATH = str(
+    BASE_DIR / "router_thresholds.json"
+)  # Written by src.router
+
+# Startup settings
+WARM_UP_ON_START = (
+    True  # Load the embedding model and web agents in the background at CLI start
+)
+
+# Async serving settings
+ASYNC_CPU_WORKERS = 4  # Threads for embedding/FAISS work of async requests
+GROQ_MAX_CONCURRENCY = 32  # Concurrent Groq calls across all sessions
+WEB_MAX_CONCURRENCY = 4  # Concurrent CrewAI web runs across all sessions
+
+# Conversation store settings
+CONVERSATION_MAX_SESSIONS = 200000  # Sessions held in memory before LRU eviction
+CONVERSATION_MAX_BYTES = 512 * 1024 * 1024  # Approximate memory cap of all sessions
+CONVERSATION_STORE_PATH = None  # e.g. str(BASE_DIR / "conversations.sqlite")
+
+# Batch query settings
+BATCH_MAX_CONCURRENCY = 8  # Queries of a batch in flight at once
+
+# Speculative web retrieval: start the web crew alongside the LLM routing call
+# and discard it if the query turns out to be answerable locally
+SPECULATIVE_WEB_ENABLED = False
+SPECULATIVE_WEB_MAX_INFLIGHT = 2  # Speculative crew runs allowed at once
+
+# Web result cache settings
+WEB_CACHE_ENABLED = True
+WEB_CACHE_PATH = str(BASE_DIR / "web_cache.sqlite")
+WEB_CACHE_TTL = 24 * 60 * 60  # Seconds
+WEB_CACHE_MAX_BYTES = (
+    50 * 1024 * 1024
+)  # Least recently used entries evicted beyond this
+
+# Web write-back settings: chunk and index scraped web content so similar
+# questions can later be answered locally
+WEB_WRITEBACK_ENABLED = False
+WEB_WRITEBACK_TTL = 7 * 24 * 60 * 60  # Seconds web content stays in the index
+
+# Instrumentation settings: per-stage latency histograms, token and cache counters
+INSTRUMENTATION_ENABLED = True
+TRACE_JSONL_PATH = None  # Append one JSON line per request trace here if set
+LATENCY_BUCKETS_SECONDS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
 
 # Crew settings
 CREW_TEMPERATURE = 0.7
@@ -1,14 +1,80 @@
+import json
+import queue
 from crewai import Agent, Task, Crew
 from crewai_tools import SerperDevTool, ScrapeWebsiteTool
-from typing import Dict, Any
-from config.config import ERROR_MESSAGES
+from typing import Dict, Any, Optional
+from .web_cache import WebCache
+from . import instrumentation
+from config.config import ERROR_MESSAGES, WEB_CACHE_ENABLED, WEB_CACHE_PATH
+
+
+class CachedSerperDevTool(SerperDevTool):
+    """Serper search tool answering repeated searches from a WebCache."""
+
+    web_cache: Optional[Any] = None
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = kwargs.get("search_query") or kwargs.get("query")
+        return _cached_call(
+            self.web_cache,
+            "search",
+            query,
+            lambda: super(CachedSerperDevTool, self)._run(**kwargs),
+        )
+
+
+class CachedScrapeWebsiteTool(ScrapeWebsiteTool):
+    """Website scraping tool answering repeated URLs from a WebCache."""
+
+    web_cache: Optional[Any] = None
+
+    def _run(self, **kwargs: Any) -> Any:
+        url = kwargs.get("website_url") or getattr(self, "website_url", None)
+        return _cached_call(
+            self.web_cache,
+            "page",
+            url,
+            lambda: super(CachedScrapeWebsiteTool, self)._run(**kwargs),
+        )
+
+
+def _cached_call(web_cache: Optional[WebCache], kind: str, key: Optional[str], call):
+    """Return a cached tool result, or run the tool and cache what it returns."""
+    if web_cache is None or not key:
+        with instrumentation.stage(f"web.{kind}"):
+            return call()
+    cached = web_cache.get(kind, key)
+    if cached is not None:
+        instrumentation.count(f"web_cache.{kind}.hit")
+        return json.loads(cached)
+    instrumentation.count(f"web_cache.{kind}.miss")
+    with instrumentation.stage(f"web.{kind}"):
+        result = call()
+    web_cache.put(kind, key, json.dumps(result))
+    return result
 
 
 class WebAgents:
-    def __init__(self, llm):
+    def __init__(self, llm, web_cache: Optional[WebCache] = None):
+        """
+        Initialize the web research agents.
+
+        Crews are built on first use and reused across queries; one crew runs
+        one query at a time, so concurrent queries each take a crew from a
+        small pool. Finished answers, search results and scraped pages are
+        cached on disk.
+
+        Args:
+            llm: LLM driving the agents
+            web_cache: Cache of web results, by default WEB_CACHE_PATH if enabled
+        """
         self.llm = llm
-        self.search_tool = SerperDevTool()
-        self.scrape_website = ScrapeWebsiteTool()
+        if web_cache is None and WEB_CACHE_ENABLED:
+            web_cache = WebCache(WEB_CACHE_PATH)
+        self.web_cache = web_cache
+        self.search_tool = CachedSerperDevTool(web_cache=web_cache)
+        self.scrape_website = CachedScrapeWebsiteTool(web_cache=web_cache)
+        self._crews: "queue.LifoQueue[Crew]" = queue.LifoQueue()
 
     def setup_agents(self) -> Crew:
         """
@@ -86,8 +152,33 @@ class WebAgents:
             Retrieved web content
         """
         try:
-            crew = self.setup_agents()
-            result = crew.kickoff(inputs={"topic": query})
+            if self.web_cache is not None:
+                cached = self.web_cache.get("topic", query)
+                if cached is not None:
+                    instrumentation.count("web_cache.topic.hit")
+                    return cached
+                instrumentation.count("web_cache.topic.miss")
+
+            crew = self._take_crew()
+            try:
+                with instrumentation.stage("web.crew"):
+                    result = crew.kickoff(inputs={"topic": query})
+            finally:
+                self._crews.put(crew)
+
+            if self.web_cache is not None:
+                self.web_cache.put("topic", query, result.raw)
             return result.raw
         except Exception as e:
             raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
+
+    def warm_up(self) -> None:
+        """Build a crew ahead of the first web query."""
+        self._crews.put(self._take_crew())
+
+    def _take_crew(self) -> Crew:
+        """Take an idle crew from the pool, building one if all are busy."""
+        try:
+            return self._crews.get_nowait()
+        except queue.Empty:
+            return self.setup_agents()
@@ -1,28 +1,183 @@
-from typing import Optional
+import asyncio
+import logging
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from .data_loader import DataLoader
-from .vector_store import VectorStore
-from .llm_interface import LLMInterface
-from .agents import WebAgents
-from .conversation_manager import ConversationManager
-from config.config import ERROR_MESSAGES
+from .vector_store import VectorStore, RetrievalMemo, RetrievalResult
+from .llm_interface import LLMInterface, GenerationStats
+from .conversation_manager import ConversationManager, ConversationStore
+from .semantic_cache import SemanticCache
+from .router import ScoreRouter
+from .context_builder import ContextBuilder, ContextStats
+from . import instrumentation
+from config.config import (
+    ERROR_MESSAGES,
+    SEMANTIC_CACHE_ENABLED,
+    ROUTER_MODE,
+    ASYNC_CPU_WORKERS,
+    GROQ_MAX_CONCURRENCY,
+    WEB_MAX_CONCURRENCY,
+    SPECULATIVE_WEB_ENABLED,
+    SPECULATIVE_WEB_MAX_INFLIGHT,
+    WEB_WRITEBACK_ENABLED,
+    BATCH_MAX_CONCURRENCY,
+    WARM_UP_ON_START,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+
+# First link in crew output, used as the source of written-back web content
+_URL_PATTERN = re.compile(r"https?://[^\s<>\"'()\[\]]+")
+
+
+@dataclass
+class QueryPlan:
+    """Everything a query needs before its answer is generated."""
+
+    conversation: ConversationManager
+    memo: RetrievalMemo
+    retrieval: Optional[RetrievalResult] = None
+    answered_locally: bool = False
+    full_context: str = ""
+    context_stats: Optional[ContextStats] = None
+    # Set when the semantic cache already holds an answer
+    cached_answer: Optional[str] = None
+    # Whether the query opens its conversation, so its answer depends on
+    # nothing but the query and may be shared through the semantic cache
+    standalone: bool = False
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one query of a process_queries batch."""
+
+    index: int
+    query: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
 
 
 class RAGApplication:
-    def __init__(self, max_context_length: int = 5, include_answers: bool = True):
+    def __init__(
+        self,
+        max_context_length: int = 5,
+        include_answers: bool = True,
+        vector_store: Optional[VectorStore] = None,
+        llm_interface: Optional[LLMInterface] = None,
+        web_agents=None,
+    ):
         self.data_loader = DataLoader()
-        self.vector_store = VectorStore()
-        self.llm_interface = LLMInterface()
-        self.web_agents = WebAgents(self.llm_interface.crew_llm)
-        self.conversation_manager = ConversationManager(
-            max_context_length, include_answers
+        # Components can be passed in, e.g. the offline stand-ins of benchmarks/
+        self.vector_store = vector_store if vector_store is not None else VectorStore()
+        self.llm_interface = (
+            llm_interface if llm_interface is not None else LLMInterface()
+        )
+        # Web agents import crewai and are built on the first web query
+        self._web_agents = web_agents
+        self._web_agents_lock = threading.Lock()
+        self.max_context_length = max_context_length
+        self.include_answers = include_answers
+        # Conversation state per session; the default one backs the CLI
+        self.sessions = ConversationStore(max_context_length, include_answers)
+        self.conversation_manager = self.sessions.get(DEFAULT_SESSION)
+        # Bounded pool for CPU-bound embedding and FAISS work of async requests
+        self._cpu_executor = ThreadPoolExecutor(
+            max_workers=ASYNC_CPU_WORKERS, thread_name_prefix="rag-cpu"
         )
+        self._limits_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Caps web runs of every caller: threaded, async and speculative
+        self._web_slots = threading.BoundedSemaphore(WEB_MAX_CONCURRENCY)
+        self.last_generation_stats: Optional[GenerationStats] = None
+        self.router = ScoreRouter.from_file() if ROUTER_MODE == "score" else None
+        self.semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+        if self.semantic_cache is not None:
+            self.vector_store.add_reindex_listener(
+                self.semantic_cache.invalidate_source
+            )
+        # Web runs started alongside the LLM judge, bounded by an in-flight budget
+        self._speculation_budget = None
+        if SPECULATIVE_WEB_ENABLED and SPECULATIVE_WEB_MAX_INFLIGHT > 0:
+            self._speculation_budget = threading.BoundedSemaphore(
+                SPECULATIVE_WEB_MAX_INFLIGHT
+            )
+            self._speculation_executor = ThreadPoolExecutor(
+                max_workers=SPECULATIVE_WEB_MAX_INFLIGHT,
+                thread_name_prefix="rag-speculative-web",
+            )
+        self.speculation_counts = {"started": 0, "used": 0, "discarded": 0}
+        self._speculation_counts_lock = threading.Lock()
+        self.context_builder = ContextBuilder()
+        self.context_token_counts = {"requests": 0, "raw_tokens": 0, "used_tokens": 0}
+        self._context_token_counts_lock = threading.Lock()
+        # A single writer keeps web write-back off the request path
+        self._writeback_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-web-writeback")
+            if WEB_WRITEBACK_ENABLED
+            else None
+        )
+
+    @property
+    def web_agents(self):
+        """Web search agents, created on first use."""
+        if self._web_agents is None:
+            with self._web_agents_lock:
+                if self._web_agents is None:
+                    from .agents import WebAgents
+
+                    self._web_agents = WebAgents(self.llm_interface.crew_llm)
+        return self._web_agents
+
+    @web_agents.setter
+    def web_agents(self, web_agents) -> None:
+        self._web_agents = web_agents
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the embedding model and build the web agents ahead of first use.
+
+        Args:
+            background: Whether to warm up on a daemon thread and return it
+
+        Returns:
+            The warm-up thread when running in the background
+        """
+        if background:
+            thread = threading.Thread(
+                target=self.warm_up, args=(False,), name="rag-warm-up", daemon=True
+            )
+            thread.start()
+            return thread
+
+        steps = {
+            "embedding model": lambda: self.vector_store.warm_up(),
+            "web agents": lambda: self.web_agents.warm_up(),
+        }
+        for name, step in steps.items():
+            start = time.perf_counter()
+            try:
+                step()
+                logger.info("Warmed up %s in %.2fs", name, time.perf_counter() - start)
+            except Exception:
+                logger.exception("Warming up %s failed", name)
+        return None
 
     def initialize(self, document_path: str) -> None:
         """
-        Initialize the RAG application with a document.
+        Initialize the RAG application with a document, directory or glob.
+
+        Documents are streamed into the vector store one file at a time.
+        Indexed files under document_path that are gone are dropped; files
+        indexed from other paths are kept.
 
         Args:
-            document_path: Path to the document to load
+            document_path: Path to a document, a directory or a glob pattern
 
         Raises:
             FileNotFoundError: If the document doesn't exist
@@ -30,16 +185,17 @@ class RAGApplication:
         """
         try:
             documents = self.data_loader.load_documents(document_path)
-            self.vector_store.create_vector_store(documents)
+            self.vector_store.create_vector_store(documents, prune=[document_path])
         except Exception as e:
             raise ValueError(f"Error initializing RAG application: {str(e)}")
 
-    def process_query(self, query: str) -> str:
+    def process_query(self, query: str, session_id: str = DEFAULT_SESSION) -> str:
         """
         Process a user query and return an answer.
 
         Args:
             query: User query
+            session_id: Conversation the query belongs to
 
         Returns:
             Generated answer
@@ -48,54 +204,566 @@ class RAGApplication:
             ValueError: If there's an error processing the query
         """
         try:
-            # Add user query to conversation history
-            self.conversation_manager.add_message("user", query)
+            with instrumentation.request("query", session=session_id):
+                return self._answer(query, self._conversation(session_id))
+        except Exception as e:
+            raise ValueError(f"Error processing query: {str(e)}")
 
-            # Get conversation context
-            conversation_context = self.conversation_manager.get_context()
+    def process_queries(
+        self, queries: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY
+    ) -> Iterator[BatchResult]:
+        """
+        Answer many independent queries, yielding results as they complete.
 
-            # Get initial context for routing
-            local_context = self.vector_store.get_context(query)
+        All queries are encoded in one embedding batch and searched with a
+        single FAISS search. Routing and generation then run on up to
+        max_concurrency threads, with Groq calls spaced by the LLM rate
+        limiter. Every query gets its own empty conversation, so queries do
+        not see each other and interactive sessions are left untouched.
 
-            # Check if we can answer from local knowledge
-            can_answer_locally = self.llm_interface.check_local_knowledge(
-                query, local_context
-            )
+        Args:
+            queries: User queries
+            max_concurrency: Queries processed at once
 
-            print(f"Can answer locally: {can_answer_locally}")
+        Returns:
+            Iterator over BatchResult in completion order
 
-            # Get context either from local DB or web
-            if can_answer_locally:
-                context = self.vector_store.get_context(query)
-            else:
-                context = self.web_agents.get_web_content(query)
+        Raises:
+            ValueError: If the batch retrieval fails
+        """
+        queries = list(queries)
+        try:
+            retrievals = self.vector_store.retrieve_batch(queries)
+        except Exception as e:
+            raise ValueError(f"Error processing queries: {str(e)}")
 
-            # Combine conversation context with retrieved context
-            full_context = f"Previous conversation:\n{conversation_context}\n\nRetrieved information:\n{context}"
+        executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="rag-batch"
+        )
+        try:
+            futures = {}
+            for index, retrieval in enumerate(retrievals):
+                memo = RetrievalMemo(self.vector_store)
+                memo.prime(retrieval)
+                conversation = ConversationManager(
+                    self.max_context_length, self.include_answers
+                )
+                future = executor.submit(
+                    self._batch_answer, retrieval.query, conversation, memo
+                )
+                futures[future] = index
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield BatchResult(index, queries[index], answer=future.result())
+                except Exception as e:
+                    yield BatchResult(index, queries[index], error=str(e))
+        finally:
+            # Stop queued work if the caller abandons the iterator early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _answer(
+        self,
+        query: str,
+        conversation: ConversationManager,
+        memo: Optional[RetrievalMemo] = None,
+    ) -> str:
+        """Answer a query within a conversation."""
+        plan = self._prepare_query(query, conversation, memo)
+        if plan.cached_answer is not None:
+            return plan.cached_answer
+
+        # Generate final answer
+        answer = self.llm_interface.generate_answer(plan.full_context, query)
+
+        self._record_answer(query, plan, answer)
+        return answer
+
+    def _batch_answer(
+        self, query: str, conversation: ConversationManager, memo: RetrievalMemo
+    ) -> str:
+        """Answer one query of a batch as its own traced request."""
+        with instrumentation.request("query", mode="batch"):
+            return self._answer(query, conversation, memo)
+
+    def process_query_stream(
+        self, query: str, session_id: str = DEFAULT_SESSION
+    ) -> Iterator[str]:
+        """
+        Process a user query and yield the answer as it is generated.
+
+        Timing of the request is available afterwards in last_generation_stats.
 
-            # Generate final answer
-            answer = self.llm_interface.generate_answer(full_context, query)
+        Args:
+            query: User query
+            session_id: Conversation the query belongs to
+
+        Returns:
+            Iterator over answer tokens
+
+        Raises:
+            ValueError: If there's an error processing the query
+        """
+        stats = GenerationStats()
+        self.last_generation_stats = stats
+        try:
+            with instrumentation.request(
+                "query", session=session_id, mode="stream"
+            ) as trace:
+                plan = self._prepare_query(query, self._conversation(session_id))
+                if plan.cached_answer is not None:
+                    stats.first_token_at = stats.finished_at = time.perf_counter()
+                    stats.tokens = 1
+                    yield plan.cached_answer
+                    return
 
-            # Add assistant's answer to conversation history
-            self.conversation_manager.add_message("assistant", answer)
+                parts = []
+                for token in self.llm_interface.stream_answer(
+                    plan.full_context, query, stats
+                ):
+                    parts.append(token)
+                    yield token
 
-            return answer
+                logger.info(
+                    "Time to first token %.2fs, %.1f tokens/sec",
+                    stats.time_to_first_token or 0.0,
+                    stats.tokens_per_sec or 0.0,
+                )
+                self._record_answer(query, plan, "".join(parts))
+                if trace is not None:
+                    logger.info(
+                        "Stages: %s",
+                        ", ".join(
+                            f"{name} {ms:.0f}ms"
+                            for name, ms in trace.stage_totals().items()
+                        ),
+                    )
 
         except Exception as e:
             raise ValueError(f"Error processing query: {str(e)}")
 
-    def clear_conversation(self) -> None:
+    async def aprocess_query(
+        self, query: str, session_id: str = DEFAULT_SESSION
+    ) -> str:
+        """
+        Asynchronously process a user query and return an answer.
+
+        LLM calls use the clients' async paths, embedding and FAISS work runs
+        on a bounded thread pool and the web crew on the default executor, so
+        one process can serve many sessions concurrently. Queries of the same
+        session are processed one at a time to keep its history ordered, and
+        concurrency towards each upstream service is capped.
+
+        Args:
+            query: User query
+            session_id: Conversation the query belongs to
+
+        Returns:
+            Generated answer
+
+        Raises:
+            ValueError: If there's an error processing the query
+        """
+        try:
+            limits = self._upstream_limits()
+            with instrumentation.request("query", session=session_id, mode="async"):
+                async with self._session_lock(session_id):
+                    plan = await self._aprepare_query(
+                        query, self._conversation(session_id)
+                    )
+                    if plan.cached_answer is not None:
+                        return plan.cached_answer
+
+                    async with limits["groq"]:
+                        answer = await self.llm_interface.agenerate_answer(
+                            plan.full_context, query
+                        )
+
+                    self._record_answer(query, plan, answer)
+                    return answer
+
+        except Exception as e:
+            raise ValueError(f"Error processing query: {str(e)}")
+
+    def _prepare_query(
+        self,
+        query: str,
+        conversation: ConversationManager,
+        memo: Optional[RetrievalMemo] = None,
+    ) -> QueryPlan:
+        """Run every stage of a query up to answer generation."""
+        memo = memo or RetrievalMemo(self.vector_store)
+        turns = self._start_turn(query, conversation)
+
+        # Near-identical questions skip routing, retrieval and generation
+        cached = self._cached_plan(conversation, memo, memo.embed(query))
+        if cached is not None:
+            return cached
+
+        # Retrieve once; routing and generation share the same packed result
+        retrieval = memo.retrieve(query)
+        retrieved, retrieved_stats = self.context_builder.pack_documents(
+            retrieval.documents, retrieval.scores
+        )
+
+        # Check if we can answer from local knowledge and get context either
+        # from local DB or web
+        can_answer_locally, context = self._local_or_web(query, retrieval, retrieved)
+
+        print(f"Can answer locally: {can_answer_locally}")
+
+        return self._build_plan(
+            conversation,
+            turns,
+            memo,
+            retrieval,
+            can_answer_locally,
+            context,
+            retrieved_stats,
+        )
+
+    async def _aprepare_query(
+        self, query: str, conversation: ConversationManager
+    ) -> QueryPlan:
+        """Asynchronous counterpart of _prepare_query."""
+        memo = RetrievalMemo(self.vector_store)
+        turns = self._start_turn(query, conversation)
+
+        embedding = await self._offload(memo.embed, query)
+        cached = self._cached_plan(conversation, memo, embedding)
+        if cached is not None:
+            return cached
+
+        retrieval = await self._offload(memo.retrieve, query)
+        retrieved, retrieved_stats = self.context_builder.pack_documents(
+            retrieval.documents, retrieval.scores
+        )
+        can_answer_locally, context = await self._alocal_or_web(
+            query, retrieval, retrieved
+        )
+
+        return self._build_plan(
+            conversation,
+            turns,
+            memo,
+            retrieval,
+            can_answer_locally,
+            context,
+            retrieved_stats,
+        )
+
+    @staticmethod
+    def _start_turn(query: str, conversation: ConversationManager) -> List[str]:
+        """Record the user query and return the conversation turns."""
+        # Add user query to conversation history
+        conversation.add_message("user", query)
+
+        # Get conversation context
+        return conversation.get_turns()
+
+    @staticmethod
+    def _is_standalone(conversation: ConversationManager) -> bool:
+        """Whether the query just recorded is the only message of its conversation."""
+        return len(conversation.messages) <= 1
+
+    def _cached_plan(
+        self, conversation: ConversationManager, memo: RetrievalMemo, embedding
+    ) -> Optional[QueryPlan]:
+        """
+        Return a plan carrying a cached answer, if the semantic cache has one.
+
+        Follow-up questions are never answered from the cache: their meaning
+        depends on the earlier turns of their own session.
+        """
+        if self.semantic_cache is None or not self._is_standalone(conversation):
+            return None
+        with instrumentation.stage("semantic_cache.lookup"):
+            cached_answer = self.semantic_cache.lookup(embedding)
+        if cached_answer is None:
+            instrumentation.count("semantic_cache.miss")
+            return None
+        instrumentation.count("semantic_cache.hit")
+        conversation.add_message("assistant", cached_answer)
+        return QueryPlan(
+            conversation=conversation, memo=memo, cached_answer=cached_answer
+        )
+
+    def _build_plan(
+        self,
+        conversation: ConversationManager,
+        turns: List[str],
+        memo: RetrievalMemo,
+        retrieval: RetrievalResult,
+        answered_locally: bool,
+        context: str,
+        retrieved_stats: ContextStats,
+    ) -> QueryPlan:
+        """Pack history and context into the token budget and assemble the plan."""
+        with instrumentation.stage("context.pack"):
+            if answered_locally:
+                context_stats = retrieved_stats
+            else:
+                context, context_stats = self.context_builder.pack_text(context)
+            conversation_context, history_stats = self.context_builder.pack_history(
+                turns
+            )
+            context_stats = history_stats.merged(context_stats)
+        self._record_context_stats(context_stats)
+
+        # Combine conversation context with retrieved context
+        full_context = f"Previous conversation:\n{conversation_context}\n\nRetrieved information:\n{context}"
+
+        return QueryPlan(
+            conversation=conversation,
+            memo=memo,
+            retrieval=retrieval,
+            answered_locally=answered_locally,
+            full_context=full_context,
+            context_stats=context_stats,
+            standalone=self._is_standalone(conversation),
+        )
+
+    def _record_context_stats(self, stats: ContextStats) -> None:
+        with self._context_token_counts_lock:
+            self.context_token_counts["requests"] += 1
+            self.context_token_counts["raw_tokens"] += stats.raw_tokens
+            self.context_token_counts["used_tokens"] += stats.used_tokens
+        instrumentation.count("context.used_tokens", stats.used_tokens)
+        instrumentation.count("context.saved_tokens", stats.saved_tokens)
+        logger.info(
+            "Context: %d tokens sent, %d saved (%d duplicate chunks, %d chunks "
+            "and %d turns over budget)",
+            stats.used_tokens,
+            stats.saved_tokens,
+            stats.duplicates_dropped,
+            stats.chunks_dropped,
+            stats.turns_dropped,
+        )
+
+    def _record_answer(self, query: str, plan: QueryPlan, answer: str) -> None:
+        """Store a generated answer in the conversation and the answer cache."""
+        # Add assistant's answer to conversation history
+        plan.conversation.add_message("assistant", answer)
+
+        # Answers that drew on earlier turns must not be served to other sessions
+        if self.semantic_cache is not None and plan.standalone:
+            sources = (
+                [doc.metadata.get("source", "") for doc in plan.retrieval.documents]
+                if plan.answered_locally
+                else []
+            )
+            self.semantic_cache.put(query, plan.memo.embed(query), answer, sources)
+
+    def _conversation(self, session_id: str) -> ConversationManager:
+        """Return the conversation of a session, creating it on first use."""
+        return self.sessions.get(session_id)
+
+    def end_session(self, session_id: str) -> None:
+        """Forget the conversation state of a session."""
+        if session_id != DEFAULT_SESSION:
+            self.sessions.drop(session_id)
+            if self._limits_loop is not None:
+                self._session_locks.pop(session_id, None)
+
+    def _upstream_limits(self) -> Dict[str, asyncio.Semaphore]:
+        """Return the concurrency limits of the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._limits_loop is not loop:
+            self._limits = {
+                "groq": asyncio.Semaphore(GROQ_MAX_CONCURRENCY),
+                "web": asyncio.Semaphore(WEB_MAX_CONCURRENCY),
+            }
+            # A lock lives only while a request of its session holds or awaits
+            # it, so idle and evicted sessions do not accumulate locks
+            self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+                weakref.WeakValueDictionary()
+            )
+            self._limits_loop = loop
+        return self._limits
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        self._upstream_limits()
+        return self._session_locks.setdefault(session_id, asyncio.Lock())
+
+    async def _offload(self, func: Callable, *args):
+        """Run CPU-bound work on the bounded executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._cpu_executor, instrumentation.bind(func), *args
+        )
+
+    def _local_or_web(
+        self, query: str, retrieval: RetrievalResult, retrieved: str
+    ) -> Tuple[bool, str]:
+        """
+        Decide whether a query can be answered from local knowledge.
+
+        In "score" routing mode clear-cut cases are decided from retrieval
+        scores and only uncertain ones reach the LLM judge. With speculative
+        web retrieval enabled the web crew starts together with the judge, so
+        falling back to the web costs max(judge, web) rather than their sum.
+
+        Args:
+            query: User query
+            retrieval: Retrieval result for the query
+            retrieved: Retrieved chunks packed into the context budget
+
+        Returns:
+            (answered locally, context to answer from)
+        """
+        context = None
+        local = self._score_route(retrieval)
+        if local is None:
+            speculative = self._speculate_web(query)
+            try:
+                local = self.llm_interface.check_local_knowledge(query, retrieved)
+            except Exception:
+                self._discard_speculation(speculative)
+                raise
+            if not local and speculative is not None:
+                self._count_speculation("used")
+                context = speculative.result()
+            else:
+                self._discard_speculation(speculative)
+
+        instrumentation.count("route.local" if local else "route.web")
+        if local:
+            return True, retrieved
+        if context is None:
+            context = self._web_content(query)
+        self._write_back(query, context)
+        return False, context
+
+    async def _alocal_or_web(
+        self, query: str, retrieval: RetrievalResult, retrieved: str
+    ) -> Tuple[bool, str]:
+        """Asynchronous counterpart of _local_or_web."""
+        context = None
+        local = self._score_route(retrieval)
+        if local is None:
+            speculative = self._speculate_web(query)
+            try:
+                async with self._upstream_limits()["groq"]:
+                    local = await self.llm_interface.acheck_local_knowledge(
+                        query, retrieved
+                    )
+            except BaseException:
+                self._discard_speculation(speculative)
+                raise
+            if not local and speculative is not None:
+                self._count_speculation("used")
+                context = await asyncio.wrap_future(speculative)
+            else:
+                self._discard_speculation(speculative)
+
+        instrumentation.count("route.local" if local else "route.web")
+        if local:
+            return True, retrieved
+        if context is None:
+            # The loop's own limit keeps waiting requests from tying up
+            # executor threads; the crew itself runs under the shared _web_slots
+            async with self._upstream_limits()["web"]:
+                context = await asyncio.get_running_loop().run_in_executor(
+                    None, instrumentation.bind(self._web_content), query
+                )
+        self._write_back(query, context)
+        return False, context
+
+    def _write_back(self, query: str, content: str) -> None:
+        """Index fetched web content in the background, if write-back is enabled."""
+        if self._writeback_executor is not None:
+            self._writeback_executor.submit(self._index_web_content, query, content)
+
+    def _index_web_content(self, query: str, content: str) -> None:
+        """Chunk web content and add it to the vector store under its source URL."""
+        match = _URL_PATTERN.search(content)
+        url = match.group(0).rstrip(".,;:") if match else f"web:{query}"
+        try:
+            chunks = self.data_loader.split_text(
+                content, {"source": url, "topic": query}
+            )
+            added = self.vector_store.add_web_content(url, chunks)
+            logger.info("Indexed %d new web chunks from %s", added, url)
+        except Exception:
+            logger.exception("Web write-back failed for %s", url)
+
+    def _score_route(self, retrieval: RetrievalResult) -> Optional[bool]:
+        """Return the score router's decision, or None if the LLM judge must decide."""
+        if self.router is None:
+            return None
+        return self.router.decide(retrieval).local
+
+    def _speculate_web(self, query: str) -> Optional[Future]:
+        """Start a web run ahead of the LLM judge if the in-flight budget allows."""
+        if self._speculation_budget is None:
+            return None
+        if not self._speculation_budget.acquire(blocking=False):
+            logger.info("Speculative web budget exhausted, waiting for the judge")
+            return None
+        try:
+            future = self._speculation_executor.submit(
+                instrumentation.bind(self._web_content), query
+            )
+        except Exception:
+            self._speculation_budget.release()
+            raise
+        future.add_done_callback(lambda _: self._speculation_budget.release())
+        self._count_speculation("started")
+        return future
+
+    def _web_content(self, query: str) -> str:
+        """Fetch web content within WEB_MAX_CONCURRENCY, shared by all callers."""
+        with self._web_slots:
+            return self.web_agents.get_web_content(query)
+
+    def _count_speculation(self, outcome: str) -> None:
+        """Count a speculative web run as started, used or discarded."""
+        with self._speculation_counts_lock:
+            self.speculation_counts[outcome] += 1
+        instrumentation.count(f"speculation.{outcome}")
+
+    def _discard_speculation(self, future: Optional[Future]) -> None:
+        """
+        Drop a speculative web run that is no longer needed.
+
+        A crew that has already started cannot be interrupted; it finishes in
+        the background and keeps its budget slot until then.
+        """
+        if future is None:
+            return
+        future.cancel()
+        self._count_speculation("discarded")
+
+    def clear_conversation(self, session_id: str = DEFAULT_SESSION) -> None:
         """Clear the conversation history."""
-        self.conversation_manager.clear()
+        self._conversation(session_id).clear()
+
+    def context_stats(self) -> dict:
+        """Return prompt-context token counts and the tokens saved by packing."""
+        with self._context_token_counts_lock:
+            counts = dict(self.context_token_counts)
+        return {**counts, "saved_tokens": counts["raw_tokens"] - counts["used_tokens"]}
+
+    def cache_stats(self) -> dict:
+        """Return semantic cache hit/miss counters."""
+        if self.semantic_cache is None:
+            return {}
+        return self.semantic_cache.stats()
 
 
 def main():
+    logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    logging.getLogger("src").setLevel(logging.INFO)
+
     # Initialize RAG application
     app = RAGApplication(max_context_length=5, include_answers=True)
-    app.initialize("data/tesla_q3.pdf")
+    if WARM_UP_ON_START:
+        app.warm_up()
+    app.initialize("data")
 
     print("RAG Application initialized. Enter queries (Ctrl+C to exit):")
     print("Type 'clear' to clear conversation history")
+    print("Type 'metrics' to show stage latencies, token and cache counters")
 
     while True:
         try:
@@ -106,10 +774,15 @@ def main():
                 app.clear_conversation()
                 print("Conversation history cleared.")
                 continue
+            if query.lower() == "metrics":
+                print(instrumentation.metrics.prometheus_text(), end="")
+                continue
 
-            # Process query and print answer
-            answer = app.process_query(query)
-            print(f"\nAnswer: {answer}")
+            # Process query and print the answer as it streams in
+            print("\nAnswer: ", end="", flush=True)
+            for token in app.process_query_stream(query):
+                print(token, end="", flush=True)
+            print()
 
         except KeyboardInterrupt:
             print("\nExiting application...")
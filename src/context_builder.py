@@ -0,0 +1,230 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Set, Tuple
+from langchain.schema import Document
+from config.config import (
+    CHUNK_OVERLAP,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_HISTORY_TOKEN_BUDGET,
+    CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_TOKENIZER,
+)
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Shortest chunk prefix treated as overlap repeated from a neighbouring chunk
+_MIN_OVERLAP_CHARS = 20
+
+
+@dataclass
+class ContextStats:
+    raw_tokens: int = 0  # Tokens of the context before packing
+    used_tokens: int = 0  # Tokens actually sent
+    duplicates_dropped: int = 0
+    chunks_dropped: int = 0
+    turns_dropped: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.raw_tokens - self.used_tokens
+
+    def merged(self, other: "ContextStats") -> "ContextStats":
+        return ContextStats(
+            raw_tokens=self.raw_tokens + other.raw_tokens,
+            used_tokens=self.used_tokens + other.used_tokens,
+            duplicates_dropped=self.duplicates_dropped + other.duplicates_dropped,
+            chunks_dropped=self.chunks_dropped + other.chunks_dropped,
+            turns_dropped=self.turns_dropped + other.turns_dropped,
+        )
+
+
+class TokenCounter:
+    def __init__(self, encoding: str = CONTEXT_TOKENIZER):
+        """
+        Initialize a token counter.
+
+        Uses the tiktoken encoding when tiktoken is installed and the encoding
+        can be loaded; otherwise tokens are estimated as four characters each.
+        Neither matches the Llama tokenizer exactly, so budgets should leave
+        some headroom below the model's context window.
+
+        Args:
+            encoding: tiktoken encoding name
+        """
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logger.warning(
+                    "Estimating token counts, cannot load %s: %s", encoding, e
+                )
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max_tokens])
+        return text[: max_tokens * 4]
+
+
+class ContextBuilder:
+    def __init__(
+        self,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        history_budget: int = CONTEXT_HISTORY_TOKEN_BUDGET,
+        duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+        counter: Optional[TokenCounter] = None,
+    ):
+        """
+        Initialize a builder packing prompt context into a token budget.
+
+        The conversation history gets up to history_budget tokens, most recent
+        turns first, and retrieved or web content the rest of budget, highest
+        scoring chunks first.
+
+        Args:
+            budget: Total tokens of history plus retrieved content
+            history_budget: Tokens reserved for conversation history
+            duplicate_threshold: Share of a chunk's word trigrams already
+                present in a kept chunk above which it is dropped
+            counter: Token counter, a TokenCounter by default
+        """
+        self.budget = budget
+        self.history_budget = min(history_budget, budget)
+        self.duplicate_threshold = duplicate_threshold
+        self.counter = counter or TokenCounter()
+
+    @property
+    def content_budget(self) -> int:
+        return self.budget - self.history_budget
+
+    def pack_documents(
+        self, documents: Sequence[Document], scores: Sequence[float]
+    ) -> Tuple[str, ContextStats]:
+        """
+        Pack retrieved chunks into the content budget.
+
+        Chunks are taken in descending score order. Near-duplicates of kept
+        chunks are dropped, and text a chunk repeats from a kept chunk of the
+        same source through chunk overlap is stripped. The first chunk that
+        does not fit is truncated to the remaining budget.
+
+        Args:
+            documents: Retrieved chunks
+            scores: Similarity score of each chunk
+
+        Returns:
+            Tuple of (packed text, packing statistics)
+        """
+        stats = ContextStats(
+            raw_tokens=self.counter.count(" ".join(d.page_content for d in documents))
+        )
+        ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)
+        kept: List[Tuple[Document, str, Set]] = []
+        remaining = self.content_budget
+        for doc, _ in ranked:
+            text = self._strip_overlap(doc, kept)
+            shingles = self._shingles(text)
+            if not text.strip() or self._is_duplicate(shingles, kept):
+                stats.duplicates_dropped += 1
+                continue
+            if remaining <= 0:
+                stats.chunks_dropped += 1
+                continue
+            tokens = self.counter.count(text)
+            if tokens > remaining:
+                text = self.counter.truncate(text, remaining)
+                tokens = remaining
+            kept.append((doc, text, shingles))
+            remaining -= tokens
+
+        packed = " ".join(text for _, text, _ in kept)
+        stats.used_tokens = self.counter.count(packed)
+        return packed, stats
+
+    def pack_text(self, text: str) -> Tuple[str, ContextStats]:
+        """Cut unranked content, such as a web crew's answer, to the content budget."""
+        raw_tokens = self.counter.count(text)
+        if raw_tokens > self.content_budget:
+            text = self.counter.truncate(text, self.content_budget)
+        return text, ContextStats(
+            raw_tokens=raw_tokens, used_tokens=self.counter.count(text)
+        )
+
+    def pack_history(self, turns: Sequence[str]) -> Tuple[str, ContextStats]:
+        """
+        Keep the most recent conversation turns that fit the history budget.
+
+        Args:
+            turns: Formatted turns, oldest first
+
+        Returns:
+            Tuple of (packed history, packing statistics)
+        """
+        stats = ContextStats(raw_tokens=self.counter.count("\n".join(turns)))
+        kept: List[str] = []
+        remaining = self.history_budget
+        for turn in reversed(turns):
+            tokens = self.counter.count(turn)
+            if tokens > remaining:
+                break
+            kept.append(turn)
+            remaining -= tokens
+        stats.turns_dropped = len(turns) - len(kept)
+        packed = "\n".join(reversed(kept))
+        stats.used_tokens = self.counter.count(packed)
+        return packed, stats
+
+    def _is_duplicate(
+        self, shingles: Set, kept: List[Tuple[Document, str, Set]]
+    ) -> bool:
+        if not shingles:
+            return False
+        for _, _, other in kept:
+            if (
+                other
+                and len(shingles & other) / len(shingles) >= self.duplicate_threshold
+            ):
+                return True
+        return False
+
+    @staticmethod
+    def _strip_overlap(doc: Document, kept: List[Tuple[Document, str, Set]]) -> str:
+        """Remove text repeated at either end from a kept chunk of the same source."""
+        text = doc.page_content
+        source = doc.metadata.get("source")
+        for other, other_text, _ in kept:
+            if other.metadata.get("source") != source:
+                continue
+            longest = min(len(text), len(other_text), CHUNK_OVERLAP)
+            for size in range(longest, _MIN_OVERLAP_CHARS - 1, -1):
+                # This chunk follows the kept one
+                if other_text.endswith(text[:size]):
+                    text = text[size:].lstrip()
+                    break
+                # This chunk precedes the kept one
+                if other_text.startswith(text[-size:]):
+                    text = text[:-size].rstrip()
+                    break
+        return text
+
+    @staticmethod
+    def _shingles(text: str) -> Set:
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < 3:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i : i + 3]) for i in range(len(words) - 2)}
@@ -1,52 +1,302 @@
-from typing import List, Dict, Optional
-from dataclasses import dataclass
-from datetime import datetime
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+from config.config import (
+    CONVERSATION_STORE_PATH,
+    CONVERSATION_MAX_SESSIONS,
+    CONVERSATION_MAX_BYTES,
+)
+
+# Approximate memory of a message and of an empty session beyond their text,
+# used to keep the store under its memory cap
+_MESSAGE_OVERHEAD = 150
+_SESSION_OVERHEAD = 1000
 
 
-@dataclass
 class Message:
-    role: str  # "user" or "assistant"
-    content: str
-    timestamp: datetime
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role  # "user" or "assistant"
+        self.content = content
+        self.timestamp = timestamp  # Seconds since the epoch
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r})"
 
 
 class ConversationManager:
-    def __init__(self, max_context_length: int = 5, include_answers: bool = True):
+    __slots__ = (
+        "max_context_length",
+        "include_answers",
+        "messages",
+        "session_id",
+        "_context",
+        "_nbytes",
+        "_store",
+    )
+
+    def __init__(
+        self,
+        max_context_length: int = 5,
+        include_answers: bool = True,
+        session_id: Optional[str] = None,
+        store: Optional["ConversationStore"] = None,
+    ):
         """
         Initialize the conversation manager.
 
+        Messages are kept in a ring buffer of max_context_length interactions
+        and the rendered context is updated as messages enter and leave it.
+
         Args:
             max_context_length: Maximum number of previous interactions to keep
             include_answers: Whether to include assistant's answers in the context
+            session_id: Session the conversation belongs to, if kept in a store
+            store: ConversationStore notified of every change
         """
         self.max_context_length = max_context_length
         self.include_answers = include_answers
-        self.messages: List[Message] = []
+        # *2 because each interaction has a Q&A pair
+        self.messages: Deque[Message] = deque(maxlen=max_context_length * 2)
+        self.session_id = session_id
+        self._context = ""
+        self._nbytes = _SESSION_OVERHEAD
+        self._store = store
 
     def add_message(self, role: str, content: str) -> None:
         """Add a new message to the conversation history."""
-        self.messages.append(
-            Message(role=role, content=content, timestamp=datetime.now())
-        )
+        if not self.messages.maxlen:
+            # max_context_length=0 keeps no history
+            return
+        message = Message(role=role, content=content, timestamp=time.time())
+        before = self._nbytes
+        self._append(message)
+        if self._store is not None:
+            self._store._appended(self, message, self._nbytes - before)
 
-        # Trim history if it exceeds max length
-        if (
-            len(self.messages) > self.max_context_length * 2
-        ):  # *2 because each interaction has a Q&A pair
-            self.messages = self.messages[-self.max_context_length * 2 :]
+    def _append(self, message: Message) -> None:
+        """Append to the ring buffer, dropping the oldest message when it is full."""
+        if len(self.messages) == self.messages.maxlen:
+            dropped = self.messages[0]
+            self._nbytes -= _message_bytes(dropped)
+            if self._included(dropped):
+                # Drop the oldest line and its newline
+                self._context = self._context[len(self._render(dropped)) + 1 :]
+        self.messages.append(message)
+        self._nbytes += _message_bytes(message)
+        if self._included(message):
+            line = self._render(message)
+            self._context = f"{self._context}\n{line}" if self._context else line
 
     def get_context(self) -> str:
         """Get the conversation context as a formatted string."""
-        if not self.messages:
-            return ""
-
-        context_parts = []
-        for msg in self.messages:
-            if msg.role == "user" or (msg.role == "assistant" and self.include_answers):
-                context_parts.append(f"{msg.role}: {msg.content}")
+        return self._context
 
-        return "\n".join(context_parts)
+    def get_turns(self) -> List[str]:
+        """Get the formatted messages that make up the context, oldest first."""
+        return [self._render(msg) for msg in self.messages if self._included(msg)]
 
     def clear(self) -> None:
         """Clear the conversation history."""
-        self.messages = []
+        before = self._nbytes
+        self.messages.clear()
+        self._context = ""
+        self._nbytes = _SESSION_OVERHEAD
+        if self._store is not None:
+            self._store._cleared(self, self._nbytes - before)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the conversation."""
+        return self._nbytes
+
+    def _included(self, message: Message) -> bool:
+        return message.role == "user" or (
+            message.role == "assistant" and self.include_answers
+        )
+
+    @staticmethod
+    def _render(message: Message) -> str:
+        return f"{message.role}: {message.content}"
+
+
+def _message_bytes(message: Message) -> int:
+    # The content is held once in the message and once in the rendered context
+    return _MESSAGE_OVERHEAD + 2 * len(message.content)
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_context_length: int = 5,
+        include_answers: bool = True,
+        max_sessions: int = CONVERSATION_MAX_SESSIONS,
+        max_bytes: int = CONVERSATION_MAX_BYTES,
+        persist_path: Optional[str] = CONVERSATION_STORE_PATH,
+    ):
+        """
+        Initialize a store of conversations keyed by session id.
+
+        Sessions are created on first use and the least recently used ones are
+        evicted from memory once there are more than max_sessions of them or
+        they hold more than max_bytes. With a persist_path every message is
+        also written to SQLite, so evicted sessions are reloaded on their next
+        query and conversations survive restarts; without one an evicted
+        session starts over.
+
+        Args:
+            max_context_length: Interactions kept per conversation
+            include_answers: Whether answers are part of the conversation context
+            max_sessions: Maximum number of sessions held in memory
+            max_bytes: Approximate memory cap of the sessions held in memory
+            persist_path: SQLite file backing the conversations, if any
+        """
+        self.max_context_length = max_context_length
+        self.include_answers = include_answers
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.loads = 0
+        self._sessions: "OrderedDict[str, ConversationManager]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._conn = None
+        if persist_path:
+            self._conn = sqlite3.connect(persist_path, check_same_thread=False)
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS messages (
+                        session TEXT NOT NULL,
+                        seq INTEGER NOT NULL,
+                        role TEXT NOT NULL,
+                        content TEXT NOT NULL,
+                        timestamp REAL NOT NULL,
+                        PRIMARY KEY (session, seq)
+                    ) WITHOUT ROWID
+                    """)
+                self._conn.commit()
+
+    def get(self, session_id: str) -> ConversationManager:
+        """
+        Return the conversation of a session, creating or reloading it if needed.
+
+        Args:
+            session_id: Session id
+        """
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is not None:
+                self._sessions.move_to_end(session_id)
+                return conversation
+
+            conversation = ConversationManager(
+                self.max_context_length, self.include_answers, session_id, self
+            )
+            if self._conn is not None:
+                rows = self._conn.execute(
+                    "SELECT role, content, timestamp FROM messages "
+                    "WHERE session = ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, conversation.messages.maxlen),
+                ).fetchall()
+                for role, content, timestamp in reversed(rows):
+                    conversation._append(Message(role, content, timestamp))
+                self.loads += bool(rows)
+            self._sessions[session_id] = conversation
+            self._bytes += conversation.nbytes
+            self._evict()
+            return conversation
+
+    __getitem__ = get
+
+    def drop(self, session_id: str) -> None:
+        """Forget a session, in memory and on disk."""
+        with self._lock:
+            conversation = self._sessions.pop(session_id, None)
+            if conversation is not None:
+                self._bytes -= conversation.nbytes
+                conversation._store = None
+            if self._conn is not None:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session = ?", (session_id,)
+                )
+                self._conn.commit()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, float]:
+        """Return the sessions and approximate bytes held in memory and eviction counts."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "loads": self.loads,
+            }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+    def _appended(
+        self, conversation: ConversationManager, message: Message, delta: int
+    ) -> None:
+        with self._lock:
+            # Evicted conversations still in use are persisted but not counted
+            if self._sessions.get(conversation.session_id) is conversation:
+                self._bytes += delta
+                self._sessions.move_to_end(conversation.session_id)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO messages (session, seq, role, content, timestamp) "
+                    "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM messages "
+                    "WHERE session = ?",
+                    (
+                        conversation.session_id,
+                        message.role,
+                        message.content,
+                        message.timestamp,
+                        conversation.session_id,
+                    ),
+                )
+                # Keep only what the ring buffer holds
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session = ? AND seq <= "
+                    "(SELECT MAX(seq) FROM messages WHERE session = ?) - ?",
+                    (
+                        conversation.session_id,
+                        conversation.session_id,
+                        conversation.messages.maxlen,
+                    ),
+                )
+                self._conn.commit()
+            self._evict()
+
+    def _cleared(self, conversation: ConversationManager, delta: int) -> None:
+        with self._lock:
+            if self._sessions.get(conversation.session_id) is conversation:
+                self._bytes += delta
+            if self._conn is not None:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session = ?",
+                    (conversation.session_id,),
+                )
+                self._conn.commit()
+
+    def _evict(self) -> None:
+        """Evict least recently used sessions beyond the session and memory caps."""
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            _, conversation = self._sessions.popitem(last=False)
+            self._bytes -= conversation.nbytes
+            self.evictions += 1
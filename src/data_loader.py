@@ -1,60 +1,458 @@
+import fnmatch
+import glob
+import hashlib
 import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from pypdf import PageObject, PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from config.config import CHUNK_SIZE, CHUNK_OVERLAP, ERROR_MESSAGES
+from config.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    PDF_PAGE_CACHE_PATH,
+    PDF_PARSE_WORKERS,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_PAGES_PER_TASK,
+    ERROR_MESSAGES,
+)
+from .page_cache import PageTextCache
 
+# Reader of the PDF a parsing worker process last extracted pages from
+_worker_reader: Optional[Tuple[str, PdfReader]] = None
+# Page text cache of a parsing worker process, opened on first use
+_worker_cache: Optional[PageTextCache] = None
+
+
+def _read_pages(
+    reader: PdfReader, numbers: Iterable[int], cache: Optional[PageTextCache]
+) -> List[Tuple[int, str, str]]:
+    """
+    Return (page number, fingerprint, text) of pages, extracting only uncached text.
+
+    Pages whose fingerprint is in the cache, from this or any other file,
+    are not extracted again.
+    """
+    pages = []
+    for number in numbers:
+        page = reader.pages[number]
+        fingerprint = _page_fingerprint(page) if cache is not None else None
+        text = (
+            cache.get_by_fingerprint(fingerprint) if fingerprint is not None else None
+        )
+        if text is None:
+            text = page.extract_text()
+        pages.append((number, fingerprint or "", text))
+    return pages
+
+
+def _extract_pages(
+    pdf_path: str, numbers: List[int], cache_path: Optional[str]
+) -> Tuple[List[Tuple[int, str, str]], int, int]:
+    """
+    Read some pages of a PDF inside a worker process.
+
+    Returns:
+        Tuple of (the pages as _read_pages gives them, cache hits, cache misses)
+    """
+    global _worker_reader, _worker_cache
+    if _worker_reader is None or _worker_reader[0] != pdf_path:
+        _worker_reader = (pdf_path, PdfReader(pdf_path))
+    if _worker_cache is None and cache_path is not None:
+        _worker_cache = PageTextCache(cache_path)
+    cache = _worker_cache if cache_path is not None else None
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    pages = _read_pages(_worker_reader[1], numbers, cache)
+    if cache is None:
+        return pages, 0, 0
+    return pages, cache.hits - hits, cache.misses - misses
+
+
+# Font entries that do not change the extracted text but can hold large font programs
+_UNHASHED_KEYS = frozenset({"/FontDescriptor"})
+
+
+def _page_fingerprint(page: PageObject) -> Optional[str]:
+    """
+    Hash what the text of a page is extracted from.
+
+    That is its content stream and the fonts and XObjects it uses, hashed in
+    full: font encodings, widths and ToUnicode maps, and form XObjects with
+    their own resources. Image data is left out.
+
+    Returns:
+        Hex digest, or None if the page cannot be fingerprinted
+    """
+    try:
+        digest = hashlib.sha256()
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        resources = page.get("/Resources")
+        resources = resources.get_object() if resources is not None else {}
+        for key in ("/Font", "/XObject"):
+            digest.update(key.encode("utf-8"))
+            _hash_pdf_object(resources.get(key), digest, {})
+        return digest.hexdigest()
+    except Exception:
+        return None
+
+
+def _hash_pdf_object(obj, digest, seen: Dict[int, int]) -> None:
+    """Feed a PDF object into a digest, following references and streams."""
+    if isinstance(obj, IndirectObject):
+        if obj.idnum in seen:
+            # Shared or cyclic references are hashed once, then by the order
+            # they were first met in, which does not depend on object numbers
+            digest.update(f"<{seen[obj.idnum]}>".encode("utf-8"))
+            return
+        seen[obj.idnum] = len(seen)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"<<")
+        for key in sorted(obj):
+            if key in _UNHASHED_KEYS:
+                continue
+            digest.update(key.encode("utf-8"))
+            _hash_pdf_object(obj.raw_get(key), digest, seen)
+        if isinstance(obj, StreamObject) and obj.get("/Subtype") != "/Image":
+            digest.update(obj.get_data())
+        digest.update(b">>")
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _hash_pdf_object(item, digest, seen)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+
+def path_covers(path: str, file_path: str) -> bool:
+    """
+    Tell whether loading a path would read a file, were the file there.
+
+    Args:
+        path: A file, a directory or a glob pattern, as given to load_documents
+        file_path: Path of the file
+
+    Returns:
+        True if file_path is path, lies under it or matches it
+    """
+    file_path = os.path.abspath(file_path)
+    if glob.has_magic(path):
+        return _glob_matches(
+            os.path.abspath(path).split(os.sep), file_path.split(os.sep)
+        )
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        return os.path.commonpath([path, file_path]) == path
+    return file_path == path
+
+
+def _glob_matches(pattern: List[str], parts: List[str]) -> bool:
+    """Match path components against glob components, "**" spanning directories."""
+    if not pattern:
+        return not parts
+    if pattern[0] == "**":
+        return _glob_matches(pattern[1:], parts) or (
+            bool(parts) and _glob_matches(pattern, parts[1:])
+        )
+    return (
+        bool(parts)
+        and fnmatch.fnmatchcase(parts[0], pattern[0])
+        and _glob_matches(pattern[1:], parts[1:])
+    )
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect the visible text of an HTML document."""
+
+    _SKIPPED_TAGS = {"script", "style", "head", "noscript"}
 
-class DataLoader:
     def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self.parts.append(data.strip())
+
+
+class DataLoader:
+    def __init__(
+        self,
+        pdf_workers: int = PDF_PARSE_WORKERS,
+        page_cache_path: Optional[str] = PDF_PAGE_CACHE_PATH,
+    ):
+        """
+        Initialize the loader.
+
+        Args:
+            pdf_workers: Processes extracting the pages of a large PDF
+            page_cache_path: SQLite file caching extracted PDF page text, or None
+        """
+        self.pdf_workers = pdf_workers
+        self.page_cache_path = page_cache_path
+        self.page_cache = (
+            PageTextCache(page_cache_path) if page_cache_path is not None else None
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
         )
+        self.loaders = {
+            ".pdf": self.load_pdf,
+            ".txt": self.load_text,
+            ".md": self.load_text,
+            ".markdown": self.load_text,
+            ".html": self.load_html,
+            ".htm": self.load_html,
+        }
 
-    def load_pdf(self, pdf_path: str) -> List[Document]:
+    def load_pdf(self, pdf_path: str) -> Iterator[Document]:
         """
-        Load and split a PDF file into chunks.
+        Lazily load and split a PDF file into chunks, page by page.
+
+        Pages are extracted as the chunks are consumed, so the first chunks
+        are available before the whole file is parsed. Pages of large PDFs
+        are extracted by a pool of pdf_workers processes, a bounded number of
+        tasks ahead of the consumer, which also fingerprint the pages. Extracted
+        text is cached, so an unchanged PDF is not parsed again and only the
+        changed pages of an edited one are. Chunks carry the hash of the file
+        in their "file_hash" metadata, so the vector store need not read the
+        file again to detect changes.
 
         Args:
             pdf_path: Path to the PDF file
 
         Returns:
-            List of document chunks
+            Iterator over document chunks
 
         Raises:
             FileNotFoundError: If the PDF file doesn't exist
-            ValueError: If the PDF file is invalid
+            ValueError: If the PDF file is invalid, raised while iterating
         """
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(
                 ERROR_MESSAGES["file_not_found"].format(file_path=pdf_path)
             )
+        return self._split_pages(pdf_path)
 
+    def _split_pages(self, pdf_path: str) -> Iterator[Document]:
         try:
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            chunks = self.text_splitter.split_documents(documents)
-            return chunks
+            for page in self._load_pdf_pages(pdf_path):
+                yield from self.text_splitter.split_documents([page])
         except Exception as e:
             raise ValueError(
                 ERROR_MESSAGES["invalid_pdf"].format(file_path=pdf_path)
             ) from e
 
-    def load_documents(self, file_path: str) -> List[Document]:
+    def _load_pdf_pages(self, pdf_path: str) -> Iterator[Document]:
+        """Yield the pages of a PDF in order, from the cache where possible."""
+        cache = self.page_cache
+        file_hash = self._file_hash(pdf_path)
+        count = cache.page_count(file_hash) if cache is not None else None
+        if count is not None:
+            for number in range(count):
+                yield self._pdf_page(
+                    pdf_path, file_hash, number, cache.get(file_hash, number)
+                )
+            return
+
+        reader = PdfReader(pdf_path)
+        total = len(reader.pages)
+        pool = None
+        if self.pdf_workers > 1 and total >= PDF_PARALLEL_MIN_PAGES:
+            pool = ProcessPoolExecutor(max_workers=self.pdf_workers)
+        cache_path = self.page_cache_path if cache is not None else None
+        # Blocks of pages being read, in page order
+        pending: Deque[Union[Future, List[Tuple[int, str, str]]]] = deque()
+        try:
+            for start in range(0, total, PDF_PAGES_PER_TASK):
+                numbers = list(range(start, min(start + PDF_PAGES_PER_TASK, total)))
+                if pool is not None:
+                    pending.append(
+                        pool.submit(_extract_pages, pdf_path, numbers, cache_path)
+                    )
+                else:
+                    pending.append(_read_pages(reader, numbers, cache))
+                # Keep the workers busy without running far ahead of the consumer
+                while len(pending) > (2 * self.pdf_workers if pool else 0):
+                    yield from self._finish_pages(
+                        pdf_path, file_hash, pending.popleft()
+                    )
+            while pending:
+                yield from self._finish_pages(pdf_path, file_hash, pending.popleft())
+            if cache is not None:
+                cache.complete(file_hash, total)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def _finish_pages(
+        self,
+        pdf_path: str,
+        file_hash: str,
+        pages: Union[Future, List[Tuple[int, str, str]]],
+    ) -> Iterator[Document]:
+        """Yield a block of pages once read and cache their text."""
+        if isinstance(pages, Future):
+            pages, hits, misses = pages.result()
+            if self.page_cache is not None:
+                self.page_cache.record(hits, misses)
+        if self.page_cache is not None:
+            self.page_cache.put(file_hash, pages)
+        for number, _, text in pages:
+            yield self._pdf_page(pdf_path, file_hash, number, text)
+
+    @staticmethod
+    def _pdf_page(
+        pdf_path: str, file_hash: str, number: int, text: Optional[str]
+    ) -> Document:
+        return Document(
+            page_content=text or "",
+            metadata={"source": pdf_path, "page": number, "file_hash": file_hash},
+        )
+
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load_text(self, text_path: str) -> List[Document]:
         """
-        Load documents based on file extension.
+        Load and split a plain text or Markdown file into chunks.
 
         Args:
-            file_path: Path to the document file
+            text_path: Path to the text file
+
+        Returns:
+            List of document chunks
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+        if not os.path.exists(text_path):
+            raise FileNotFoundError(
+                ERROR_MESSAGES["file_not_found"].format(file_path=text_path)
+            )
+
+        with open(text_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        return self._split_text(text, text_path)
+
+    def load_html(self, html_path: str) -> List[Document]:
+        """
+        Load an HTML file, strip its markup and split the text into chunks.
+
+        Args:
+            html_path: Path to the HTML file
 
         Returns:
             List of document chunks
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
         """
-        file_extension = Path(file_path).suffix.lower()
+        if not os.path.exists(html_path):
+            raise FileNotFoundError(
+                ERROR_MESSAGES["file_not_found"].format(file_path=html_path)
+            )
+
+        extractor = _HTMLTextExtractor()
+        with open(html_path, "r", encoding="utf-8", errors="replace") as f:
+            extractor.feed(f.read())
+        extractor.close()
+        return self._split_text("\n".join(extractor.parts), html_path)
+
+    def _split_text(self, text: str, source: str) -> List[Document]:
+        """Split a single-page text document into chunks."""
+        return self.split_text(text, {"source": source, "page": 0})
+
+    def split_text(self, text: str, metadata: Dict) -> List[Document]:
+        """
+        Split text that did not come from a file, such as scraped web content.
+
+        Args:
+            text: Text to split
+            metadata: Metadata copied to every chunk
+
+        Returns:
+            List of document chunks
+        """
+        document = Document(page_content=text, metadata=dict(metadata))
+        return self.text_splitter.split_documents([document])
+
+    def iter_files(self, path: str) -> Iterator[str]:
+        """
+        Lazily yield the supported files named by a path.
 
-        if file_extension == ".pdf":
-            return self.load_pdf(file_path)
+        Args:
+            path: A file, a directory (walked recursively) or a glob pattern
+
+        Returns:
+            Iterator over file paths, in a stable order
+        """
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if Path(name).suffix.lower() in self.loaders:
+                        yield os.path.join(root, name)
+        elif glob.has_magic(path):
+            for file_path in sorted(glob.iglob(path, recursive=True)):
+                if (
+                    os.path.isfile(file_path)
+                    and Path(file_path).suffix.lower() in self.loaders
+                ):
+                    yield file_path
         else:
+            yield path
+
+    def load_file(self, file_path: str) -> Iterable[Document]:
+        """
+        Load a single file based on its extension.
+
+        Args:
+            file_path: Path to the document file
+
+        Returns:
+            Document chunks; PDF chunks are produced lazily
+        """
+        file_extension = Path(file_path).suffix.lower()
+
+        if file_extension not in self.loaders:
             raise ValueError(f"Unsupported file type: {file_extension}")
+        return self.loaders[file_extension](file_path)
+
+    def load_documents(self, path: str) -> Iterator[Document]:
+        """
+        Lazily load documents from a file, a directory or a glob pattern.
+
+        Files are read one at a time and their chunks are yielded grouped by
+        source, so a corpus can be streamed into the vector store without
+        holding it in memory.
+
+        Args:
+            path: Path to a document, a directory or a glob pattern
+
+        Returns:
+            Iterator over document chunks with "source" and "page" metadata
+        """
+        for file_path in self.iter_files(path):
+            yield from self.load_file(file_path)
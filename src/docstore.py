@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, MutableMapping, Tuple, Union
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain.schema import Document
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Pickle-free docstore keeping chunk text and metadata in SQLite.
+
+    Documents are fetched by id only when a search hit needs them, so startup
+    does not read the corpus into memory. The table of FAISS row positions is
+    kept in the same database so it stays consistent with the index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS positions (
+                    position INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL
+                );
+                """)
+            self._conn.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Fetch a document by id."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata FROM documents WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Add documents; they become durable on the next commit."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, content, metadata) VALUES (?, ?, ?)",
+                [
+                    (doc_id, doc.page_content, json.dumps(doc.metadata))
+                    for doc_id, doc in texts.items()
+                ],
+            )
+
+    def delete(self, ids: List) -> None:
+        """Delete documents by id."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in ids]
+            )
+
+    def texts(self) -> List[Tuple[str, str]]:
+        """Return (id, text) of every document."""
+        with self._lock:
+            return self._conn.execute("SELECT id, content FROM documents").fetchall()
+
+    def clear(self) -> None:
+        """Remove every document and position."""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM positions")
+
+    def positions(self) -> "SQLitePositions":
+        """Return a lazy view of the FAISS row -> document id mapping."""
+        return SQLitePositions(self)
+
+    def write_positions(self, mapping: MutableMapping[int, str]) -> None:
+        """Persist a FAISS row -> document id mapping."""
+        if isinstance(mapping, SQLitePositions) and mapping.docstore is self:
+            mapping.flush()
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany(
+                "INSERT INTO positions (position, id) VALUES (?, ?)",
+                sorted(mapping.items()),
+            )
+
+    def commit(self) -> None:
+        """Make pending changes durable."""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SQLitePositions(MutableMapping):
+    """
+    FAISS row -> document id mapping read lazily from SQLiteDocstore.
+
+    Rows appended after loading are buffered in memory until flushed.
+    """
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+        with docstore._lock:
+            self._count = docstore._conn.execute(
+                "SELECT COUNT(*) FROM positions"
+            ).fetchone()[0]
+        self._pending: Dict[int, str] = {}
+
+    def __getitem__(self, position: int) -> str:
+        position = int(position)
+        if position in self._pending:
+            return self._pending[position]
+        with self.docstore._lock:
+            row = self.docstore._conn.execute(
+                "SELECT id FROM positions WHERE position = ?", (position,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __setitem__(self, position: int, doc_id: str) -> None:
+        self._pending[int(position)] = doc_id
+
+    def __delitem__(self, position: int) -> None:
+        raise TypeError("Positions are rewritten as a whole, not deleted one by one")
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
+
+    def __len__(self) -> int:
+        return self._count + len(self._pending)
+
+    def items(self):
+        with self.docstore._lock:
+            rows = self.docstore._conn.execute(
+                "SELECT position, id FROM positions ORDER BY position"
+            ).fetchall()
+        return rows + sorted(self._pending.items())
+
+    def values(self):
+        return [doc_id for _, doc_id in self.items()]
+
+    def flush(self) -> None:
+        """Write buffered rows to the database."""
+        if not self._pending:
+            return
+        with self.docstore._lock:
+            self.docstore._conn.executemany(
+                "INSERT OR REPLACE INTO positions (position, id) VALUES (?, ?)",
+                sorted(self._pending.items()),
+            )
+        self._count += len(self._pending)
+        self._pending = {}
@@ -0,0 +1,323 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config.config import EMBEDDING_CACHE_DIR, EMBEDDING_QUERY_CACHE_SIZE
+from . import instrumentation
+from .embeddings import embed_queries
+
+try:
+    import fcntl
+except ImportError:  # Windows; appends are then serialized by SQLite alone
+    fcntl = None
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.sqlite"
+LOCK_FILE = "vectors.lock"
+
+
+def text_key(text: str) -> bytes:
+    """Hash text after Unicode and whitespace normalization."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that remember every vector they have computed.
+
+    Document vectors are appended to a float32 array file with a SQLite
+    index from text hash to row, kept in one directory per model under path,
+    so rebuilding an index (new chunking settings, a deleted vector store)
+    only embeds text the model has never seen. Query vectors are kept in an
+    in-memory LRU. Nothing is computed, and the wrapped model is not loaded,
+    while every text is a hit.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_id: str,
+        path: Optional[str] = EMBEDDING_CACHE_DIR,
+        query_cache_size: int = EMBEDDING_QUERY_CACHE_SIZE,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            embeddings: Embeddings computing the vectors on a miss
+            model_id: Identifies the vectors embeddings produce, see embedding_id
+            path: Directory holding document vectors, or None to keep them in memory
+            query_cache_size: Query vectors kept in memory
+        """
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.query_cache_size = query_cache_size
+        self.query_hits = self.query_misses = 0
+        self.document_hits = self.document_misses = 0
+        self._queries: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._vectors_path = None
+        self._lock_path = None
+        self._memory: List[np.ndarray] = []
+        self._dim: Optional[int] = None
+        self._rows = 0
+        self._mmap: Optional[np.ndarray] = None
+        keys_path = ":memory:"
+        if path is not None:
+            directory = os.path.join(
+                path, hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+            )
+            os.makedirs(directory, exist_ok=True)
+            self._vectors_path = os.path.join(directory, VECTORS_FILE)
+            self._lock_path = os.path.join(directory, LOCK_FILE)
+            keys_path = os.path.join(directory, KEYS_FILE)
+        # Ingestion workers and app processes may share the directory
+        self._conn = sqlite3.connect(keys_path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS vectors (
+                    key BLOB PRIMARY KEY,
+                    row INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                """)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('model', ?)", (model_id,)
+            )
+            self._refresh()
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Return the vectors of texts, embedding only those never seen before."""
+        if not texts:
+            return []
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            rows = self._lookup(keys)
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in rows:
+                missing.setdefault(key, text)
+        hits = sum(key in rows for key in keys)
+        self.document_hits += hits
+        self.document_misses += len(texts) - hits
+        instrumentation.count("embedding_cache.document.hit", hits)
+        instrumentation.count("embedding_cache.document.miss", len(texts) - hits)
+
+        if missing:
+            computed = np.asarray(
+                self.embeddings.embed_documents(list(missing.values())),
+                dtype=np.float32,
+            )
+            with self._lock:
+                rows.update(self._append(list(missing), computed))
+        with self._lock:
+            return self._read([rows[key] for key in keys]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Return the vector of a query, from the LRU if it was asked recently."""
+        key = text_key(text)
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+                self.query_hits += 1
+                instrumentation.count("embedding_cache.query.hit")
+                return vector
+        self.query_misses += 1
+        instrumentation.count("embedding_cache.query.miss")
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._queries[key] = vector
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Return the vectors of a batch of queries, encoding the misses at once."""
+        vectors: List[Optional[List[float]]] = []
+        missing: Dict[bytes, str] = {}
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._queries.get(key)
+                if vector is not None:
+                    self._queries.move_to_end(key)
+                else:
+                    missing.setdefault(key, text)
+                vectors.append(vector)
+        hits = sum(vector is not None for vector in vectors)
+        self.query_hits += hits
+        self.query_misses += len(texts) - hits
+        instrumentation.count("embedding_cache.query.hit", hits)
+        instrumentation.count("embedding_cache.query.miss", len(texts) - hits)
+
+        if missing:
+            computed = dict(
+                zip(missing, embed_queries(self.embeddings, list(missing.values())))
+            )
+            with self._lock:
+                for key, vector in computed.items():
+                    self._queries[key] = vector
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+            vectors = [
+                computed[key] if vector is None else vector
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit rates of query and document lookups and the vectors stored."""
+        queries = self.query_hits + self.query_misses
+        documents = self.document_hits + self.document_misses
+        return {
+            "query_hits": self.query_hits,
+            "query_misses": self.query_misses,
+            "query_hit_rate": self.query_hits / queries if queries else 0.0,
+            "document_hits": self.document_hits,
+            "document_misses": self.document_misses,
+            "document_hit_rate": (self.document_hits / documents if documents else 0.0),
+            "queries_cached": len(self._queries),
+            "documents_stored": self._rows,
+        }
+
+    def clear(self) -> None:
+        """Forget every cached vector."""
+        with self._lock:
+            self._queries.clear()
+            self._conn.execute("DELETE FROM vectors")
+            self._conn.execute("DELETE FROM meta WHERE name = 'dim'")
+            self._conn.commit()
+            self._memory.clear()
+            self._mmap = None
+            self._dim = None
+            self._rows = 0
+            if self._vectors_path is not None and os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mmap = None
+            self._conn.close()
+
+    def __getattr__(self, name: str):
+        # Backend-specific helpers such as OnnxEmbeddings.set_num_threads
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _lookup(self, keys: List[bytes], block_size: int = 500) -> Dict[bytes, int]:
+        """Map the stored keys among keys to their rows."""
+        rows: Dict[bytes, int] = {}
+        unique = list(set(keys))
+        for start in range(0, len(unique), block_size):
+            block = unique[start : start + block_size]
+            rows.update(
+                self._conn.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN "
+                    f"({','.join('?' * len(block))})",
+                    block,
+                ).fetchall()
+            )
+        return rows
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray) -> Dict[bytes, int]:
+        """
+        Store new vectors and return their rows.
+
+        Other processes may append to the same directory, so the row count is
+        read from keys.sqlite inside a write transaction rather than trusted
+        from memory, and the vector file is written under an exclusive lock.
+        """
+        with self._file_lock():
+            self._conn.commit()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('dim', ?)",
+                        (str(self._dim),),
+                    )
+                # Texts embedded concurrently elsewhere keep their first row
+                known = self._lookup(keys)
+                new = [row for row, key in enumerate(keys) if key not in known]
+                rows = dict(known)
+                if new:
+                    block = np.ascontiguousarray(vectors[new], dtype=np.float32)
+                    if self._vectors_path is not None:
+                        # Rows of an append that never committed are overwritten
+                        with open(self._vectors_path, "ab") as f:
+                            f.truncate(self._rows * self._dim * 4)
+                            f.seek(self._rows * self._dim * 4)
+                            f.write(block.tobytes())
+                    else:
+                        self._memory.append(block)
+                    for offset, row in enumerate(new):
+                        rows[keys[row]] = self._rows + offset
+                    self._conn.executemany(
+                        "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                        [
+                            (keys[row], self._rows + offset)
+                            for offset, row in enumerate(new)
+                        ],
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        if new:
+            self._rows += len(new)
+            self._mmap = None
+        return rows
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock on the vector file across processes."""
+        if self._lock_path is None or fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Read the dimension and row count, which other processes may change."""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row is not None:
+            self._dim = int(row[0])
+        # Rows appended after the last commit are not indexed and are
+        # overwritten by the next append
+        self._rows = self._conn.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM vectors"
+        ).fetchone()[0]
+
+    def _read(self, rows: List[int]) -> np.ndarray:
+        """Read stored vectors by row."""
+        if self._vectors_path is None:
+            self._memory = [np.concatenate(self._memory)] if self._memory else []
+            return self._memory[0][rows]
+        if rows and max(rows) >= self._rows:
+            # Appended by another process since this one last looked
+            self._refresh()
+        if self._mmap is None or len(self._mmap) < self._rows:
+            self._mmap = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._rows, self._dim),
+            )
+        return np.asarray(self._mmap[rows])
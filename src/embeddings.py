@@ -0,0 +1,399 @@
+import argparse
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_THREADS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_SEQ_LENGTH,
+    ONNX_MODELS_DIR,
+    ONNX_QUANTIZE,
+    NUM_RETRIEVAL_DOCS,
+)
+
+EMBEDDING_BACKENDS = ("huggingface", "onnx")
+
+
+def create_embeddings(
+    backend: str = EMBEDDING_BACKEND,
+    model_name: str = EMBEDDING_MODEL,
+    num_threads: int = EMBEDDING_THREADS,
+) -> Embeddings:
+    """
+    Create the embedding model used by the vector store.
+
+    Args:
+        backend: "huggingface" (PyTorch sentence-transformers) or "onnx"
+            (ONNX Runtime, int8-quantized unless ONNX_QUANTIZE is off)
+        model_name: sentence-transformers model name
+        num_threads: ONNX Runtime intra-op threads; PyTorch uses its global
+            setting, see torch.set_num_threads
+
+    Returns:
+        LangChain Embeddings instance
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend == "huggingface":
+        from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name, num_threads=num_threads)
+    raise ValueError(f"Unsupported embedding backend: {backend}")
+
+
+def embedding_id(
+    backend: str = EMBEDDING_BACKEND,
+    model_name: str = EMBEDDING_MODEL,
+    quantize: bool = ONNX_QUANTIZE,
+) -> str:
+    """Identify the vectors a backend produces, so indexes are rebuilt on change."""
+    if backend == "huggingface":
+        return model_name
+    return f"{backend}{'-int8' if quantize else ''}:{model_name}"
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Encode a batch of queries.
+
+    Uses the embeddings' own embed_queries if they have one, such as a cache
+    keeping query vectors apart from document vectors. Otherwise the batch
+    goes through embed_documents, since the backends here encode queries and
+    documents alike.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+def set_batch_size(embeddings: Embeddings, batch_size: int) -> None:
+    """
+    Set the number of texts the embedding model encodes per forward pass.
+
+    ONNX backends take it through set_batch_size, HuggingFace ones as the
+    batch_size encode kwarg of sentence-transformers. Wrappers such as
+    LazyEmbeddings pass both through to the model they hold.
+    """
+    setter = getattr(embeddings, "set_batch_size", None)
+    if setter is not None:
+        setter(batch_size)
+        return
+    encode_kwargs = getattr(embeddings, "encode_kwargs", None)
+    if isinstance(encode_kwargs, dict):
+        encode_kwargs["batch_size"] = batch_size
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings created on first use.
+
+    Loading a model takes seconds, so a VectorStore wraps its backend in this
+    and an unchanged index can be opened without loading the model at all.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings] = create_embeddings):
+        self._factory = factory
+        self._instance: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self) -> Embeddings:
+        """Create the wrapped embeddings if needed and return them."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return embed_queries(self.load(), texts)
+
+    def __getattr__(self, name: str):
+        # Backend-specific helpers such as OnnxEmbeddings.set_num_threads
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        quantize: bool = ONNX_QUANTIZE,
+        num_threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH,
+        models_dir: str = ONNX_MODELS_DIR,
+    ):
+        """
+        Initialize a sentence-transformers model running on ONNX Runtime.
+
+        The model is exported to ONNX on first use, dynamically quantized to
+        int8 weights if requested, and cached under models_dir. Embeddings are
+        mean-pooled and L2-normalized like the sentence-transformers models.
+
+        Args:
+            model_name: sentence-transformers model name
+            quantize: Whether to use int8 weights
+            num_threads: ONNX Runtime intra-op threads
+            batch_size: Texts encoded per inference call
+            max_seq_length: Tokens kept per text
+            models_dir: Directory caching exported models
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.model_dir = Path(models_dir) / (
+            model_name.replace("/", "__") + ("-int8" if quantize else "")
+        )
+        model_path = self.model_dir / "model.onnx"
+        if not model_path.exists():
+            export_onnx(model_name, self.model_dir, quantize)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        self._onnxruntime = onnxruntime
+        self._model_path = str(model_path)
+        self.set_num_threads(num_threads)
+
+    def set_batch_size(self, batch_size: int) -> None:
+        """Set the number of texts encoded per inference call."""
+        self.batch_size = batch_size
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """(Re)create the inference session with the given intra-op threads."""
+        options = self._onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = (
+            self._onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = self._onnxruntime.InferenceSession(
+            self._model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {
+            model_input.name for model_input in self.session.get_inputs()
+        }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.append(self._encode(texts[start : start + self.batch_size]))
+        if not vectors:
+            return []
+        return np.concatenate(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feed = {
+            name: value.astype(np.int64)
+            for name, value in inputs.items()
+            if name in self._input_names
+        }
+        token_embeddings = self.session.run(None, feed)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def export_onnx(model_name: str, output_dir: Path, quantize: bool = True) -> None:
+    """
+    Export a transformers encoder to ONNX, optionally with int8 weights.
+
+    Args:
+        model_name: Hugging Face model name
+        output_dir: Directory receiving model.onnx and the tokenizer files
+        quantize: Whether to apply dynamic int8 quantization
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["An example sentence"], return_tensors="pt")
+    input_names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = output_dir / ("model-fp32.onnx" if quantize else "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(fp32_path), str(output_dir / "model.onnx"), weight_type=QuantType.QInt8
+        )
+        os.remove(fp32_path)
+
+
+def compare_backends(
+    texts: List[str],
+    queries: List[str],
+    candidates: Dict[str, Embeddings],
+    baseline: str,
+    k: int = NUM_RETRIEVAL_DOCS,
+) -> List[Dict]:
+    """
+    Compare embedding backends on the same chunks and queries.
+
+    Args:
+        texts: Corpus chunks
+        queries: Queries to retrieve for
+        candidates: Embeddings to compare, by name
+        baseline: Name of the reference backend in candidates
+        k: Number of hits compared
+
+    Returns:
+        One row per backend with encoding throughput, query latency and the
+        overlap of its top-k hits with the baseline's
+    """
+    import faiss
+
+    rankings = {}
+    rows = []
+    for name, embeddings in candidates.items():
+        start = time.perf_counter()
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        encode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        query_vectors = np.asarray(
+            [embeddings.embed_query(query) for query in queries], dtype=np.float32
+        )
+        query_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        _, ids = index.search(query_vectors, k)
+        rankings[name] = [set(row) - {-1} for row in ids]
+        rows.append(
+            {
+                "backend": name,
+                "chunks_per_sec": (
+                    len(texts) / encode_seconds if encode_seconds else 0.0
+                ),
+                "query_ms": query_ms,
+            }
+        )
+
+    for row in rows:
+        row["overlap"] = float(
+            np.mean(
+                [
+                    len(found & truth) / len(truth)
+                    for found, truth in zip(
+                        rankings[row["backend"]], rankings[baseline]
+                    )
+                    if truth
+                ]
+            )
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare embedding backends on your own documents"
+    )
+    parser.add_argument("documents", help="Document file, directory or glob pattern")
+    parser.add_argument(
+        "--queries", help="Text file with one query per line (default: sampled chunks)"
+    )
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument(
+        "--candidates",
+        nargs="+",
+        default=[f"onnx:{EMBEDDING_MODEL}"],
+        help="backend:model pairs compared against the baseline",
+    )
+    parser.add_argument("--baseline", default=f"huggingface:{EMBEDDING_MODEL}")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    args = parser.parse_args()
+
+    from .data_loader import DataLoader
+
+    texts = [doc.page_content for doc in DataLoader().load_documents(args.documents)]
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        # The first sentence of a chunk stands in for a question about it
+        rng = random.Random(0)
+        sample = rng.sample(texts, min(args.num_queries, len(texts)))
+        queries = [text.split(". ")[0][:200] for text in sample]
+
+    try:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    except ImportError:
+        pass
+
+    candidates = {}
+    for spec in [args.baseline] + args.candidates:
+        backend, model_name = spec.split(":", 1)
+        # Every backend runs on the same number of threads
+        candidates[spec] = create_embeddings(backend, model_name, args.threads)
+
+    rows = compare_backends(texts, queries, candidates, args.baseline)
+    print(f"{len(texts)} chunks, {len(queries)} queries, overlap@{NUM_RETRIEVAL_DOCS}")
+    print(f"{'backend':<60}{'chunks/s':>10}{'ms/query':>10}{'overlap':>9}")
+    for row in rows:
+        print(
+            f"{row['backend']:<60}{row['chunks_per_sec']:>10.1f}"
+            f"{row['query_ms']:>10.2f}{row['overlap']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import time
+from typing import Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+from config.config import (
+    INDEX_TRAIN_SAMPLE_SIZE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    PQ_M,
+    PQ_NBITS,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# faiss warns below this many training points per IVF centroid
+_POINTS_PER_CENTROID = 39
+
+# IO_FLAG_MMAP maps IVF lists only; builds with IO_FLAG_MMAP_IFC also map the
+# codes of flat indexes and the vectors of HNSW graphs
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def build_index(dim: int, index_type: str, num_vectors: int) -> faiss.Index:
+    """
+    Create an empty FAISS index of the requested type.
+
+    Args:
+        dim: Embedding dimension
+        index_type: One of INDEX_TYPES
+        num_vectors: Number of vectors available for training, used to size IVF
+
+    Returns:
+        Untrained FAISS index using the L2 metric
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    nlist = max(1, min(IVF_NLIST, num_vectors // _POINTS_PER_CENTROID))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+
+    # The number of sub-quantizers must divide the dimension
+    pq_m = max(m for m in range(1, min(PQ_M, dim) + 1) if dim % m == 0)
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, PQ_NBITS)
+
+
+def train_index(
+    index: faiss.Index, vectors: np.ndarray, sample_size: int = INDEX_TRAIN_SAMPLE_SIZE
+) -> None:
+    """Train an index on a random sample of vectors if it needs training."""
+    if index.is_trained:
+        return
+    if len(vectors) > sample_size:
+        rng = np.random.default_rng(0)
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def set_search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = IVF_NPROBE,
+    ef_search: Optional[int] = HNSW_EF_SEARCH,
+) -> None:
+    """
+    Apply query-time search parameters where the index supports them.
+
+    Args:
+        index: FAISS index
+        nprobe: IVF clusters visited per query
+        ef_search: HNSW candidate list size per query
+    """
+    if isinstance(index, faiss.IndexIVF) and nprobe is not None:
+        index.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW) and ef_search is not None:
+        index.hnsw.efSearch = ef_search
+
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """
+    Read an index file with its vectors memory-mapped rather than copied into RAM.
+
+    The mapped index is read-only: faiss aborts on adding to mapped flat
+    codes, so read the file again with faiss.read_index before changing it.
+    HNSW graph links and, on faiss builds without IO_FLAG_MMAP_IFC, flat
+    codes are still read into memory.
+    """
+    return faiss.read_index(path, _MMAP_FLAGS)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Return the INDEX_TYPES name describing an index."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Return every vector stored in a flat or HNSW index, in index order."""
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def compact_ivf_ids(index: faiss.Index, removed: np.ndarray) -> None:
+    """
+    Renumber the ids of an IVF index after remove_ids, as a flat index would.
+
+    Flat indexes shift the vectors after a removed one down, and callers
+    (LangChain's FAISS store among them) rely on ids staying positions. IVF
+    inverted lists keep the original ids, so they are shifted here.
+
+    Args:
+        index: IVF index the ids were removed from
+        removed: Ids that were removed
+    """
+    removed = np.unique(np.asarray(removed, dtype=np.int64))
+    if not len(removed):
+        return
+    invlists = faiss.extract_index_ivf(index).invlists
+    code_size = invlists.code_size
+    for lst in range(invlists.nlist):
+        size = invlists.list_size(lst)
+        if not size:
+            continue
+        old = faiss.rev_swig_ptr(invlists.get_ids(lst), size).copy()
+        codes = faiss.rev_swig_ptr(invlists.get_codes(lst), size * code_size).copy()
+        new = np.ascontiguousarray(old - np.searchsorted(removed, old))
+        invlists.update_entries(
+            lst, 0, size, faiss.swig_ptr(new), faiss.swig_ptr(codes)
+        )
+
+
+def convert_index(
+    index: faiss.Index, index_type: str, block_size: int = 65536
+) -> faiss.Index:
+    """
+    Rebuild a flat or HNSW index as another index type, preserving order.
+
+    Args:
+        index: Source index whose vectors can be reconstructed exactly
+        index_type: Target index type
+        block_size: Number of vectors added per call
+
+    Returns:
+        Trained index of the target type holding the same vectors
+    """
+    vectors = reconstruct_all(index)
+    converted = build_index(index.d, index_type, len(vectors))
+    train_index(converted, vectors)
+    for start in range(0, len(vectors), block_size):
+        converted.add(vectors[start : start + block_size])
+    set_search_params(converted)
+    return converted
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    index_type: str,
+    k: int = 5,
+    values: Optional[Sequence[int]] = None,
+) -> List[Dict]:
+    """
+    Measure recall and latency of an approximate index against exact search.
+
+    Args:
+        vectors: Corpus vectors
+        queries: Query vectors
+        index_type: Approximate index type to evaluate
+        k: Number of neighbours compared
+        values: nprobe (IVF) or efSearch (HNSW) values to sweep
+
+    Returns:
+        One row per setting with recall@k and mean per-query latency in ms
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    exact_latency, truth = _timed_search(exact, queries, k)
+    rows = [
+        {
+            "index_type": "flat",
+            "param": None,
+            "value": None,
+            "recall": 1.0,
+            "latency_ms": exact_latency,
+        }
+    ]
+
+    index = build_index(vectors.shape[1], index_type, len(vectors))
+    train_index(index, vectors)
+    index.add(vectors)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        param = "nprobe"
+        values = values or [1, 4, 16, 64, 256]
+    elif index_type == "hnsw":
+        param = "efSearch"
+        values = values or [16, 32, 64, 128, 256]
+    else:
+        param, values = None, [None]
+
+    for value in values:
+        if param == "nprobe":
+            set_search_params(index, nprobe=value)
+        elif param == "efSearch":
+            set_search_params(index, ef_search=value)
+        latency, found = _timed_search(index, queries, k)
+        recall = np.mean(
+            [len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if len(t)]
+        )
+        rows.append(
+            {
+                "index_type": index_type,
+                "param": param,
+                "value": value,
+                "recall": float(recall),
+                "latency_ms": latency,
+            }
+        )
+    return rows
+
+
+def format_report(rows: List[Dict]) -> str:
+    """Render recall_latency_report rows as a text table."""
+    lines = [f"{'index':<10}{'param':<10}{'value':>8}{'recall':>10}{'ms/query':>12}"]
+    for row in rows:
+        value = "" if row["value"] is None else row["value"]
+        lines.append(
+            f"{row['index_type']:<10}{row['param'] or '':<10}{value:>8}"
+            f"{row['recall']:>10.3f}{row['latency_ms']:>12.3f}"
+        )
+    return "\n".join(lines)
+
+
+def _timed_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """Search queries one at a time and return (mean ms per query, ids)."""
+    found = []
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = index.search(query.reshape(1, -1), k)
+        found.append([i for i in ids[0] if i != -1])
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / max(len(queries), 1), found
@@ -0,0 +1,251 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+from langchain.schema import Document
+from .data_loader import DataLoader
+from .embeddings import set_batch_size
+from .vector_store import VectorStore
+from config.config import (
+    INGEST_BATCH_SIZE,
+    INGEST_SORT_WINDOW,
+    INGEST_WORKERS,
+    INGEST_EMBEDDING_THREADS,
+    INGEST_CHECKPOINT_BATCHES,
+    ERROR_MESSAGES,
+)
+
+
+def _load_chunks(path: str) -> Tuple[str, List[Document]]:
+    """Parse and split one document inside a worker process."""
+    # Files are already spread over the processes; one PDF is parsed by one
+    return path, list(DataLoader(pdf_workers=1).load_file(path))
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    skipped_files: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        batch_size: int = INGEST_BATCH_SIZE,
+        num_workers: int = INGEST_WORKERS,
+        num_threads: int = INGEST_EMBEDDING_THREADS,
+        sort_window: int = INGEST_SORT_WINDOW,
+        checkpoint_batches: int = INGEST_CHECKPOINT_BATCHES,
+    ):
+        """
+        Initialize the bulk ingestion pipeline.
+
+        Args:
+            vector_store: Vector store the chunks are embedded into
+            batch_size: Number of chunks per embedding batch, also used as the
+                batch size of the embedding model's forward passes
+            num_workers: Number of processes parsing documents
+            num_threads: Number of threads used by the embedding model
+            sort_window: Number of batches buffered and sorted by length
+            checkpoint_batches: Number of batches between on-disk checkpoints
+        """
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.num_threads = num_threads
+        self.sort_window = sort_window
+        self.checkpoint_batches = checkpoint_batches
+
+    def run(
+        self, paths: List[str], resume: bool = True, prune: Sequence[str] = ()
+    ) -> IngestionStats:
+        """
+        Ingest documents into the vector store.
+
+        Documents are parsed in a process pool and their chunks are buffered,
+        sorted by length so batches pad little, embedded in batches and appended
+        to FAISS in bulk. The index and manifest are checkpointed periodically,
+        so an interrupted run resumes where it stopped: completed files are
+        skipped and partially ingested files only embed their missing chunks.
+
+        Args:
+            paths: Paths of the documents making up the corpus
+            resume: Whether to continue from the saved index and manifest
+            prune: Files, directories or glob patterns paths were listed from;
+                indexed sources they cover that are not in paths are dropped
+
+        Returns:
+            IngestionStats for the run
+
+        Raises:
+            ValueError: If there's an error ingesting the documents
+        """
+        self._configure_threads()
+        set_batch_size(self.vector_store.embeddings, self.batch_size)
+        self._stats = IngestionStats()
+        self._started = time.perf_counter()
+        self._batches_since_checkpoint = 0
+        # Source -> (file hash, chunks still waiting to be embedded)
+        self._pending: Dict[str, List] = {}
+        self._manifest = None
+        buffer: List[Tuple[str, str, Document]] = []
+
+        try:
+            self._manifest, rechunked = self.vector_store._open_manifest(resume)
+
+            with ProcessPoolExecutor(max_workers=self.num_workers) as pool:
+                futures = [pool.submit(_load_chunks, path) for path in paths]
+                for future in as_completed(futures):
+                    source, chunks = future.result()
+                    self._stats.files += 1
+                    self._stats.chunks += len(chunks)
+                    buffer.extend(self._plan(source, chunks, rechunked))
+                    if len(buffer) >= self.batch_size * self.sort_window:
+                        self._flush(buffer)
+                        buffer = []
+            self._flush(buffer)
+
+            self._stats.removed += self.vector_store._drop_missing_sources(
+                self._manifest, paths, prune
+            )
+            self.vector_store._commit(self._manifest)
+        except Exception as e:
+            # Keep whatever was embedded so a rerun can resume from it
+            if self._manifest is not None:
+                self.vector_store._commit(self._manifest)
+            raise ValueError(ERROR_MESSAGES["vector_store_error"].format(error=str(e)))
+
+        self._stats.seconds = time.perf_counter() - self._started
+        print(
+            f"Ingested {self._stats.files} files ({self._stats.skipped_files} unchanged): "
+            f"{self._stats.embedded} chunks embedded, {self._stats.removed} removed, "
+            f"{self._stats.chunks_per_sec:.1f} chunks/sec"
+        )
+        return self._stats
+
+    def _plan(
+        self, source: str, chunks: List[Document], rechunked: bool
+    ) -> List[Tuple[str, str, Document]]:
+        """Drop stale chunks of a source and return the chunks it still needs."""
+        plan = self.vector_store._plan_source(self._manifest, source, chunks, rechunked)
+        if plan is None:
+            self._stats.skipped_files += 1
+            return []
+
+        self.vector_store._notify_reindexed(source)
+        self.vector_store._drop_ids(plan.stale)
+        self._stats.removed += len(plan.stale)
+
+        # The entry only lists committed chunks until the whole source is done
+        new_ids = {chunk_id for chunk_id, _ in plan.new}
+        self._manifest["files"][source] = {
+            "hash": None,
+            "chunks": [chunk_id for chunk_id in plan.ids if chunk_id not in new_ids],
+        }
+        self._pending[source] = [plan.file_hash, len(plan.new)]
+        if not plan.new:
+            self._complete(source)
+        return [(source, chunk_id, doc) for chunk_id, doc in plan.new]
+
+    def _flush(self, buffer: List[Tuple[str, str, Document]]) -> None:
+        """Embed buffered chunks in length-sorted batches and append them."""
+        buffer.sort(key=lambda item: len(item[2].page_content))
+        for start in range(0, len(buffer), self.batch_size):
+            batch = buffer[start : start + self.batch_size]
+            texts = [doc.page_content for _, _, doc in batch]
+            vectors = self.vector_store.embeddings.embed_documents(texts)
+            self.vector_store._add_embeddings(
+                texts,
+                vectors,
+                [doc.metadata for _, _, doc in batch],
+                [chunk_id for _, chunk_id, _ in batch],
+            )
+
+            for source, chunk_id, _ in batch:
+                self._manifest["files"][source]["chunks"].append(chunk_id)
+                self._pending[source][1] -= 1
+                if self._pending[source][1] == 0:
+                    self._complete(source)
+            self._stats.embedded += len(batch)
+
+            self._batches_since_checkpoint += 1
+            if self._batches_since_checkpoint >= self.checkpoint_batches:
+                self._checkpoint()
+
+    def _complete(self, source: str) -> None:
+        """Mark a source as fully ingested."""
+        self._manifest["files"][source]["hash"] = self._pending.pop(source)[0]
+
+    def _checkpoint(self) -> None:
+        """Persist progress so an interrupted run can resume."""
+        self.vector_store._commit(self._manifest)
+        self._batches_since_checkpoint = 0
+        elapsed = time.perf_counter() - self._started
+        rate = self._stats.embedded / elapsed if elapsed else 0.0
+        print(
+            f"Checkpoint: {self._stats.embedded} chunks embedded ({rate:.1f} chunks/sec)"
+        )
+
+    def _configure_threads(self) -> None:
+        """Limit the threads used by the embedding model and FAISS."""
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        set_num_threads = getattr(self.vector_store.embeddings, "set_num_threads", None)
+        if set_num_threads is not None:
+            set_num_threads(self.num_threads)
+        try:
+            import torch
+
+            torch.set_num_threads(self.num_threads)
+        except ImportError:
+            pass
+        try:
+            import faiss
+
+            faiss.omp_set_num_threads(self.num_threads)
+        except ImportError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk-ingest documents into the vector store"
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Document files, directories or glob patterns"
+    )
+    parser.add_argument("--storage-path", default="vector_store")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--threads", type=int, default=INGEST_EMBEDDING_THREADS)
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore the saved index and start over"
+    )
+    args = parser.parse_args()
+
+    data_loader = DataLoader()
+    paths = [
+        file_path for path in args.paths for file_path in data_loader.iter_files(path)
+    ]
+
+    pipeline = IngestionPipeline(
+        VectorStore(storage_path=args.storage_path),
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        num_threads=args.threads,
+    )
+    pipeline.run(paths, resume=not args.restart, prune=args.paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from config.config import (
+    INSTRUMENTATION_ENABLED,
+    LATENCY_BUCKETS_SECONDS,
+    TRACE_JSONL_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageRecord:
+    name: str
+    duration_ms: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class RequestTrace:
+    """Stages, counters and cache hits recorded for one request."""
+
+    name: str
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    stages: List[StageRecord] = field(default_factory=list)
+    counters: Dict[str, float] = field(default_factory=dict)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Return milliseconds spent per stage name."""
+        totals: Dict[str, float] = {}
+        for stage in self.stages:
+            totals[stage.name] = totals.get(stage.name, 0.0) + stage.duration_ms
+        return totals
+
+
+class TraceHook:
+    """
+    Receives spans as stages start and end.
+
+    Subclass it to forward spans to a tracing backend; see OpenTelemetryHook.
+    """
+
+    def start_span(self, name: str, attributes: Dict[str, Any]) -> Any:
+        """Called when a stage starts; the return value is passed to end_span."""
+        return None
+
+    def end_span(
+        self,
+        handle: Any,
+        name: str,
+        duration: float,
+        attributes: Dict[str, Any],
+        error: Optional[BaseException],
+    ) -> None:
+        """Called when a stage ends, with its wall time in seconds."""
+
+    def end_request(self, trace: RequestTrace) -> None:
+        """Called with the complete trace when a request finishes."""
+
+
+class OpenTelemetryHook(TraceHook):
+    """Forward stages as OpenTelemetry spans, nested like the stages."""
+
+    def __init__(self, tracer_name: str = "agentic-rag"):
+        from opentelemetry import context, trace
+
+        self._context = context
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def start_span(self, name: str, attributes: Dict[str, Any]) -> Any:
+        span = self._tracer.start_span(name, attributes=_otel_attributes(attributes))
+        token = self._context.attach(self._trace.set_span_in_context(span))
+        return span, token
+
+    def end_span(self, handle, name, duration, attributes, error) -> None:
+        span, token = handle
+        span.set_attributes(_otel_attributes(attributes))
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        self._context.detach(token)
+        span.end()
+
+
+class JsonlTraceExporter(TraceHook):
+    """Append every finished request trace to a JSON lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def end_request(self, trace: RequestTrace) -> None:
+        line = json.dumps(asdict(trace), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Metrics:
+    """Process-wide latency histograms and counters."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_SECONDS):
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        # stage -> [count per bucket..., +Inf count], sum of seconds
+        self._histograms: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counters: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            counts = self._histograms.setdefault(stage, [0] * (len(self.buckets) + 1))
+            counts[bisect_left(self.buckets, seconds)] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return histograms and counters as plain data."""
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "histograms": {
+                    stage: {
+                        "counts": list(counts),
+                        "count": sum(counts),
+                        "sum": self._sums[stage],
+                    }
+                    for stage, counts in self._histograms.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def prometheus_text(self, prefix: str = "rag") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Wall time of pipeline stages",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in sorted(snapshot["histograms"].items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + [None], histogram["counts"]):
+                cumulative += count
+                le = "+Inf" if bound is None else repr(float(bound))
+                lines.append(
+                    f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]}'
+            )
+            lines.append(
+                f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} '
+                f'{histogram["count"]}'
+            )
+        lines += [
+            f"# HELP {prefix}_events_total Tokens, cache hits and other request events",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._sums.clear()
+            self._counters.clear()
+
+
+metrics = Metrics()
+_hooks: List[TraceHook] = []
+_current: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "rag_request_trace", default=None
+)
+if TRACE_JSONL_PATH:
+    _hooks.append(JsonlTraceExporter(TRACE_JSONL_PATH))
+
+
+def add_hook(hook: TraceHook) -> None:
+    """Register a hook receiving every span and finished request."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: TraceHook) -> None:
+    _hooks.remove(hook)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Return the trace of the request running in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def request(name: str, **attributes: Any) -> Iterator[Optional[RequestTrace]]:
+    """
+    Trace one request; stages and counters inside it are attached to it.
+
+    Args:
+        name: Request kind, e.g. "query"
+        **attributes: Attributes stored on the trace and its root span
+
+    Yields:
+        The RequestTrace, or None if instrumentation is disabled
+    """
+    if not INSTRUMENTATION_ENABLED:
+        yield None
+        return
+    trace = RequestTrace(name=name, attributes=dict(attributes))
+    token = _current.set(trace)
+    try:
+        with stage(name, **attributes):
+            yield trace
+    except BaseException as e:
+        trace.error = repr(e)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A streaming generator closed from another context
+            _current.set(None)
+        trace.duration_ms = sum(
+            record.duration_ms for record in trace.stages if record.name == name
+        )
+        for hook in list(_hooks):
+            try:
+                hook.end_request(trace)
+            except Exception:
+                logger.exception("Trace hook %r failed", hook)
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a pipeline stage.
+
+    The wall time goes to the stage's histogram, the current request trace
+    and every registered hook. Attributes added to the yielded dict before
+    the stage ends are recorded too.
+
+    Args:
+        name: Stage name, e.g. "llm.generate"
+        **attributes: Attributes of the stage
+
+    Yields:
+        The stage's attribute dict
+    """
+    if not INSTRUMENTATION_ENABLED:
+        yield attributes
+        return
+    handles = []
+    for hook in list(_hooks):
+        try:
+            handles.append((hook, hook.start_span(name, attributes)))
+        except Exception:
+            logger.exception("Trace hook %r failed", hook)
+    error = None
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe(name, duration)
+        trace = _current.get()
+        if trace is not None:
+            trace.stages.append(
+                StageRecord(
+                    name=name,
+                    duration_ms=duration * 1000,
+                    attributes=dict(attributes),
+                    error=None if error is None else repr(error),
+                )
+            )
+        for hook, handle in reversed(handles):
+            try:
+                hook.end_span(handle, name, duration, attributes, error)
+            except Exception:
+                logger.exception("Trace hook %r failed", hook)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add to a counter (tokens, cache hits, ...) of the request and the process."""
+    if not INSTRUMENTATION_ENABLED:
+        return
+    metrics.increment(name, value)
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + value
+
+
+def bind(func: Callable) -> Callable:
+    """Run func in the current context, e.g. on an executor thread of the request."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+def _otel_attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items()
+    }
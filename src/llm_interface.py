@@ -1,57 +1,25 @@
 import os
-from typing import List, Tuple
-from crewai import LLM
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
 from langchain_groq import ChatGroq
 from langchain.schema import SystemMessage, HumanMessage
+from .rate_limiter import RateLimiter
+from . import instrumentation
 from config.config import (
     LLM_MODEL,
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
     LLM_MAX_RETRIES,
+    GROQ_REQUESTS_PER_MINUTE,
     CREW_LLM_MODEL,
     CREW_TEMPERATURE,
     CREW_MAX_TOKENS,
     ERROR_MESSAGES,
 )
 
-
-class LLMInterface:
-    def __init__(self):
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.gemini_api_key = os.getenv("GOOGLE_API_KEY")
-
-        if not self.groq_api_key:
-            raise ValueError(ERROR_MESSAGES["api_key_missing"].format(service="Groq"))
-        if not self.gemini_api_key:
-            raise ValueError(ERROR_MESSAGES["api_key_missing"].format(service="Gemini"))
-
-        self.llm = ChatGroq(
-            model=LLM_MODEL,
-            temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS,
-            timeout=None,
-            max_retries=LLM_MAX_RETRIES,
-        )
-
-        self.crew_llm = LLM(
-            model=CREW_LLM_MODEL,
-            api_key=self.gemini_api_key,
-            max_tokens=CREW_MAX_TOKENS,
-            temperature=CREW_TEMPERATURE,
-        )
-
-    def check_local_knowledge(self, query: str, context: str) -> bool:
-        """
-        Check if the query can be answered from local knowledge.
-
-        Args:
-            query: User query
-            context: Local context
-
-        Returns:
-            Boolean indicating if local knowledge is sufficient
-        """
-        prompt = """Role: Knowledge Verification Assistant
+KNOWLEDGE_CHECK_PROMPT = """Role: Knowledge Verification Assistant
 Task: Determine if the provided text contains sufficient information to answer the user's question.
 
 Instructions:
@@ -88,9 +56,113 @@ Now evaluate:
 Text: {text}
 Question: {query}
 """
+
+
+@dataclass
+class GenerationStats:
+    """Timing of one streamed generation."""
+
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Streamed chunks; Groq sends one token per chunk
+    tokens: int = 0
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+
+class LLMInterface:
+    def __init__(self):
+        self.groq_api_key = os.getenv("GROQ_API_KEY")
+        self.gemini_api_key = os.getenv("GOOGLE_API_KEY")
+
+        if not self.groq_api_key:
+            raise ValueError(ERROR_MESSAGES["api_key_missing"].format(service="Groq"))
+        if not self.gemini_api_key:
+            raise ValueError(ERROR_MESSAGES["api_key_missing"].format(service="Gemini"))
+
+        self.llm = ChatGroq(
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            max_tokens=LLM_MAX_TOKENS,
+            timeout=None,
+            max_retries=LLM_MAX_RETRIES,
+        )
+        # Spaces Groq calls from every thread and event loop to stay under the
+        # account's request limit instead of running into 429 retries
+        self.rate_limiter = (
+            RateLimiter(GROQ_REQUESTS_PER_MINUTE) if GROQ_REQUESTS_PER_MINUTE else None
+        )
+
+        self._crew_llm = None
+        self._crew_llm_lock = threading.Lock()
+
+    @property
+    def crew_llm(self):
+        """Gemini LLM driving the web crew, created on first use."""
+        if self._crew_llm is None:
+            with self._crew_llm_lock:
+                if self._crew_llm is None:
+                    # crewai is slow to import and only needed for web queries
+                    from crewai import LLM
+
+                    self._crew_llm = LLM(
+                        model=CREW_LLM_MODEL,
+                        api_key=self.gemini_api_key,
+                        max_tokens=CREW_MAX_TOKENS,
+                        temperature=CREW_TEMPERATURE,
+                    )
+        return self._crew_llm
+
+    def check_local_knowledge(self, query: str, context: str) -> bool:
+        """
+        Check if the query can be answered from local knowledge.
+
+        Args:
+            query: User query
+            context: Local context
+
+        Returns:
+            Boolean indicating if local knowledge is sufficient
+        """
+        try:
+            formatted_prompt = KNOWLEDGE_CHECK_PROMPT.format(text=context, query=query)
+            self._throttle()
+            with instrumentation.stage("llm.route"):
+                response = self.llm.invoke(formatted_prompt)
+            self._record_usage(response)
+            return response.content.strip().lower() == "yes"
+        except Exception as e:
+            raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
+
+    async def acheck_local_knowledge(self, query: str, context: str) -> bool:
+        """
+        Asynchronously check if the query can be answered from local knowledge.
+
+        Args:
+            query: User query
+            context: Local context
+
+        Returns:
+            Boolean indicating if local knowledge is sufficient
+        """
         try:
-            formatted_prompt = prompt.format(text=context, query=query)
-            response = self.llm.invoke(formatted_prompt)
+            formatted_prompt = KNOWLEDGE_CHECK_PROMPT.format(text=context, query=query)
+            await self._athrottle()
+            with instrumentation.stage("llm.route"):
+                response = await self.llm.ainvoke(formatted_prompt)
+            self._record_usage(response)
             return response.content.strip().lower() == "yes"
         except Exception as e:
             raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
@@ -106,7 +178,105 @@ Question: {query}
         Returns:
             Generated answer
         """
-        messages = [
+        messages = self._answer_messages(context, query)
+
+        try:
+            self._throttle()
+            with instrumentation.stage("llm.generate"):
+                response = self.llm.invoke(messages)
+            self._record_usage(response)
+            return response.content
+        except Exception as e:
+            raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
+
+    async def agenerate_answer(self, context: str, query: str) -> str:
+        """
+        Asynchronously generate an answer using the LLM.
+
+        Args:
+            context: Context for the query (includes conversation history and retrieved information)
+            query: User query
+
+        Returns:
+            Generated answer
+        """
+        messages = self._answer_messages(context, query)
+
+        try:
+            await self._athrottle()
+            with instrumentation.stage("llm.generate"):
+                response = await self.llm.ainvoke(messages)
+            self._record_usage(response)
+            return response.content
+        except Exception as e:
+            raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
+
+    def stream_answer(
+        self, context: str, query: str, stats: Optional[GenerationStats] = None
+    ) -> Iterator[str]:
+        """
+        Generate an answer, yielding tokens as the LLM produces them.
+
+        Args:
+            context: Context for the query (includes conversation history and retrieved information)
+            query: User query
+            stats: Optional GenerationStats filled in with timing as tokens arrive
+
+        Returns:
+            Iterator over answer tokens
+        """
+        messages = self._answer_messages(context, query)
+        stats = stats if stats is not None else GenerationStats()
+
+        try:
+            self._throttle()
+            with instrumentation.stage("llm.stream") as attributes:
+                for chunk in self.llm.stream(messages):
+                    self._record_usage(chunk)
+                    if not chunk.content:
+                        continue
+                    if stats.first_token_at is None:
+                        stats.first_token_at = time.perf_counter()
+                        attributes["time_to_first_token_ms"] = (
+                            stats.time_to_first_token * 1000
+                        )
+                    stats.tokens += 1
+                    yield chunk.content
+                stats.finished_at = time.perf_counter()
+                attributes["chunks"] = stats.tokens
+        except Exception as e:
+            raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
+
+    def _throttle(self) -> None:
+        if self.rate_limiter is not None:
+            with instrumentation.stage("llm.rate_limit"):
+                self.rate_limiter.acquire()
+
+    async def _athrottle(self) -> None:
+        if self.rate_limiter is not None:
+            with instrumentation.stage("llm.rate_limit"):
+                await self.rate_limiter.aacquire()
+
+    @staticmethod
+    def _record_usage(message) -> None:
+        """Count the prompt and completion tokens Groq reports for a call."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        prompt = usage.get("input_tokens")
+        completion = usage.get("output_tokens")
+        if prompt is None and completion is None:
+            token_usage = (getattr(message, "response_metadata", None) or {}).get(
+                "token_usage"
+            ) or {}
+            prompt = token_usage.get("prompt_tokens")
+            completion = token_usage.get("completion_tokens")
+        if prompt:
+            instrumentation.count("llm.prompt_tokens", prompt)
+        if completion:
+            instrumentation.count("llm.completion_tokens", completion)
+
+    def _answer_messages(self, context: str, query: str) -> list:
+        """Build the chat messages used to generate an answer."""
+        return [
             SystemMessage(
                 content="""You are a helpful assistant. Use the provided context to answer the query accurately.
                 The context includes both previous conversation history and retrieved information.
@@ -116,9 +286,3 @@ Question: {query}
             SystemMessage(content=f"Context: {context}"),
             HumanMessage(content=query),
         ]
-
-        try:
-            response = self.llm.invoke(messages)
-            return response.content
-        except Exception as e:
-            raise ValueError(ERROR_MESSAGES["llm_error"].format(error=str(e)))
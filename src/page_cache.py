@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from config.config import PDF_PAGE_CACHE_PATH
+
+
+class PageTextCache:
+    """
+    Text extracted from PDF pages, kept across runs.
+
+    Pages are keyed by the hash of their file and their page number, so an
+    unchanged PDF is not opened at all, and also by a fingerprint of the
+    page itself, so pages of an edited PDF that did not change are not
+    extracted again.
+    """
+
+    def __init__(self, path: str = PDF_PAGE_CACHE_PATH):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite file holding the page text, shared by worker processes
+        """
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Worker processes of one ingestion run write to the same file
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    file_hash TEXT PRIMARY KEY,
+                    pages INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS pages (
+                    file_hash TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (file_hash, page)
+                );
+                CREATE INDEX IF NOT EXISTS pages_fingerprint ON pages (fingerprint);
+                """)
+            self._conn.commit()
+
+    def page_count(self, file_hash: str) -> Optional[int]:
+        """Return the number of pages of a fully cached file, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages FROM files WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, file_hash: str, page: int) -> Optional[str]:
+        """Return the text of a page of a file, if cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE file_hash = ? AND page = ?",
+                (file_hash, page),
+            ).fetchone()
+        self._count(row)
+        return row[0] if row is not None else None
+
+    def get_by_fingerprint(self, fingerprint: str) -> Optional[str]:
+        """Return the text of a page with the same fingerprint in any file."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE fingerprint = ? LIMIT 1", (fingerprint,)
+            ).fetchone()
+        self._count(row)
+        return row[0] if row is not None else None
+
+    def put(self, file_hash: str, pages: List[Tuple[int, str, str]]) -> None:
+        """
+        Cache the text of pages of a file.
+
+        Args:
+            file_hash: Hash of the file
+            pages: (page number, page fingerprint, text) of each page
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                [(file_hash, *page) for page in pages],
+            )
+            self._conn.commit()
+
+    def complete(self, file_hash: str, pages: int) -> None:
+        """Record that every page of a file is cached."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?)", (file_hash, pages)
+            )
+            self._conn.commit()
+
+    def record(self, hits: int, misses: int) -> None:
+        """Count lookups made on another connection, such as a worker process's."""
+        self.hits += hits
+        self.misses += misses
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters of page lookups."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Remove every cached page."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM pages")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _count(self, row) -> None:
+        if row is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
@@ -0,0 +1,274 @@
+import hashlib
+import heapq
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import faiss
+import numpy as np
+from .faiss_index import read_index_mmap
+
+MEMBERS_FILE = "members.sqlite"
+
+
+def matches(value: Any, condition: Any) -> bool:
+    """
+    Test a metadata value against a filter condition.
+
+    Args:
+        value: Metadata value
+        condition: A value compared for equality, a list, tuple or set of
+            accepted values, or a callable returning whether value is accepted
+
+    Returns:
+        Whether the value satisfies the condition
+    """
+    if callable(condition):
+        return bool(condition(value))
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return value in condition
+    return value == condition
+
+
+def matches_all(metadata: Dict, conditions: Dict[str, Any]) -> bool:
+    """Test chunk metadata against every condition of a filter."""
+    return all(
+        matches(metadata.get(key), condition) for key, condition in conditions.items()
+    )
+
+
+class PartitionIndex:
+    """
+    Exact FAISS sub-indexes of the chunks, one per value of a metadata key.
+
+    Each chunk is added to the sub-index of its partition as well as to the
+    main index, so a search restricted to a few partitions (one report, one
+    tenant) scans only their vectors. Partition membership is kept in SQLite
+    under stable integer labels; sub-indexes are written to one file per
+    partition, loaded on first use and released once saved, so memory holds
+    only the partitions being changed; searched partitions are memory-mapped.
+    """
+
+    def __init__(self, key: str, path: Optional[str] = None):
+        """
+        Initialize the partitions.
+
+        Args:
+            key: Metadata key whose values partition the chunks
+            path: Directory holding the sub-indexes, or None to keep them in memory
+        """
+        self.key = key
+        self.path = path
+        self._lock = threading.RLock()
+        self._indexes: Dict[str, faiss.Index] = {}
+        # Partitions whose cached index is a read-only memory map of its file
+        self._mmapped: Set[str] = set()
+        # Partitions changed since the last commit
+        self._dirty: Set[str] = set()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self.members_path = os.path.join(path, MEMBERS_FILE)
+        else:
+            # Named so BM25Index.attach_partitions can open it too
+            self.members_path = (
+                f"file:partitions-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            )
+        self._conn = sqlite3.connect(
+            self.members_path, check_same_thread=False, uri=True
+        )
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS members (
+                    label INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    partition TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS members_partition ON members (partition);
+                """)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+
+    def values(self) -> List[str]:
+        """Return every partition value."""
+        with self._lock:
+            return [
+                row[0]
+                for row in self._conn.execute("SELECT DISTINCT partition FROM members")
+            ]
+
+    def match(self, condition: Any) -> List[str]:
+        """Return the partition values satisfying a filter condition."""
+        if callable(condition):
+            return [value for value in self.values() if matches(value, condition)]
+        wanted = (
+            condition
+            if isinstance(condition, (list, tuple, set, frozenset))
+            else [condition]
+        )
+        known = set(self.values())
+        return [str(value) for value in wanted if str(value) in known]
+
+    def add(
+        self, ids: List[str], metadatas: List[Dict], vectors: List[List[float]]
+    ) -> None:
+        """Add chunks to the sub-index of their partition."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        groups: Dict[str, List[int]] = {}
+        for row, metadata in enumerate(metadatas):
+            groups.setdefault(str(metadata.get(self.key, "")), []).append(row)
+        with self._lock:
+            self.delete(ids)
+            for partition, rows in groups.items():
+                labels = []
+                for row in rows:
+                    cursor = self._conn.execute(
+                        "INSERT INTO members (id, partition) VALUES (?, ?)",
+                        (ids[row], partition),
+                    )
+                    labels.append(cursor.lastrowid)
+                index = self._index(partition, dim=vectors.shape[1], writable=True)
+                index.add_with_ids(vectors[rows], np.asarray(labels, dtype=np.int64))
+                self._dirty.add(partition)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove chunks by id."""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            groups: Dict[str, List[int]] = {}
+            for doc_id in ids:
+                row = self._conn.execute(
+                    "SELECT label, partition FROM members WHERE id = ?", (doc_id,)
+                ).fetchone()
+                if row is not None:
+                    groups.setdefault(row[1], []).append(row[0])
+            for partition, labels in groups.items():
+                index = self._index(partition, writable=True)
+                if index is not None:
+                    index.remove_ids(np.asarray(labels, dtype=np.int64))
+                    self._dirty.add(partition)
+            self._conn.executemany(
+                "DELETE FROM members WHERE id = ?", [(doc_id,) for doc_id in ids]
+            )
+
+    def search(
+        self, vectors: np.ndarray, k: int, partitions: List[str]
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search the given partitions and merge their hits.
+
+        Args:
+            vectors: Query vectors, one row per query
+            k: Number of hits per query
+            partitions: Partition values to search
+
+        Returns:
+            Per query, up to k (chunk id, squared L2 distance) pairs, nearest first
+        """
+        hits: List[List[Tuple[float, int]]] = [[] for _ in range(len(vectors))]
+        with self._lock:
+            for partition in partitions:
+                index = self._index(partition)
+                if index is None or index.ntotal == 0:
+                    continue
+                distances, labels = index.search(vectors, min(k, index.ntotal))
+                for query_hits, row_distances, row_labels in zip(
+                    hits, distances, labels
+                ):
+                    query_hits.extend(
+                        (float(distance), int(label))
+                        for distance, label in zip(row_distances, row_labels)
+                        if label != -1
+                    )
+            merged = [heapq.nsmallest(k, query_hits) for query_hits in hits]
+            wanted = {label for query_hits in merged for _, label in query_hits}
+            id_of = dict(
+                self._conn.execute(
+                    f"SELECT label, id FROM members WHERE label IN "
+                    f"({','.join('?' * len(wanted))})",
+                    list(wanted),
+                ).fetchall()
+                if wanted
+                else []
+            )
+        return [
+            [(id_of[label], distance) for distance, label in query_hits]
+            for query_hits in merged
+        ]
+
+    def clear(self) -> None:
+        """Remove every partition."""
+        with self._lock:
+            partitions = self.values()
+            self._conn.execute("DELETE FROM members")
+            self._indexes.clear()
+            self._mmapped.clear()
+            self._dirty.clear()
+            if self.path is not None:
+                for partition in partitions:
+                    if os.path.exists(self._file(partition)):
+                        os.remove(self._file(partition))
+
+    def commit(self) -> None:
+        """Write changed sub-indexes and membership, then release the sub-indexes."""
+        with self._lock:
+            if self.path is not None:
+                for partition in self._dirty:
+                    index = self._indexes.get(partition)
+                    if index is None:
+                        continue
+                    if index.ntotal == 0:
+                        if os.path.exists(self._file(partition)):
+                            os.remove(self._file(partition))
+                        continue
+                    tmp_path = self._file(partition) + ".tmp"
+                    faiss.write_index(index, tmp_path)
+                    os.replace(tmp_path, self._file(partition))
+                for partition in self._dirty:
+                    self._indexes.pop(partition, None)
+            self._dirty.clear()
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _index(
+        self, partition: str, dim: Optional[int] = None, writable: bool = False
+    ) -> Optional[faiss.Index]:
+        """
+        Return the sub-index of a partition, loading it as needed.
+
+        Args:
+            partition: Partition value
+            dim: Vector dimension, to create the sub-index if it does not exist
+            writable: Whether the sub-index is about to be changed
+
+        Returns:
+            The sub-index, or None if the partition has none and dim is not given
+        """
+        index = self._indexes.get(partition)
+        if index is not None and writable and partition in self._mmapped:
+            index = None
+        if index is None and self.path is not None:
+            if os.path.exists(self._file(partition)):
+                if writable:
+                    index = faiss.read_index(self._file(partition))
+                    self._mmapped.discard(partition)
+                else:
+                    index = read_index_mmap(self._file(partition))
+                    self._mmapped.add(partition)
+        if index is None and dim is not None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if index is not None:
+            self._indexes[partition] = index
+        return index
+
+    def _file(self, partition: str) -> str:
+        name = hashlib.sha1(partition.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{name}.faiss")
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    def __init__(self, max_calls: int, period: float = 60.0):
+        """
+        Initialize a sliding-window rate limiter.
+
+        At most max_calls calls start in any window of period seconds. The
+        limiter is shared by threads and event loops alike: each caller
+        reserves the earliest free start time and then waits for it.
+
+        Args:
+            max_calls: Calls allowed per window
+            period: Window length in seconds
+        """
+        self.max_calls = max_calls
+        self.period = period
+        self._lock = threading.Lock()
+        self._starts = deque()
+        self.waited = 0.0
+
+    def reserve(self) -> float:
+        """Reserve the next call slot and return the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = now
+            if len(self._starts) >= self.max_calls:
+                start = max(now, self._starts[0] + self.period)
+                self._starts.popleft()
+            self._starts.append(start)
+            delay = start - now
+            self.waited += delay
+            return delay
+
+    def acquire(self) -> None:
+        """Block until a call may start."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self) -> None:
+        """Wait without blocking the event loop until a call may start."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+from .data_loader import DataLoader
+from .vector_store import RetrievalResult, VectorStore
+from config.config import (
+    ROUTER_ACCEPT_THRESHOLD,
+    ROUTER_REJECT_THRESHOLD,
+    ROUTER_MARGIN_THRESHOLD,
+    ROUTER_TARGET_PRECISION,
+    ROUTER_THRESHOLDS_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RoutingDecision:
+    # True: answer locally, False: go to the web, None: ask the LLM judge
+    local: Optional[bool]
+    reason: str
+    top_score: float
+    margin: float
+
+
+@dataclass
+class RouterThresholds:
+    accept: float = ROUTER_ACCEPT_THRESHOLD
+    reject: float = ROUTER_REJECT_THRESHOLD
+    margin: float = ROUTER_MARGIN_THRESHOLD
+
+
+class ScoreRouter:
+    def __init__(self, thresholds: Optional[RouterThresholds] = None):
+        """
+        Initialize a router deciding from retrieval scores.
+
+        Confident matches are answered locally and clear misses go to the web
+        without an LLM call; only queries in the uncertain band between the
+        thresholds are escalated to the LLM judge.
+
+        Args:
+            thresholds: Decision thresholds, defaults from config
+        """
+        self.thresholds = thresholds or RouterThresholds()
+        self.counts = {"local": 0, "web": 0, "escalated": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str = ROUTER_THRESHOLDS_PATH) -> "ScoreRouter":
+        """Create a router using calibrated thresholds if the file exists."""
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(RouterThresholds(**json.load(f)))
+        return cls()
+
+    def decide(self, retrieval: RetrievalResult) -> RoutingDecision:
+        """
+        Decide where a query should be answered from.
+
+        Args:
+            retrieval: Retrieval result for the query
+
+        Returns:
+            RoutingDecision with the reason it was taken
+        """
+        top_score, margin = score_features(retrieval.dense_scores)
+        local, reason = classify(self.thresholds, top_score, margin)
+        decision = RoutingDecision(local, reason, top_score, margin)
+
+        key = {True: "local", False: "web", None: "escalated"}[decision.local]
+        with self._lock:
+            self.counts[key] += 1
+        logger.info(
+            "Routing %s: %s (LLM calls saved %d of %d)",
+            key,
+            decision.reason,
+            self.counts["local"] + self.counts["web"],
+            sum(self.counts.values()),
+        )
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        """Return decision counts and the share of LLM judge calls saved."""
+        total = sum(self.counts.values())
+        saved = self.counts["local"] + self.counts["web"]
+        return {
+            **self.counts,
+            "llm_calls_saved": saved,
+            "saved_rate": saved / total if total else 0.0,
+        }
+
+
+def score_features(scores: List[float]) -> Tuple[float, float]:
+    """Return (top similarity, margin of the top hit over the rest)."""
+    if not scores:
+        return 0.0, 0.0
+    top_score = scores[0]
+    rest = scores[1:]
+    margin = top_score - sum(rest) / len(rest) if rest else 0.0
+    return top_score, margin
+
+
+def classify(
+    thresholds: RouterThresholds, top_score: float, margin: float
+) -> Tuple[Optional[bool], str]:
+    """Apply thresholds to score features and explain the outcome."""
+    if top_score >= thresholds.accept:
+        return True, f"top score {top_score:.3f} >= {thresholds.accept:.3f}"
+    if top_score < thresholds.reject:
+        return False, f"top score {top_score:.3f} < {thresholds.reject:.3f}"
+    if margin >= thresholds.margin:
+        return True, f"score margin {margin:.3f} >= {thresholds.margin:.3f}"
+    return None, f"uncertain (top {top_score:.3f}, margin {margin:.3f})"
+
+
+def calibrate(
+    examples: List[Tuple[List[float], bool]],
+    target_precision: float = ROUTER_TARGET_PRECISION,
+) -> RouterThresholds:
+    """
+    Choose thresholds from labelled examples.
+
+    Each threshold is set as loosely as possible while the decisions it makes
+    on its own stay at least target_precision correct; everything else is
+    left to the LLM judge.
+
+    Args:
+        examples: (retrieval scores, whether the query is answerable locally)
+        target_precision: Minimum precision of score-only decisions
+
+    Returns:
+        Calibrated RouterThresholds
+    """
+    features = [(*score_features(scores), label) for scores, label in examples]
+    defaults = RouterThresholds()
+
+    def first_precise(candidates, selects, want):
+        for value in candidates:
+            chosen = [
+                label for top, margin, label in features if selects(top, margin, value)
+            ]
+            if (
+                chosen
+                and sum(label == want for label in chosen) / len(chosen)
+                >= target_precision
+            ):
+                return value
+        return None
+
+    tops = sorted({top for top, _, _ in features})
+    # Lowest accept threshold whose "local" decisions are precise enough
+    accept = first_precise(tops, lambda top, margin, v: top >= v, True)
+    accept = defaults.accept if accept is None else accept
+    # Highest reject threshold whose "web" decisions are precise enough
+    reject = first_precise(
+        [top + 1e-6 for top in reversed(tops)], lambda top, margin, v: top < v, False
+    )
+    reject = min(defaults.reject if reject is None else reject, accept)
+
+    def in_band(top):
+        return reject <= top < accept
+
+    margins = sorted({margin for top, margin, _ in features if in_band(top)})
+    margin = first_precise(
+        margins, lambda top, margin, v: in_band(top) and margin >= v, True
+    )
+    margin = defaults.margin if margin is None else margin
+    return RouterThresholds(accept=accept, reject=reject, margin=margin)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibrate score-based routing thresholds"
+    )
+    parser.add_argument(
+        "labels",
+        help='JSONL file of {"query": ..., "local": true|false} labelled queries',
+    )
+    parser.add_argument("--documents", default="data", help="Documents to index")
+    parser.add_argument("--output", default=ROUTER_THRESHOLDS_PATH)
+    parser.add_argument(
+        "--target-precision", type=float, default=ROUTER_TARGET_PRECISION
+    )
+    args = parser.parse_args()
+
+    vector_store = VectorStore()
+    vector_store.create_vector_store(DataLoader().load_documents(args.documents))
+
+    examples = []
+    with open(args.labels, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                retrieval = vector_store.retrieve(record["query"])
+                examples.append((retrieval.dense_scores, bool(record["local"])))
+
+    thresholds = calibrate(examples, args.target_precision)
+    outcomes = [
+        (classify(thresholds, *score_features(scores))[0], label)
+        for scores, label in examples
+    ]
+    decided = [(local, label) for local, label in outcomes if local is not None]
+    correct = sum(local == label for local, label in decided)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(asdict(thresholds), f, indent=2)
+    print(f"Thresholds written to {args.output}: {asdict(thresholds)}")
+    print(
+        f"Decided without the LLM judge: {len(decided)}/{len(examples)} "
+        f"({correct} correct)"
+    )
+
+
+if __name__ == "__main__":
+    main()
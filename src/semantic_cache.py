@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from config.config import (
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_PATH,
+)
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    embedding: np.ndarray
+    answer: str
+    sources: List[str]
+    created_at: float
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        persist_path: Optional[str] = SEMANTIC_CACHE_PATH,
+    ):
+        """
+        Initialize a cache of answers keyed on query embeddings.
+
+        A lookup hits when a cached query has cosine similarity of at least
+        threshold with the new query. Entries expire after ttl seconds and the
+        least recently used entries are evicted beyond max_entries.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl: Entry lifetime in seconds
+            max_entries: Maximum number of cached answers
+            persist_path: Optional SQLite file keeping the cache across restarts
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        # Stacked embeddings of _entries, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+        self._conn = None
+        if persist_path:
+            self._conn = sqlite3.connect(persist_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    sources TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """)
+            self._load()
+
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        """
+        Return the cached answer for a similar query, if any.
+
+        Args:
+            embedding: Query embedding
+
+        Returns:
+            Cached answer, or None on a miss
+        """
+        query_vector = self._normalize(embedding)
+        with self._lock:
+            self._expire()
+            if self._entries:
+                matrix, ids = self._stacked()
+                if matrix.shape[1] != query_vector.shape[0]:
+                    # Entries from another embedding model can never match
+                    for entry_id in list(self._entries):
+                        self._remove(entry_id)
+                    self._commit()
+                    self.misses += 1
+                    return None
+                similarities = matrix @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id].answer
+            self.misses += 1
+            return None
+
+    def put(
+        self, query: str, embedding: List[float], answer: str, sources: List[str]
+    ) -> None:
+        """
+        Cache an answer.
+
+        Args:
+            query: Query text
+            embedding: Query embedding
+            answer: Answer to return for similar queries
+            sources: Sources the answer was built from, used for invalidation
+        """
+        entry = CacheEntry(
+            query=query,
+            embedding=self._normalize(embedding),
+            answer=answer,
+            sources=sorted(set(sources)),
+            created_at=time.time(),
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._matrix = None
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        entry_id,
+                        entry.query,
+                        entry.embedding.tobytes(),
+                        entry.answer,
+                        json.dumps(entry.sources),
+                        entry.created_at,
+                    ),
+                )
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._commit()
+
+    def invalidate_source(self, source: str) -> int:
+        """
+        Drop every answer built from a source, e.g. after it was re-indexed.
+
+        Args:
+            source: Source document path
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            stale = [
+                entry_id
+                for entry_id, entry in self._entries.items()
+                if source in entry.sources
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self._commit()
+        return len(stale)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._remove(entry_id)
+            self._commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def _stacked(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = np.stack(
+                [self._entries[entry_id].embedding for entry_id in self._matrix_ids]
+            )
+        return self._matrix, self._matrix_ids
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [
+            entry_id
+            for entry_id, entry in self._entries.items()
+            if entry.created_at < cutoff
+        ]
+        for entry_id in expired:
+            self._remove(entry_id)
+        if expired:
+            self._commit()
+
+    def _remove(self, entry_id: int) -> None:
+        del self._entries[entry_id]
+        self._matrix = None
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+
+    def _commit(self) -> None:
+        if self._conn is not None:
+            self._conn.commit()
+
+    def _load(self) -> None:
+        """Restore persisted entries, oldest first so LRU order is kept."""
+        cutoff = time.time() - self.ttl
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT id, query, embedding, answer, sources, created_at "
+            "FROM entries ORDER BY id"
+        ).fetchall()
+        for entry_id, query, embedding, answer, sources, created_at in rows:
+            self._entries[entry_id] = CacheEntry(
+                query=query,
+                embedding=np.frombuffer(embedding, dtype=np.float32),
+                answer=answer,
+                sources=json.loads(sources),
+                created_at=created_at,
+            )
+            self._next_id = entry_id + 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        self._commit()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,439 @@
+import argparse
+import heapq
+import json
+import logging
+import math
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from config.config import SHARD_AUTHKEY
+from .partitions import PartitionIndex
+
+logger = logging.getLogger(__name__)
+
+# A shard keeps its vectors as the single partition of a PartitionIndex, which
+# provides the id labels, the on-disk format and memory-mapped loading
+_SHARD_KEY = "shard"
+_SHARD_PARTITION = ""
+
+# Shard methods clients may call
+_METHODS = {"count", "add", "delete", "search", "commit", "clear"}
+
+# Length prefix of the JSON header of a message
+_HEADER_SIZE = struct.Struct("!I")
+
+
+def shared_authkey() -> bytes:
+    """
+    Return the secret shared with shard servers on other hosts.
+
+    Raises:
+        ValueError: If SHARD_AUTHKEY is not set
+    """
+    if not SHARD_AUTHKEY:
+        raise ValueError(
+            "SHARD_AUTHKEY must be set in the environment to serve or connect "
+            "to shard servers"
+        )
+    return SHARD_AUTHKEY.encode("utf-8")
+
+
+def send_message(
+    conn: Connection, header: Dict[str, Any], vectors: Optional[np.ndarray] = None
+) -> None:
+    """
+    Send a message: a length-prefixed JSON header, then raw float32 vectors.
+
+    Nothing is pickled, so a peer can only send data, never code.
+    """
+    payload = b""
+    if vectors is not None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        header = {**header, "shape": list(vectors.shape)}
+        payload = vectors.tobytes()
+    body = json.dumps(header).encode("utf-8")
+    conn.send_bytes(_HEADER_SIZE.pack(len(body)) + body + payload)
+
+
+def recv_message(conn: Connection) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+    """
+    Receive a message sent with send_message.
+
+    Returns:
+        Tuple of (header, vectors or None)
+    """
+    data = conn.recv_bytes()
+    (size,) = _HEADER_SIZE.unpack_from(data)
+    start = _HEADER_SIZE.size + size
+    header = json.loads(data[_HEADER_SIZE.size : start].decode("utf-8"))
+    vectors = None
+    if "shape" in header:
+        vectors = np.frombuffer(data, dtype=np.float32, offset=start).reshape(
+            header["shape"]
+        )
+    return header, vectors
+
+
+class Shard:
+    """One slice of the corpus vectors, searched exactly."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the shard.
+
+        Args:
+            path: Directory holding the shard, or None to keep it in memory
+        """
+        self.index = PartitionIndex(_SHARD_KEY, path)
+
+    def count(self) -> int:
+        return len(self.index)
+
+    def add(self, ids: List[str], vectors: np.ndarray) -> int:
+        self.index.add(ids, [{}] * len(ids), vectors)
+        return len(self.index)
+
+    def delete(self, ids: List[str]) -> int:
+        self.index.delete(ids)
+        return len(self.index)
+
+    def search(self, k: int, vectors: np.ndarray) -> List[List[Tuple[str, float]]]:
+        return self.index.search(vectors, k, [_SHARD_PARTITION])
+
+    def commit(self) -> None:
+        self.index.commit()
+
+    def clear(self) -> None:
+        self.index.clear()
+        self.index.commit()
+
+
+def serve(listener: Listener, shard: Shard, authkey: bytes) -> None:
+    """
+    Answer shard requests until a client asks the server to shut down.
+
+    A request header names a Shard method and its JSON arguments, with the
+    vectors argument, if any, sent as raw float32 data; the reply header
+    holds "result" or "error". Each client connection is served by its own
+    thread.
+
+    Args:
+        listener: Listener accepting authenticated client connections
+        shard: Shard to serve
+        authkey: Secret the listener authenticates clients with
+    """
+    stopped = threading.Event()
+
+    def handle(conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    request, vectors = recv_message(conn)
+                except (EOFError, OSError):
+                    return
+                except ValueError as e:
+                    send_message(conn, {"error": f"Malformed request: {e}"})
+                    continue
+                method = request.get("method")
+                if method == "shutdown":
+                    send_message(conn, {"result": None})
+                    stopped.set()
+                    # Unblock accept() in the serving thread
+                    try:
+                        Client(listener.address, authkey=authkey).close()
+                    except OSError:
+                        pass
+                    return
+                if method not in _METHODS:
+                    send_message(conn, {"error": f"Unknown shard method: {method}"})
+                    continue
+                kwargs = {"vectors": vectors} if vectors is not None else {}
+                try:
+                    result = getattr(shard, method)(*request.get("args", []), **kwargs)
+                    send_message(conn, {"result": result})
+                except Exception as e:
+                    logger.exception("Shard request %s failed", method)
+                    send_message(conn, {"error": f"{type(e).__name__}: {e}"})
+
+    with listener:
+        while not stopped.is_set():
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError):
+                # Failed authentication or an aborted connection
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    shard.commit()
+
+
+def _run_local_shard(path: Optional[str], authkey: bytes, ready: Connection) -> None:
+    """Entry point of a local shard worker process."""
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    ready.send(listener.address)
+    ready.close()
+    serve(listener, Shard(path), authkey)
+
+
+class ShardClient:
+    """Connection to one shard server."""
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, process=None):
+        """
+        Connect to a shard.
+
+        Args:
+            address: (host, port) of the shard server
+            authkey: Secret shared with the server
+            process: Local worker process serving the shard, if started here
+        """
+        self.address = address
+        self.process = process
+        self._conn = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+
+    def call(
+        self, method: str, *args: Any, vectors: Optional[np.ndarray] = None
+    ) -> Any:
+        """
+        Run a Shard method on the server.
+
+        Args:
+            method: Shard method name
+            args: JSON-serializable arguments
+            vectors: Vectors passed as the method's vectors argument
+
+        Raises:
+            ValueError: If the shard failed to run the request
+        """
+        with self._lock:
+            send_message(self._conn, {"method": method, "args": list(args)}, vectors)
+            reply, _ = recv_message(self._conn)
+        if "error" in reply:
+            raise ValueError(
+                f"Shard {self.address[0]}:{self.address[1]}: {reply['error']}"
+            )
+        return reply["result"]
+
+    def close(self, shutdown: bool = False) -> None:
+        """Close the connection, stopping the server first if shutdown is set."""
+        try:
+            if shutdown:
+                self.call("shutdown")
+            self._conn.close()
+        except (EOFError, OSError):
+            pass
+        if self.process is not None:
+            self.process.join(timeout=10)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split a "host:port" shard address."""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid shard address: {address}")
+    return host, int(port)
+
+
+class ShardedIndex:
+    """
+    Exact vector search scattered over shards and gathered by distance.
+
+    Shards are local worker processes, each holding its slice of the vectors
+    in storage under path, or shard servers on other hosts started with
+    `python -m src.shards serve`. New chunks go to the shards holding the
+    fewest vectors, so a shard added later fills up as the corpus grows
+    without re-indexing the others. A search sends the query vectors to
+    every shard at once and merges their top-k lists.
+    """
+
+    def __init__(
+        self,
+        count: int = 0,
+        addresses: Iterable[str] = (),
+        path: Optional[str] = None,
+    ):
+        """
+        Start or connect to the shards.
+
+        Args:
+            count: Number of local shard worker processes
+            addresses: "host:port" addresses of remote shard servers
+            path: Directory holding the local shards, or None to keep them in memory
+        """
+        self.path = path
+        self.shards: List[ShardClient] = []
+        self._counts: List[int] = []
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # Local workers are only reachable with a key that never leaves this run
+        self._local_authkey = os.urandom(32)
+        for _ in range(count):
+            self.add_shard()
+        for address in addresses:
+            self.add_shard(address)
+
+    def add_shard(self, address: Optional[str] = None) -> None:
+        """
+        Add an empty or previously saved shard.
+
+        Args:
+            address: "host:port" of a remote shard server, or None to start a
+                local worker process
+        """
+        with self._lock:
+            if address is not None:
+                client = ShardClient(parse_address(address), shared_authkey())
+            else:
+                client = self._start_local(len(self.shards))
+            self.shards.append(client)
+            self._counts.append(client.call("count"))
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = ThreadPoolExecutor(
+                max_workers=len(self.shards), thread_name_prefix="shard"
+            )
+
+    def _start_local(self, number: int) -> ShardClient:
+        path = None
+        if self.path is not None:
+            path = os.path.join(self.path, f"shard-{number}")
+        # Spawned workers do not inherit the parent's threads and locks
+        context = multiprocessing.get_context("spawn")
+        ready, ready_child = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_local_shard,
+            args=(path, self._local_authkey, ready_child),
+            name=f"shard-{number}",
+            daemon=True,
+        )
+        process.start()
+        ready_child.close()
+        return ShardClient(ready.recv(), self._local_authkey, process)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def counts(self) -> List[int]:
+        """Return the number of vectors held by each shard."""
+        return list(self._counts)
+
+    def add(self, ids: List[str], vectors: List[List[float]]) -> None:
+        """Add vectors, topping up the emptiest shards so all stay level."""
+        if not ids:
+            return
+        ids = list(ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        level = (sum(self._counts) + len(ids)) / len(self.shards)
+        start = 0
+        futures = []
+        for number in sorted(range(len(self.shards)), key=self._counts.__getitem__):
+            take = min(
+                len(ids) - start, max(0, math.ceil(level - self._counts[number]))
+            )
+            if take:
+                stop = start + take
+                futures.append(
+                    (
+                        number,
+                        self._pool.submit(
+                            self.shards[number].call,
+                            "add",
+                            ids[start:stop],
+                            vectors=vectors[start:stop],
+                        ),
+                    )
+                )
+                start = stop
+        for number, future in futures:
+            self._counts[number] = future.result()
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove vectors by id from whichever shards hold them."""
+        ids = list(ids)
+        if ids:
+            self._counts = self._broadcast("delete", ids)
+
+    def search(self, vectors: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        """
+        Search every shard in parallel and merge their hits.
+
+        Args:
+            vectors: Query vectors, one row per query
+            k: Number of hits per query
+
+        Returns:
+            Per query, up to k (chunk id, squared L2 distance) pairs, nearest first
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        per_shard = self._broadcast("search", k, vectors=vectors)
+        return [
+            heapq.nsmallest(
+                k,
+                (
+                    (doc_id, distance)
+                    for hits in query_hits
+                    for doc_id, distance in hits
+                ),
+                key=lambda hit: hit[1],
+            )
+            for query_hits in zip(*per_shard)
+        ]
+
+    def commit(self) -> None:
+        """Make every shard write its changes to disk."""
+        self._broadcast("commit")
+
+    def clear(self) -> None:
+        """Remove every vector from every shard."""
+        self._broadcast("clear")
+        self._counts = [0] * len(self.shards)
+
+    def close(self) -> None:
+        """Disconnect, stopping the local shard workers."""
+        for client in self.shards:
+            client.close(shutdown=client.process is not None)
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _broadcast(
+        self, method: str, *args: Any, vectors: Optional[np.ndarray] = None
+    ) -> List[Any]:
+        """Run a method on every shard at once and return the results in order."""
+        futures = [
+            self._pool.submit(client.call, method, *args, vectors=vectors)
+            for client in self.shards
+        ]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a vector store shard")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve one shard, e.g. on another host"
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Interface to listen on, e.g. 0.0.0.0"
+    )
+    serve_parser.add_argument("--port", type=int, default=7070)
+    serve_parser.add_argument("--path", required=True, help="Shard storage directory")
+    args = parser.parse_args()
+
+    try:
+        authkey = shared_authkey()
+    except ValueError as e:
+        parser.error(str(e))
+    logging.basicConfig(level=logging.INFO)
+    listener = Listener((args.host, args.port), authkey=authkey)
+    logger.info("Serving shard %s on %s:%d", args.path, args.host, args.port)
+    serve(listener, Shard(args.path), authkey)
+
+
+if __name__ == "__main__":
+    main()
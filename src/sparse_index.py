@@ -0,0 +1,259 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from config.config import BM25_K1, BM25_B, BM25_COMMON_TERM_RATIO
+
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.,]\d+)*")
+
+# Frequent words that carry no signal but would dominate the postings
+_STOPWORDS = frozenset(
+    """a an and are as at be by for from has have in is it its of on or that the
+    their this to was were which with what when how who""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and number tokens; "Q3-2024" gives ["q3", "2024"]."""
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in _STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over chunk text, kept in SQLite.
+
+    Postings are stored per (term, document id) so chunks can be added and
+    removed one by one as the vector store changes, and a query reads only
+    the postings of its own terms. Document frequencies are kept per term,
+    so terms too common to matter are skipped before their postings are
+    read, and scores are summed and ranked inside SQLite.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        common_term_ratio: float = BM25_COMMON_TERM_RATIO,
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.common_term_ratio = common_term_ratio
+        self._lock = threading.Lock()
+        # uri=True so partition memberships of in-memory stores can be attached
+        self._conn = sqlite3.connect(path, check_same_thread=False, uri=True)
+        self._partitions_attached = False
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_id ON postings (id);
+                CREATE TABLE IF NOT EXISTS lengths (
+                    id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS terms (
+                    term TEXT PRIMARY KEY,
+                    df INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                """)
+            # Indexes written before document frequencies were kept
+            if self._conn.execute("SELECT 1 FROM postings LIMIT 1").fetchone() and (
+                not self._conn.execute("SELECT 1 FROM terms LIMIT 1").fetchone()
+            ):
+                self._conn.execute(
+                    "INSERT INTO terms SELECT term, COUNT(*) FROM postings GROUP BY term"
+                )
+            self._conn.commit()
+            self._count, self._total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lengths"
+            ).fetchone()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, documents: Iterable[Tuple[str, str]]) -> None:
+        """Index (id, text) pairs; they become durable on the next commit."""
+        documents = list(documents)
+        self.delete([doc_id for doc_id, _ in documents])
+        postings = []
+        lengths = []
+        for doc_id, text in documents:
+            counts = Counter(tokenize(text))
+            postings.extend((term, doc_id, tf) for term, tf in counts.items())
+            lengths.append((doc_id, sum(counts.values())))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)", postings
+            )
+            self._conn.executemany(
+                "INSERT INTO lengths (id, length) VALUES (?, ?)", lengths
+            )
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, 1) "
+                "ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                [(term,) for term, _, _ in postings],
+            )
+            self._count += len(lengths)
+            self._total_length += sum(length for _, length in lengths)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove documents by id."""
+        ids = [(doc_id,) for doc_id in ids]
+        if not ids:
+            return
+        with self._lock:
+            removed = []
+            for (doc_id,) in ids:
+                row = self._conn.execute(
+                    "SELECT length FROM lengths WHERE id = ?", (doc_id,)
+                ).fetchone()
+                if row is not None:
+                    removed.append(row[0])
+                    self._conn.execute(
+                        "UPDATE terms SET df = df - 1 WHERE term IN "
+                        "(SELECT term FROM postings WHERE id = ?)",
+                        (doc_id,),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM terms WHERE df <= 0 AND term IN "
+                        "(SELECT term FROM postings WHERE id = ?)",
+                        (doc_id,),
+                    )
+            self._conn.executemany("DELETE FROM postings WHERE id = ?", ids)
+            self._conn.executemany("DELETE FROM lengths WHERE id = ?", ids)
+            self._count -= len(removed)
+            self._total_length -= sum(removed)
+
+    def clear(self) -> None:
+        """Remove every document."""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM lengths")
+            self._conn.execute("DELETE FROM terms")
+            self._count = self._total_length = 0
+
+    def search(
+        self, query: str, k: int, partitions: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank documents against a query.
+
+        Args:
+            query: Query text
+            k: Number of results
+            partitions: Partitions of the only documents to rank, see
+                attach_partitions
+
+        Returns:
+            Up to k (document id, BM25 score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        if not terms or not self._count:
+            return []
+        with self._lock:
+            weights = self._term_weights(terms)
+            if not weights:
+                return []
+            sql = (
+                "WITH weights (term, idf) AS (VALUES "
+                + ", ".join("(?, ?)" for _ in weights)
+                + ") SELECT p.id, SUM(w.idf * p.tf * ? / (p.tf + ? * (? + ? * l.length)))"
+                " AS score FROM weights w"
+                " JOIN postings p ON p.term = w.term"
+                " JOIN lengths l ON l.id = p.id"
+            )
+            params = [value for weight in weights.items() for value in weight]
+            average_length = self._total_length / self._count
+            params += [self.k1 + 1, self.k1, 1 - self.b, self.b / average_length]
+            if partitions is not None:
+                if not self._partitions_attached:
+                    raise ValueError("Partitions are not attached to the BM25 index")
+                sql += (
+                    " JOIN partitions.members m ON m.id = p.id WHERE m.partition IN "
+                    f"({','.join('?' * len(partitions))})"
+                )
+                params += list(partitions)
+            sql += " GROUP BY p.id ORDER BY score DESC LIMIT ?"
+            return self._conn.execute(sql, params + [k]).fetchall()
+
+    def attach_partitions(self, members_path: str) -> None:
+        """
+        Attach the membership table of a PartitionIndex, so searches can be
+        limited to partitions with a join instead of a list of ids.
+
+        Args:
+            members_path: SQLite file or URI of the PartitionIndex members
+        """
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS partitions", (members_path,))
+            # Shared-cache memory databases would otherwise lock out reads of
+            # memberships not yet committed by the PartitionIndex
+            self._conn.execute("PRAGMA read_uncommitted = 1")
+            self._partitions_attached = True
+
+    def _term_weights(self, terms: Set[str]) -> Dict[str, float]:
+        """
+        Return the IDF of the query terms worth scoring.
+
+        Terms found in more than common_term_ratio of the documents add
+        little to the ranking but have the longest postings, so they are
+        dropped when the query has rarer terms to rank by.
+        """
+        terms = list(terms)
+        frequencies = dict(
+            self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN "
+                f"({','.join('?' * len(terms))})",
+                terms,
+            ).fetchall()
+        )
+        rare = {
+            term: df
+            for term, df in frequencies.items()
+            if df <= self.common_term_ratio * self._count
+        }
+        return {
+            term: math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+            for term, df in (rare or frequencies).items()
+        }
+
+    def commit(self) -> None:
+        """Make pending changes durable."""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[List[str]], k: int
+) -> List[Tuple[str, float]]:
+    """
+    Merge ranked id lists by reciprocal-rank fusion.
+
+    Args:
+        rankings: Id lists, best first
+        k: RRF constant damping the weight of top ranks
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
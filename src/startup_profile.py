@@ -0,0 +1,93 @@
+import argparse
+import re
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def profile_imports(module: str = "src.app") -> List[ImportTiming]:
+    """
+    Measure import times of a module in a fresh interpreter.
+
+    Runs python -X importtime, so every measurement starts from a cold
+    module cache, and parses its report.
+
+    Args:
+        module: Module to import
+
+    Returns:
+        One ImportTiming per imported module, in import order
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise ValueError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append(
+                ImportTiming(
+                    module=name,
+                    self_ms=int(self_us) / 1000,
+                    cumulative_ms=int(cumulative_us) / 1000,
+                    depth=(len(indent) - 1) // 2,
+                )
+            )
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile the import time of the application's startup path"
+    )
+    parser.add_argument("--module", default="src.app")
+    parser.add_argument("--top", type=int, default=20, help="Slowest imports shown")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="Exit with status 1 if importing the module takes longer than this",
+    )
+    args = parser.parse_args()
+
+    timings = profile_imports(args.module)
+    total = next(
+        (timing.cumulative_ms for timing in timings if timing.module == args.module),
+        sum(timing.self_ms for timing in timings),
+    )
+
+    # Own import time of every module, summed per top-level package
+    packages = {}
+    for timing in timings:
+        package = timing.module.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + timing.self_ms
+
+    print(f"import {args.module}: {total:.1f} ms ({len(timings)} modules)")
+    print(f"\n{'package':<40}{'ms':>10}")
+    for package, ms in sorted(packages.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{package:<40}{ms:>10.1f}")
+    print(f"\n{'module':<60}{'self ms':>10}")
+    for timing in sorted(timings, key=lambda timing: -timing.self_ms)[: args.top]:
+        print(f"{timing.module:<60}{timing.self_ms:>10.1f}")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"\nStartup import time {total:.1f} ms exceeds {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,845 @@
-from typing import List
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
-from config.config import EMBEDDING_MODEL, NUM_RETRIEVAL_DOCS, ERROR_MESSAGES
+from config.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    NUM_RETRIEVAL_DOCS,
+    INDEX_TYPE,
+    INDEX_MIN_TRAIN_POINTS,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    PARTITION_KEY,
+    FILTER_OVERFETCH,
+    SHARD_COUNT,
+    SHARD_ADDRESSES,
+    EMBEDDING_CACHE_ENABLED,
+    WEB_WRITEBACK_TTL,
+    ERROR_MESSAGES,
+)
+from .data_loader import path_covers
+from .docstore import SQLiteDocstore, SQLitePositions
+from .embeddings import LazyEmbeddings, embed_queries, embedding_id
+from .embedding_cache import CachedEmbeddings
+from .sparse_index import BM25Index, reciprocal_rank_fusion
+from .partitions import PartitionIndex, matches_all
+from .shards import ShardedIndex
+from . import instrumentation
+from .faiss_index import (
+    compact_ivf_ids,
+    convert_index,
+    index_type_of,
+    read_index_mmap,
+    reconstruct_all,
+    recall_latency_report,
+    set_search_params,
+)
+import faiss
+import numpy as np
+import hashlib
+import json
 import os
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import groupby
 from pathlib import Path
 
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+SPARSE_INDEX_FILE = "sparse.sqlite"
+PARTITIONS_DIR = "partitions"
+SHARDS_DIR = "shards"
+
+logger = logging.getLogger(__name__)
+
+
+class SourcePlan(NamedTuple):
+    """Chunks of one source that must change to bring the index up to date."""
+
+    file_hash: str
+    ids: List[str]
+    new: List[Tuple[str, Document]]
+    stale: Set[str]
+
+
+@dataclass
+class RetrievalResult:
+    """Outcome of a single retrieval pass for a query."""
+
+    query: str
+    embedding: List[float]
+    documents: List[Document] = field(default_factory=list)
+    # Relevance of each document, higher is better: cosine similarity for
+    # dense retrieval, the reciprocal-rank fusion score for hybrid retrieval
+    scores: List[float] = field(default_factory=list)
+    context: str = ""
+    # Cosine similarity of the top dense hits, used for score-based routing
+    dense_scores: List[float] = field(default_factory=list)
+    # Milliseconds spent in each retriever
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class RetrievalMemo:
+    """
+    Per-request memo over a VectorStore.
+
+    Every stage of a request retrieves through the same memo, so a query is
+    encoded and searched at most once no matter how many stages need it.
+    """
+
+    def __init__(self, vector_store: "VectorStore"):
+        self.vector_store = vector_store
+        self._embeddings: Dict[str, List[float]] = {}
+        self._results: Dict[str, RetrievalResult] = {}
+
+    def embed(self, query: str) -> List[float]:
+        """Return the query embedding, encoding it on first use only."""
+        if query not in self._embeddings:
+            self._embeddings[query] = self.vector_store.embed_query(query)
+        return self._embeddings[query]
+
+    def prime(self, result: RetrievalResult) -> None:
+        """Seed the memo with a result retrieved elsewhere, e.g. in a batch."""
+        self._embeddings[result.query] = result.embedding
+        self._results[result.query] = result
+
+    def retrieve(self, query: str) -> RetrievalResult:
+        """Return the retrieval result for a query, searching on first use only."""
+        if query not in self._results:
+            self._results[query] = self.vector_store.retrieve(
+                query, embedding=self.embed(query)
+            )
+        return self._results[query]
+
 
 class VectorStore:
     def __init__(
         self, use_local_storage: bool = True, storage_path: str = "vector_store"
     ):
-        self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        # The model is loaded on the first embedding call, which the cache
+        # avoids entirely while every text has been embedded before
+        self.embeddings = (
+            CachedEmbeddings(LazyEmbeddings(), embedding_id())
+            if EMBEDDING_CACHE_ENABLED
+            else LazyEmbeddings()
+        )
         self.vector_store = None
         self.use_local_storage = use_local_storage
         self.storage_path = storage_path
         if not os.path.exists(storage_path):
             os.makedirs(storage_path)
+        self._docstore: Optional[SQLiteDocstore] = None
+        # Whether the loaded index is a read-only memory map of INDEX_FILE
+        self._mmapped = False
+        # Called with a source path whenever its chunks change in the index
+        self.reindex_listeners: List[Callable[[str], None]] = []
+        # Manifest of the open index, kept for writes after startup
+        self.manifest: Optional[Dict] = None
+        # Whether the open manifest or index changed without new chunks, e.g.
+        # after the partitions were rebuilt, and must still be saved
+        self._manifest_dirty = False
+        # Serializes index searches with writes made while serving queries
+        self._lock = threading.RLock()
+        # Sparse index searched alongside FAISS in "hybrid" retrieval mode
+        self.hybrid = RETRIEVAL_MODE == "hybrid"
+        self.sparse_index = BM25Index(
+            os.path.join(storage_path, SPARSE_INDEX_FILE)
+            if use_local_storage
+            else ":memory:"
+        )
+        # Per-partition sub-indexes searched by filtered queries
+        self.partitions = (
+            PartitionIndex(
+                PARTITION_KEY,
+                (
+                    os.path.join(storage_path, PARTITIONS_DIR)
+                    if use_local_storage
+                    else None
+                ),
+            )
+            if PARTITION_KEY
+            else None
+        )
+        if self.partitions is not None:
+            self.sparse_index.attach_partitions(self.partitions.members_path)
+        # Shards searched in parallel instead of the in-process index, which
+        # is still kept on disk as the copy the shards are rebuilt from
+        self.shards = (
+            ShardedIndex(
+                SHARD_COUNT,
+                SHARD_ADDRESSES,
+                os.path.join(storage_path, SHARDS_DIR) if use_local_storage else None,
+            )
+            if SHARD_COUNT or SHARD_ADDRESSES
+            else None
+        )
+        # Total milliseconds and number of searches per retriever
+        self.retriever_latency: Dict[str, List[float]] = {}
 
-    def create_vector_store(self, documents: List[Document]) -> None:
+    def create_vector_store(
+        self, documents: Iterable[Document], prune: Sequence[str] = ()
+    ) -> None:
         """
-        Create a vector store from documents. If use_local_storage is True and a saved version exists,
-        it will load the existing vector store instead of creating a new one.
+        Create or incrementally update the vector store from documents.
+
+        A manifest stored next to the index records, for every source file, its
+        content hash and the ids of the chunks it produced, together with the
+        embedding model and chunking settings that built the index. On startup
+        only new or changed chunks are embedded, chunks of files under prune
+        that are no longer present are dropped, and an unchanged corpus is
+        loaded without any embedding work. Changing the embedding model
+        rebuilds the index.
+
+        Documents are consumed as a stream, one source at a time, so the
+        chunks of each source must be contiguous (as DataLoader yields them).
 
         Args:
-            documents: List of document chunks
+            documents: Document chunks carrying a "source" metadata entry
+            prune: Files, directories or glob patterns the documents were
+                loaded from. Indexed sources they cover that were not loaded
+                are dropped; sources outside them are kept.
 
         Raises:
             ValueError: If there's an error creating the vector store
         """
         try:
-            if self.use_local_storage and self._vector_store_exists():
+            manifest, rechunked = self._open_manifest()
+
+            added = removed = 0
+            seen_sources: Set[str] = set()
+            # Only one source's chunks are held in memory at a time
+            for source, group in groupby(documents, key=self._document_source):
+                if source in seen_sources:
+                    raise ValueError(f"Chunks of {source} are not contiguous")
+                seen_sources.add(source)
+                chunks = list(group)
+                plan = self._plan_source(manifest, source, chunks, rechunked)
+                if plan is None:
+                    continue
+                self._notify_reindexed(source)
+                self._drop_ids(plan.stale)
+                if plan.new:
+                    new_ids, new_docs = zip(*plan.new)
+                    self._add_documents(list(new_docs), list(new_ids))
+                manifest["files"][source] = {"hash": plan.file_hash, "chunks": plan.ids}
+                added += len(plan.new)
+                removed += len(plan.stale)
+
+            removed += self._drop_missing_sources(manifest, seen_sources, prune)
+            removed += self._expire_web_content(manifest)
+
+            if self.vector_store is None:
+                raise ValueError("No documents to index")
+
+            if added or removed:
+                print(
+                    f"Vector store updated: {added} chunks embedded, {removed} removed"
+                )
+                self._commit(manifest)
+            elif self._ensure_index_type():
+                print(f"Vector store converted to a {INDEX_TYPE} index")
+                self._commit(manifest)
+            elif self._manifest_dirty:
+                self._commit(manifest)
                 print("used local embeddings")
-                self.vector_store = self._load_vector_store()
             else:
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
-                if self.use_local_storage:
-                    self._save_vector_store()
+                print("used local embeddings")
         except Exception as e:
             raise ValueError(ERROR_MESSAGES["vector_store_error"].format(error=str(e)))
 
+    def _open_manifest(self, resume: bool = True) -> Tuple[Dict, bool]:
+        """
+        Load the saved index and its manifest, or start a fresh one.
+
+        Args:
+            resume: Whether to reuse a saved index built with the same model
+
+        Returns:
+            Tuple of (manifest, whether chunking settings changed since the build)
+        """
+        manifest = self._load_manifest() if self.use_local_storage and resume else None
+        if (
+            manifest is None
+            or manifest.get("embedding_model") != embedding_id()
+            # Trained indexes cannot be converted losslessly, only rebuilt
+            or manifest.get("index_type", "flat") not in ("flat", "hnsw", INDEX_TYPE)
+        ):
+            manifest = self._new_manifest()
+            self.vector_store = None
+            self.sparse_index.clear()
+            if self.partitions is not None:
+                self.partitions.clear()
+            if self.shards is not None:
+                self.shards.clear()
+        else:
+            self.vector_store = self._load_vector_store()
+            set_search_params(self.vector_store.index)
+            if not len(self.sparse_index):
+                # Stores saved before the sparse index existed
+                self.sparse_index.add(self._open_docstore().texts())
+                self.sparse_index.commit()
+            if self.partitions is not None and (
+                manifest.get("partition_key") != PARTITION_KEY
+                or len(self.partitions) != self.vector_store.index.ntotal
+            ):
+                self._rebuild_partitions()
+                self._manifest_dirty = True
+                manifest["partition_key"] = PARTITION_KEY
+            if self.shards is not None and (
+                len(self.shards) != self.vector_store.index.ntotal
+            ):
+                self._rebuild_shards()
+                self._manifest_dirty = True
+
+        # Chunks produced with other settings cannot be trusted by file hash
+        rechunked = manifest.get("chunking") != self._chunking_settings()
+        manifest["chunking"] = self._chunking_settings()
+        manifest.setdefault("web", {})
+        self.manifest = manifest
+        return manifest, rechunked
+
+    def _rebuild_partitions(self, block_size: int = 10000) -> None:
+        """Repartition the saved index, e.g. after PARTITION_KEY changed."""
+        self.partitions.clear()
+        index = self.vector_store.index
+        if isinstance(index, faiss.IndexIVF):
+            # IVF vectors can only be reconstructed through a direct map
+            self._make_writable()
+            index = self.vector_store.index
+            index.make_direct_map()
+        mapping = self.vector_store.index_to_docstore_id
+        docstore = self.vector_store.docstore
+        for start in range(0, index.ntotal, block_size):
+            stop = min(start + block_size, index.ntotal)
+            ids = [mapping[position] for position in range(start, stop)]
+            metadatas = []
+            for doc_id in ids:
+                doc = docstore.search(doc_id)
+                metadatas.append(doc.metadata if isinstance(doc, Document) else {})
+            self.partitions.add(
+                ids, metadatas, index.reconstruct_n(start, stop - start)
+            )
+        if isinstance(index, faiss.IndexIVF):
+            # An array direct map would be saved with the index and makes
+            # remove_ids fail, so every later drop of chunks
+            index.set_direct_map_type(faiss.DirectMap.NoMap)
+        self.partitions.commit()
+        logger.info(
+            "Partitioned %d chunks by %s into %d partitions",
+            index.ntotal,
+            PARTITION_KEY,
+            len(self.partitions.values()),
+        )
+
+    def _rebuild_shards(self, block_size: int = 10000) -> None:
+        """Spread the saved index over the shards, e.g. when sharding is enabled."""
+        self.shards.clear()
+        index = self.vector_store.index
+        if isinstance(index, faiss.IndexIVF):
+            # See _rebuild_partitions
+            self._make_writable()
+            index = self.vector_store.index
+            index.make_direct_map()
+        mapping = self.vector_store.index_to_docstore_id
+        for start in range(0, index.ntotal, block_size):
+            stop = min(start + block_size, index.ntotal)
+            self.shards.add(
+                [mapping[position] for position in range(start, stop)],
+                index.reconstruct_n(start, stop - start),
+            )
+        if isinstance(index, faiss.IndexIVF):
+            index.set_direct_map_type(faiss.DirectMap.NoMap)
+        self.shards.commit()
+        logger.info(
+            "Spread %d chunks over %d shards", index.ntotal, len(self.shards.shards)
+        )
+
+    def _plan_source(
+        self,
+        manifest: Dict,
+        source: str,
+        chunks: List[Document],
+        rechunked: bool = False,
+    ) -> Optional[SourcePlan]:
+        """
+        Work out which chunks of one source must be embedded or dropped.
+
+        Returns:
+            SourcePlan for the source, or None if the index is already current
+        """
+        file_hash = self._hash_source(source, chunks)
+        entry = manifest["files"].get(source)
+        if entry and entry["hash"] == file_hash and not rechunked:
+            return None
+
+        ids = self._chunk_ids(source, chunks)
+        known = set(entry["chunks"]) if entry else set()
+        return SourcePlan(
+            file_hash=file_hash,
+            ids=ids,
+            new=[
+                (chunk_id, doc)
+                for chunk_id, doc in zip(ids, chunks)
+                if chunk_id not in known
+            ],
+            stale=known - set(ids),
+        )
+
+    def _drop_missing_sources(
+        self, manifest: Dict, sources: Iterable[str], prune: Sequence[str]
+    ) -> int:
+        """
+        Drop indexed sources that prune covers but were not loaded.
+
+        Args:
+            manifest: Manifest of the index
+            sources: Sources that were loaded
+            prune: Files, directories or glob patterns the sources were loaded from
+
+        Returns:
+            Number of chunks removed
+        """
+        sources = set(sources)
+        if not prune:
+            return 0
+        if not sources:
+            # A mistyped path would otherwise empty the index
+            logger.warning("Nothing loaded from %s, keeping indexed sources", prune)
+            return 0
+        removed = 0
+        for source in set(manifest["files"]) - sources:
+            if not any(path_covers(path, source) for path in prune):
+                continue
+            stale_ids = manifest["files"].pop(source)["chunks"]
+            self._notify_reindexed(source)
+            self._drop_ids(stale_ids)
+            removed += len(stale_ids)
+        return removed
+
+    def add_web_content(
+        self, url: str, chunks: List[Document], ttl: float = WEB_WRITEBACK_TTL
+    ) -> int:
+        """
+        Append chunks of scraped web content to the index.
+
+        Chunks are keyed by a hash of their text, so content that was already
+        written back is not embedded again; its expiry is extended instead.
+        Web content is tracked in the manifest's "web" section, apart from
+        document files, and dropped once it is older than ttl.
+
+        Args:
+            url: Page the content was scraped from, stored as the chunk source
+            chunks: Chunks of the page text
+            ttl: Seconds the content stays in the index
+
+        Returns:
+            Number of chunks embedded
+
+        Raises:
+            ValueError: If vector store is not initialized
+        """
+        with self._lock:
+            if self.vector_store is None or self.manifest is None:
+                raise ValueError(
+                    "Vector store not initialized. Call create_vector_store first."
+                )
+            web = self.manifest["web"]
+            now = time.time()
+            removed = self._expire_web_content(self.manifest, now)
+
+            new: Dict[str, Document] = {}
+            for doc in chunks:
+                chunk_id = (
+                    "web-"
+                    + hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+                )
+                if chunk_id in web:
+                    web[chunk_id]["expires_at"] = now + ttl
+                elif chunk_id not in new:
+                    new[chunk_id] = Document(
+                        page_content=doc.page_content,
+                        metadata={
+                            **doc.metadata,
+                            "source": url,
+                            "origin": "web",
+                            "fetched_at": now,
+                        },
+                    )
+
+            if new:
+                self._notify_reindexed(url)
+                self._add_documents(list(new.values()), list(new))
+                for chunk_id in new:
+                    web[chunk_id] = {"url": url, "expires_at": now + ttl}
+            if new or removed:
+                self._commit(self.manifest)
+            return len(new)
+
+    def _expire_web_content(self, manifest: Dict, now: Optional[float] = None) -> int:
+        """Drop written-back web chunks past their expiry and return how many."""
+        now = time.time() if now is None else now
+        web = manifest.setdefault("web", {})
+        expired = [
+            chunk_id for chunk_id, entry in web.items() if entry["expires_at"] <= now
+        ]
+        for url in {web[chunk_id]["url"] for chunk_id in expired}:
+            self._notify_reindexed(url)
+        self._drop_ids(expired)
+        for chunk_id in expired:
+            del web[chunk_id]
+        return len(expired)
+
+    def add_reindex_listener(self, listener: Callable[[str], None]) -> None:
+        """Register a callback invoked with each source that gets re-indexed."""
+        self.reindex_listeners.append(listener)
+
+    def _notify_reindexed(self, source: str) -> None:
+        for listener in self.reindex_listeners:
+            listener(source)
+
+    def _commit(self, manifest: Dict) -> None:
+        """Persist the index together with the manifest describing it."""
+        self._ensure_index_type()
+        if self.vector_store is not None:
+            manifest["index_type"] = index_type_of(self.vector_store.index)
+        self.sparse_index.commit()
+        if self.partitions is not None:
+            self.partitions.commit()
+        if self.shards is not None:
+            self.shards.commit()
+        manifest["partition_key"] = PARTITION_KEY
+        if self.use_local_storage and self.vector_store is not None:
+            self._save_vector_store()
+            self._save_manifest(manifest)
+        self._manifest_dirty = False
+
+    def _add_documents(self, documents: List[Document], ids: List[str]) -> None:
+        """Embed documents and add them to the index under the given ids."""
+        texts = [doc.page_content for doc in documents]
+        self._add_embeddings(
+            texts,
+            self.embeddings.embed_documents(texts),
+            [doc.metadata for doc in documents],
+            ids,
+        )
+
+    def _add_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str],
+    ) -> None:
+        """Append precomputed embeddings to the index in one bulk add."""
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_embeddings(
+                list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids
+            )
+        else:
+            self._make_writable()
+            self.vector_store.add_embeddings(
+                list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+            )
+        self.sparse_index.add(zip(ids, texts))
+        if self.partitions is not None:
+            self.partitions.add(ids, metadatas, vectors)
+        if self.shards is not None:
+            self.shards.add(ids, vectors)
+
+    def _drop_ids(self, ids: Iterable[str]) -> None:
+        """Remove chunks from the index by id."""
+        ids = list(ids)
+        if ids and self.vector_store is not None:
+            self._make_writable()
+            if isinstance(self.vector_store.index, faiss.IndexHNSW):
+                # HNSW graphs cannot remove vectors; fall back to a flat copy
+                # that is rebuilt as HNSW on the next commit
+                flat = faiss.IndexFlatL2(self.vector_store.index.d)
+                flat.add(reconstruct_all(self.vector_store.index))
+                self.vector_store.index = flat
+            removed = None
+            if isinstance(self.vector_store.index, faiss.IndexIVF):
+                # IVF keeps the ids of the vectors after the removed ones,
+                # while the store renumbers its positions
+                wanted = set(ids)
+                removed = [
+                    position
+                    for position, id in self.vector_store.index_to_docstore_id.items()
+                    if id in wanted
+                ]
+            self.vector_store.delete(ids)
+            if removed is not None:
+                compact_ivf_ids(self.vector_store.index, np.array(removed))
+        self.sparse_index.delete(ids)
+        if self.partitions is not None:
+            self.partitions.delete(ids)
+        if self.shards is not None:
+            self.shards.delete(ids)
+
+    def _ensure_index_type(self) -> bool:
+        """
+        Convert the index to the configured INDEX_TYPE once it is worth it.
+
+        New stores are built on an exact flat index. Index types that need
+        training are converted once INDEX_MIN_TRAIN_POINTS vectors exist, so
+        IVF and PQ are trained on a representative sample of the corpus.
+
+        Returns:
+            True if the index was converted
+        """
+        if self.vector_store is None:
+            return False
+        index = self.vector_store.index
+        current = index_type_of(index)
+        if current == INDEX_TYPE or current not in ("flat", "hnsw"):
+            return False
+        if (
+            INDEX_TYPE in ("ivf_flat", "ivf_pq")
+            and index.ntotal < INDEX_MIN_TRAIN_POINTS
+        ):
+            return False
+        self.vector_store.index = convert_index(index, INDEX_TYPE)
+        return True
+
+    def set_search_params(
+        self, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+    ) -> None:
+        """
+        Tune query-time search parameters of an approximate index.
+
+        Args:
+            nprobe: IVF clusters visited per query
+            ef_search: HNSW candidate list size per query
+        """
+        if self.vector_store is not None:
+            set_search_params(self.vector_store.index, nprobe, ef_search)
+
+    def index_report(
+        self,
+        queries: List[str],
+        index_type: str = INDEX_TYPE,
+        values: Optional[List[int]] = None,
+    ) -> List[Dict]:
+        """
+        Measure recall and latency of an index type against exact search.
+
+        The indexed chunks are re-embedded so the comparison uses exact vectors
+        regardless of how the current index stores them.
+
+        Args:
+            queries: Representative user queries
+            index_type: Approximate index type to evaluate
+            values: nprobe or efSearch values to sweep
+
+        Returns:
+            Report rows as produced by faiss_index.recall_latency_report
+        """
+        if self.vector_store is None:
+            raise ValueError(
+                "Vector store not initialized. Call create_vector_store first."
+            )
+        store = self.vector_store
+        texts = [
+            store.docstore.search(store.index_to_docstore_id[i]).page_content
+            for i in range(len(store.index_to_docstore_id))
+        ]
+        vectors = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+        query_vectors = np.array(
+            embed_queries(self.embeddings, queries), dtype=np.float32
+        )
+        return recall_latency_report(
+            vectors, query_vectors, index_type, k=NUM_RETRIEVAL_DOCS, values=values
+        )
+
+    @staticmethod
+    def _document_source(doc: Document) -> str:
+        return str(doc.metadata.get("source", ""))
+
+    @staticmethod
+    def _chunk_ids(source: str, chunks: List[Document]) -> List[str]:
+        """Derive stable content-addressed ids for the chunks of one source."""
+        ids = []
+        seen: Dict[str, int] = {}
+        for doc in chunks:
+            digest = hashlib.sha256(
+                f"{source}\0{doc.metadata.get('page', '')}\0{doc.page_content}".encode(
+                    "utf-8"
+                )
+            ).hexdigest()
+            # Identical chunks within a source still need distinct ids
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            ids.append(f"{digest}-{occurrence}")
+        return ids
+
+    @staticmethod
+    def _hash_source(source: str, chunks: List[Document]) -> str:
+        """Hash the source file, or the chunk text if it is not a local file."""
+        # Loaders that already read the whole file pass its hash along
+        file_hashes = {doc.metadata.get("file_hash") for doc in chunks}
+        if len(file_hashes) == 1 and None not in file_hashes:
+            return file_hashes.pop()
+        digest = hashlib.sha256()
+        if source and os.path.isfile(source):
+            with open(source, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            for doc in chunks:
+                digest.update(doc.page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _chunking_settings() -> Dict[str, int]:
+        return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+    def _new_manifest(self) -> Dict:
+        return {
+            "embedding_model": embedding_id(),
+            "chunking": self._chunking_settings(),
+            "index_type": "flat",
+            "files": {},
+            "web": {},
+        }
+
+    def _manifest_path(self) -> Path:
+        return Path(self.storage_path) / MANIFEST_FILE
+
+    def _load_manifest(self) -> Optional[Dict]:
+        """Load the manifest, or None if there is no usable saved index."""
+        if not self._vector_store_exists() or not self._manifest_path().exists():
+            return None
+        with open(self._manifest_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        """Write the manifest atomically next to the index."""
+        tmp_path = self._manifest_path().with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
     def _vector_store_exists(self) -> bool:
         """Check if a saved vector store exists."""
-        return os.path.exists(os.path.join(self.storage_path, "index.faiss"))
+        return os.path.exists(self._index_path()) and os.path.exists(
+            os.path.join(self.storage_path, DOCSTORE_FILE)
+        )
+
+    def _index_path(self) -> str:
+        return os.path.join(self.storage_path, INDEX_FILE)
+
+    def _open_docstore(self) -> SQLiteDocstore:
+        """Open the on-disk docstore once per VectorStore."""
+        if self._docstore is None:
+            self._docstore = SQLiteDocstore(
+                os.path.join(self.storage_path, DOCSTORE_FILE)
+            )
+        return self._docstore
 
     def _save_vector_store(self) -> None:
-        """Save the vector store to disk."""
-        if self.vector_store is not None:
-            self.vector_store.save_local(self.storage_path)
+        """
+        Save the vector store to disk.
+
+        The FAISS index is written with faiss.write_index and chunk text and
+        metadata go to a SQLite docstore, so nothing is pickled. The index file
+        is replaced atomically, which leaves processes that still map the old
+        file unaffected.
+        """
+        if self.vector_store is None:
+            return
+        store = self.vector_store
+        docstore = self._open_docstore()
+        if store.docstore is not docstore:
+            # Freshly built stores keep documents in memory until first saved
+            docstore.clear()
+            docstore.add(dict(store.docstore._dict))
+            store.docstore = docstore
+        docstore.write_positions(store.index_to_docstore_id)
+        if not isinstance(store.index_to_docstore_id, SQLitePositions):
+            store.index_to_docstore_id = docstore.positions()
+
+        tmp_path = self._index_path() + ".tmp"
+        faiss.write_index(store.index, tmp_path)
+        docstore.commit()
+        os.replace(tmp_path, self._index_path())
+
+        # Drop the pickled docstore written by earlier versions
+        legacy_path = os.path.join(self.storage_path, "index.pkl")
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
 
     def _load_vector_store(self) -> FAISS:
-        """Load the vector store from disk."""
-        return FAISS.load_local(
-            self.storage_path, self.embeddings, allow_dangerous_deserialization=True
-        )
+        """
+        Load the vector store from disk.
 
-    def similarity_search(self, query: str) -> List[Document]:
+        The vectors of the index are memory-mapped rather than read into RAM
+        (see faiss_index.read_index_mmap for what is mapped), so processes on
+        one host share a single page-cached copy, and documents are read from
+        SQLite only for the hits a search returns.
         """
-        Perform similarity search on the vector store.
+        docstore = self._open_docstore()
+        index = read_index_mmap(self._index_path())
+        self._mmapped = True
+        return FAISS(self.embeddings, index, docstore, docstore.positions())
+
+    def _make_writable(self) -> None:
+        """Replace a memory-mapped index with an in-memory copy before mutating it."""
+        if self._mmapped and self.vector_store is not None:
+            self.vector_store.index = faiss.read_index(self._index_path())
+            set_search_params(self.vector_store.index)
+            self._mmapped = False
+
+    def warm_up(self) -> None:
+        """
+        Load the embedding model and run one encode through it.
+
+        The backend is called directly, so the warm-up text stays out of the
+        embedding cache and the retrieval metrics.
+        """
+        embeddings = self.embeddings
+        if isinstance(embeddings, CachedEmbeddings):
+            embeddings = embeddings.embeddings
+        embeddings.load().embed_query("warm up")
+
+    def embed_query(self, query: str) -> List[float]:
+        """Encode a query with the store's embedding model."""
+        with instrumentation.stage("retrieval.embed", queries=1):
+            return self.embeddings.embed_query(query)
+
+    def retrieve(
+        self,
+        query: str,
+        embedding: Optional[List[float]] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> RetrievalResult:
+        """
+        Run one retrieval pass for a query.
 
         Args:
             query: Search query
+            embedding: Precomputed query embedding, encoded here if omitted
+            filter: Metadata conditions the documents must meet, by key. A
+                condition is a value, a list of accepted values or a predicate.
+                A condition on PARTITION_KEY limits the search to the matching
+                partitions; other keys are checked on each candidate.
 
         Returns:
-            List of relevant documents
+            RetrievalResult with the documents, their scores and the joined context
 
         Raises:
             ValueError: If vector store is not initialized
@@ -73,17 +849,208 @@ class VectorStore:
                 "Vector store not initialized. Call create_vector_store first."
             )
 
-        return self.vector_store.similarity_search(query, k=NUM_RETRIEVAL_DOCS)
+        if embedding is None:
+            embedding = self.embed_query(query)
+        return self._search([query], [embedding], filter)[0]
+
+    def retrieve_batch(
+        self, queries: List[str], filter: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievalResult]:
+        """
+        Retrieve for many queries with one embedding batch and one FAISS search.
+
+        Args:
+            queries: Search queries
+            filter: Metadata conditions applied to every query, as in retrieve
+
+        Returns:
+            One RetrievalResult per query, in order
+
+        Raises:
+            ValueError: If vector store is not initialized
+        """
+        if self.vector_store is None:
+            raise ValueError(
+                "Vector store not initialized. Call create_vector_store first."
+            )
+        if not queries:
+            return []
+        queries = list(queries)
+        with instrumentation.stage("retrieval.embed", queries=len(queries)):
+            embeddings = embed_queries(self.embeddings, queries)
+        return self._search(queries, embeddings, filter)
+
+    def _search(
+        self,
+        queries: List[str],
+        embeddings: List[List[float]],
+        filter: Optional[Dict[str, Any]] = None,
+        k: Optional[int] = None,
+    ) -> List[RetrievalResult]:
+        """
+        Search FAISS for all queries at once and, in hybrid mode, BM25 per query.
+
+        Hybrid results merge both rankings with reciprocal-rank fusion; only
+        the fused top NUM_RETRIEVAL_DOCS documents are read from the docstore.
+        Filters on the partition key search the matching partitions' own
+        indexes, and BM25 scores only their chunks; other filter conditions
+        are checked on FILTER_OVERFETCH times more candidates, and queries
+        left with fewer than NUM_RETRIEVAL_DOCS matches are searched again
+        FILTER_OVERFETCH times deeper until the retrievers run out of hits.
+        Unfiltered dense searches go to the shards when sharding is enabled.
+        """
+        conditions = dict(filter or {})
+        partitions = None
+        if self.partitions is not None and self.partitions.key in conditions:
+            partitions = self.partitions.match(conditions.pop(self.partitions.key))
+        if k is None:
+            k = (
+                max(HYBRID_CANDIDATES, NUM_RETRIEVAL_DOCS)
+                if self.hybrid
+                else NUM_RETRIEVAL_DOCS
+            )
+            if conditions:
+                k *= FILTER_OVERFETCH
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        start = time.perf_counter()
+        with instrumentation.stage(
+            "retrieval.dense",
+            queries=len(queries),
+            partitions="all" if partitions is None else len(partitions),
+            shards=len(self.shards.shards) if self.shards is not None else 0,
+        ), self._lock:
+            if partitions is not None:
+                dense = self.partitions.search(vectors, k, partitions)
+            elif self.shards is not None:
+                dense = self.shards.search(vectors, k)
+            else:
+                distances, positions = self.vector_store.index.search(vectors, k)
+                mapping = self.vector_store.index_to_docstore_id
+                dense = [
+                    [
+                        (mapping[int(position)], float(distance))
+                        for distance, position in zip(row_distances, row_positions)
+                        if position != -1
+                    ]
+                    for row_distances, row_positions in zip(distances, positions)
+                ]
+        dense_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        results = []
+        # Whether a deeper search could find more candidates, per query
+        deeper = []
+        for query, embedding, hits in zip(queries, embeddings, dense):
+            # FAISS returns squared L2 distances between unit vectors
+            similarities = {doc_id: 1.0 - distance / 2.0 for doc_id, distance in hits}
+            dense_scores = [similarities[doc_id] for doc_id, _ in hits][
+                :NUM_RETRIEVAL_DOCS
+            ]
+            timings = {"dense": dense_ms}
+            if self.hybrid:
+                start = time.perf_counter()
+                with instrumentation.stage("retrieval.sparse"):
+                    sparse = self.sparse_index.search(query, k, partitions)
+                timings["sparse"] = (time.perf_counter() - start) * 1000
+                ranked = reciprocal_rank_fusion(
+                    [[doc_id for doc_id, _ in hits], [doc_id for doc_id, _ in sparse]],
+                    RRF_K,
+                )
+                deeper.append(len(hits) >= k or len(sparse) >= k)
+            else:
+                ranked = [(doc_id, similarities[doc_id]) for doc_id, _ in hits]
+                deeper.append(len(hits) >= k)
+
+            documents, scores = [], []
+            for doc_id, score in ranked:
+                if len(documents) == NUM_RETRIEVAL_DOCS:
+                    break
+                doc = self.vector_store.docstore.search(doc_id)
+                if isinstance(doc, Document) and matches_all(doc.metadata, conditions):
+                    documents.append(doc)
+                    scores.append(score)
+            self._record_latency(timings)
+            results.append(
+                RetrievalResult(
+                    query=query,
+                    embedding=embedding,
+                    documents=documents,
+                    scores=scores,
+                    context=" ".join([doc.page_content for doc in documents]),
+                    dense_scores=dense_scores,
+                    timings=timings,
+                )
+            )
+
+        if conditions:
+            short = [
+                row
+                for row, result in enumerate(results)
+                if deeper[row] and len(result.documents) < NUM_RETRIEVAL_DOCS
+            ]
+            if short:
+                instrumentation.count("retrieval.filter_refetch", len(short))
+                again = self._search(
+                    [queries[row] for row in short],
+                    [embeddings[row] for row in short],
+                    filter,
+                    k * FILTER_OVERFETCH,
+                )
+                for row, result in zip(short, again):
+                    results[row] = result
+        return results
+
+    def _record_latency(self, timings: Dict[str, float]) -> None:
+        for retriever, ms in timings.items():
+            total = self.retriever_latency.setdefault(retriever, [0.0, 0])
+            total[0] += ms
+            total[1] += 1
+        logger.debug(
+            "Retrieval latency: %s",
+            ", ".join(f"{name} {ms:.2f}ms" for name, ms in timings.items()),
+        )
+
+    def embedding_cache_stats(self) -> Dict[str, float]:
+        """Return query and document hit rates of the embedding cache, if enabled."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.stats()
+        return {}
+
+    def latency_stats(self) -> Dict[str, float]:
+        """Return the mean milliseconds per query spent in each retriever."""
+        return {
+            retriever: total / count
+            for retriever, (total, count) in self.retriever_latency.items()
+            if count
+        }
+
+    def similarity_search(
+        self, query: str, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """
+        Perform similarity search on the vector store.
+
+        Args:
+            query: Search query
+            filter: Metadata conditions the documents must meet, as in retrieve
+
+        Returns:
+            List of relevant documents
+
+        Raises:
+            ValueError: If vector store is not initialized
+        """
+        return self.retrieve(query, filter=filter).documents
 
-    def get_context(self, query: str) -> str:
+    def get_context(self, query: str, filter: Optional[Dict[str, Any]] = None) -> str:
         """
         Get context from vector store for a query.
 
         Args:
             query: Search query
+            filter: Metadata conditions the documents must meet, as in retrieve
 
         Returns:
             Combined context from relevant documents
         """
-        docs = self.similarity_search(query)
-        return " ".join([doc.page_content for doc in docs])
+        return self.retrieve(query, filter=filter).context
@@ -0,0 +1,155 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from config.config import WEB_CACHE_TTL, WEB_CACHE_MAX_BYTES
+
+
+class WebCache:
+    def __init__(
+        self,
+        path: str,
+        ttl: float = WEB_CACHE_TTL,
+        max_bytes: int = WEB_CACHE_MAX_BYTES,
+    ):
+        """
+        Initialize an on-disk cache of web research results.
+
+        Entries are grouped by kind ("topic" for finished crew answers,
+        "search" for search results, "page" for scraped page bodies) and keyed
+        by normalized topic or URL. Entries expire after ttl seconds and the
+        least recently used ones are evicted once the cache exceeds max_bytes.
+
+        Args:
+            path: SQLite file holding the cache
+            ttl: Entry lifetime in seconds
+            max_bytes: Maximum total size of cached values
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+                """)
+            self._conn.commit()
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        """
+        Return a cached value, or None if it is missing or expired.
+
+        Args:
+            kind: Entry kind
+            key: Topic or URL
+        """
+        key = self.normalize(kind, key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE kind = ? AND key = ?",
+                (kind, key),
+            ).fetchone()
+            if row is None or row[1] < now - self.ttl:
+                if row is not None:
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key)
+                    )
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE kind = ? AND key = ?",
+                (now, kind, key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, kind: str, key: str, value: str) -> None:
+        """
+        Cache a value, evicting least recently used entries beyond max_bytes.
+
+        Args:
+            kind: Entry kind
+            key: Topic or URL
+            value: Text to cache
+        """
+        key = self.normalize(kind, key)
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, value, size, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT kind, key, size FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for kind, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((kind, key))
+            total -= size
+        self._conn.executemany(
+            "DELETE FROM entries WHERE kind = ? AND key = ?", evicted
+        )
+
+    @staticmethod
+    def normalize(kind: str, key: str) -> str:
+        """Normalize a topic (case, spacing, punctuation) or a URL (trailing slash)."""
+        key = key.strip()
+        if kind == "page":
+            return key.rstrip("/")
+        return " ".join(re.sub(r"[^\w\s]", " ", key.lower()).split())
@@ -0,0 +1,41 @@
+from typing import List
+import pytest
+from benchmarks.fakes import HashEmbeddings
+from src.embeddings import LazyEmbeddings
+from src.vector_store import VectorStore
+
+
+class CountingEmbeddings(HashEmbeddings):
+    """HashEmbeddings that remember every text they were asked to embed."""
+
+    def __init__(self, dim: int = 64):
+        super().__init__(dim)
+        self.embedded: List[str] = []
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def embeddings() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def make_store(tmp_path, embeddings, monkeypatch):
+    """Open VectorStores on one storage directory, embedding with the fake."""
+    # The fake replaces the embeddings, so keep the cache out of models/
+    monkeypatch.setattr("src.vector_store.EMBEDDING_CACHE_ENABLED", False)
+
+    def make() -> VectorStore:
+        store = VectorStore(storage_path=str(tmp_path / "vector_store"))
+        store.embeddings = LazyEmbeddings(lambda: embeddings)
+        return store
+
+    return make
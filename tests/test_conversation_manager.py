@@ -0,0 +1,77 @@
+from src.conversation_manager import ConversationManager, ConversationStore
+
+
+def _ask(conversation: ConversationManager, turns: int, start: int = 0) -> None:
+    for turn in range(start, start + turns):
+        conversation.add_message("user", f"question {turn}")
+        conversation.add_message("assistant", f"answer {turn}")
+
+
+def test_ring_buffer_keeps_the_latest_interactions():
+    conversation = ConversationManager(max_context_length=2)
+    _ask(conversation, 3)
+
+    assert conversation.get_turns() == [
+        "user: question 1",
+        "assistant: answer 1",
+        "user: question 2",
+        "assistant: answer 2",
+    ]
+    assert conversation.get_context() == "\n".join(conversation.get_turns())
+
+
+def test_evicted_messages_release_their_bytes():
+    conversation = ConversationManager(max_context_length=1)
+    _ask(conversation, 1)
+    size = conversation.nbytes
+    _ask(conversation, 1, start=1)
+
+    assert conversation.nbytes == size
+
+
+def test_context_without_answers():
+    conversation = ConversationManager(max_context_length=2, include_answers=False)
+    _ask(conversation, 3)
+
+    assert conversation.get_context() == "user: question 1\nuser: question 2"
+
+
+def test_zero_length_keeps_no_history():
+    conversation = ConversationManager(max_context_length=0)
+    _ask(conversation, 2)
+
+    assert conversation.get_context() == ""
+
+
+def test_store_evicts_least_recently_used_sessions():
+    store = ConversationStore(max_sessions=2, persist_path=None)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+
+    assert "a" in store and "c" in store
+    assert "b" not in store
+    assert store.stats()["evictions"] == 1
+
+
+def test_store_evicts_sessions_over_the_memory_cap():
+    store = ConversationStore(max_sessions=10, max_bytes=3000, persist_path=None)
+    _ask(store.get("a"), 2)
+    _ask(store.get("b"), 2)
+
+    assert "a" not in store
+    assert store.stats()["bytes"] <= 3000
+
+
+def test_persisted_sessions_reload_their_ring_buffer(tmp_path):
+    path = str(tmp_path / "conversations.sqlite")
+    store = ConversationStore(max_context_length=2, max_sessions=1, persist_path=path)
+    _ask(store.get("a"), 3)
+    store.get("b")
+    assert "a" not in store
+
+    reloaded = ConversationStore(max_context_length=2, persist_path=path).get("a")
+    assert reloaded.get_turns() == store.get("a").get_turns()
+    assert reloaded.get_turns()[0] == "user: question 1"
+    assert len(reloaded.messages) == 4
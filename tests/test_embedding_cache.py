@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import numpy as np
+from benchmarks.fakes import HashEmbeddings
+from src.embedding_cache import (
+    KEYS_FILE,
+    LOCK_FILE,
+    VECTORS_FILE,
+    CachedEmbeddings,
+)
+
+
+def _embed_in_process(path: str, worker: int, barrier) -> None:
+    cache = CachedEmbeddings(HashEmbeddings(64), "hash-64", path)
+    texts = [f"shared text {i}" for i in range(50)]
+    texts += [f"worker {worker} text {i}" for i in range(50)]
+    barrier.wait()
+    for start in range(0, len(texts), 10):
+        cache.embed_documents(texts[start : start + 10])
+    cache.close()
+
+
+def test_vectors_are_stored_in_the_model_directory(tmp_path, embeddings):
+    cache = CachedEmbeddings(embeddings, "hash-64", str(tmp_path))
+    cache.embed_documents(["alpha", "beta"])
+
+    (directory,) = tmp_path.iterdir()
+    assert {VECTORS_FILE, KEYS_FILE, LOCK_FILE} <= set(os.listdir(directory))
+    assert os.path.getsize(directory / VECTORS_FILE) == 2 * embeddings.dim * 4
+
+
+def test_reopened_cache_embeds_only_new_texts(tmp_path, embeddings):
+    first = CachedEmbeddings(embeddings, "hash-64", str(tmp_path))
+    expected = first.embed_documents(["alpha", "beta"])
+    first.close()
+
+    second = CachedEmbeddings(embeddings, "hash-64", str(tmp_path))
+    vectors = second.embed_documents(["beta", "gamma", "alpha", "gamma"])
+
+    assert embeddings.embedded == ["alpha", "beta", "gamma"]
+    assert np.allclose(vectors[0], expected[1])
+    assert np.allclose(vectors[2], expected[0])
+    assert second.stats()["document_hits"] == 2
+    assert second.stats()["documents_stored"] == 3
+
+
+def test_models_do_not_share_vectors(tmp_path, embeddings):
+    CachedEmbeddings(embeddings, "model-a", str(tmp_path)).embed_documents(["alpha"])
+    CachedEmbeddings(embeddings, "model-b", str(tmp_path)).embed_documents(["alpha"])
+
+    assert embeddings.embedded == ["alpha", "alpha"]
+
+
+def test_query_cache_evicts_least_recently_used(embeddings):
+    cache = CachedEmbeddings(embeddings, "hash-64", None, query_cache_size=2)
+
+    for query in ["a", "b", "a", "c", "a", "b"]:
+        cache.embed_query(query)
+
+    assert embeddings.queries == ["a", "b", "c", "b"]
+
+
+def test_processes_appending_together_keep_rows_consistent(tmp_path, embeddings):
+    path = str(tmp_path)
+    workers = 4
+    barrier = multiprocessing.Barrier(workers)
+    processes = [
+        multiprocessing.Process(target=_embed_in_process, args=(path, i, barrier))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    cache = CachedEmbeddings(embeddings, "hash-64", path)
+    texts = [f"shared text {i}" for i in range(50)]
+    texts += [f"worker {w} text {i}" for w in range(workers) for i in range(50)]
+    assert cache.stats()["documents_stored"] == len(texts)
+    assert np.allclose(
+        cache.embed_documents(texts), HashEmbeddings(64).embed_documents(texts)
+    )
+    assert embeddings.embedded == []
@@ -0,0 +1,51 @@
+import faiss
+import numpy as np
+from src.faiss_index import compact_ivf_ids
+
+
+def _ivf_index(vectors: np.ndarray) -> faiss.Index:
+    quantizer = faiss.IndexFlatL2(vectors.shape[1])
+    index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], 8)
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = 8
+    return index
+
+
+def test_compact_ivf_ids_renumbers_like_a_flat_index():
+    vectors = np.random.default_rng(0).random((400, 16), dtype=np.float32)
+    removed = np.array([0, 7, 8, 150, 399], dtype=np.int64)
+    index = _ivf_index(vectors)
+    flat = faiss.IndexFlatL2(16)
+    flat.add(vectors)
+
+    for target in (index, flat):
+        target.remove_ids(removed)
+    compact_ivf_ids(index, removed)
+
+    kept = np.delete(vectors, removed, axis=0)
+    _, ivf_ids = index.search(kept, 1)
+    _, flat_ids = flat.search(kept, 1)
+    assert (ivf_ids[:, 0] == np.arange(len(kept))).all()
+    assert (ivf_ids == flat_ids).all()
+
+
+def test_compact_ivf_ids_keeps_appending_positional():
+    vectors = np.random.default_rng(1).random((300, 16), dtype=np.float32)
+    index = _ivf_index(vectors[:200])
+    index.remove_ids(np.arange(50, dtype=np.int64))
+    compact_ivf_ids(index, np.arange(50))
+
+    # New vectors get ids from ntotal, right after the surviving ones
+    index.add(vectors[200:])
+    _, ids = index.search(vectors[200:], 1)
+    assert (ids[:, 0] == np.arange(150, 250)).all()
+
+
+def test_compact_ivf_ids_ignores_empty_removals():
+    vectors = np.random.default_rng(2).random((200, 16), dtype=np.float32)
+    index = _ivf_index(vectors)
+    compact_ivf_ids(index, np.array([], dtype=np.int64))
+
+    _, ids = index.search(vectors, 1)
+    assert (ids[:, 0] == np.arange(200)).all()
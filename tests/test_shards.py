@@ -0,0 +1,74 @@
+import threading
+from multiprocessing import AuthenticationError, Pipe
+from multiprocessing.connection import Client, Listener
+import numpy as np
+import pytest
+from src.shards import Shard, ShardClient, recv_message, send_message, serve
+
+AUTHKEY = b"test-secret"
+
+
+def test_message_round_trip_with_vectors():
+    sender, receiver = Pipe()
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    send_message(sender, {"method": "add", "args": [["a", "b", "c"]]}, vectors)
+    header, received = recv_message(receiver)
+
+    assert header == {"method": "add", "args": [["a", "b", "c"]], "shape": [3, 4]}
+    assert received.dtype == np.float32
+    assert (received == vectors).all()
+
+
+def test_message_round_trip_without_vectors():
+    sender, receiver = Pipe()
+
+    send_message(sender, {"result": 3})
+
+    assert recv_message(receiver) == ({"result": 3}, None)
+
+
+@pytest.fixture
+def server():
+    listener = Listener(("127.0.0.1", 0), authkey=AUTHKEY)
+    thread = threading.Thread(
+        target=serve, args=(listener, Shard(), AUTHKEY), daemon=True
+    )
+    thread.start()
+    yield listener.address
+    client = ShardClient(listener.address, AUTHKEY)
+    client.close(shutdown=True)
+    thread.join(timeout=10)
+
+
+def test_client_adds_and_searches(server):
+    client = ShardClient(server, AUTHKEY)
+    vectors = np.eye(4, dtype=np.float32)
+
+    assert client.call("add", ["a", "b", "c", "d"], vectors=vectors) == 4
+    hits = client.call("search", 2, vectors=vectors[[2]])
+    assert client.call("delete", ["a"]) == 3
+    assert client.call("count") == 3
+    client.close()
+
+    assert hits[0][0] == ["c", 0.0]
+    assert len(hits[0]) == 2
+
+
+def test_client_errors_are_raised(server):
+    client = ShardClient(server, AUTHKEY)
+
+    with pytest.raises(ValueError, match="Unknown shard method"):
+        client.call("__init__")
+    # The connection stays usable after an error
+    assert client.call("count") == 0
+    client.close()
+
+
+def test_wrong_authkey_is_rejected(server):
+    with pytest.raises(AuthenticationError):
+        Client(server, authkey=b"wrong")
+
+    client = ShardClient(server, AUTHKEY)
+    assert client.call("count") == 0
+    client.close()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from src.partitions import PartitionIndex
+from src.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = [
+    ("a", "Quarterly revenue grew while operating costs fell"),
+    ("b", "The revenue forecast for the next quarter is cautious"),
+    ("c", "Employees enjoyed the annual offsite in the mountains"),
+    ("d", "Mountains of paperwork delayed the audit"),
+]
+
+
+@pytest.fixture
+def index():
+    index = BM25Index(":memory:", common_term_ratio=1.0)
+    index.add(DOCUMENTS)
+    index.commit()
+    return index
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Revenue, Q3-2024!") == ["revenue", "q3", "2024"]
+
+
+def test_search_ranks_matching_documents_first(index):
+    hits = index.search("annual offsite", 10)
+
+    assert [doc_id for doc_id, _ in hits] == ["c"]
+    assert hits[0][1] > 0
+
+
+def test_search_prefers_documents_matching_more_terms(index):
+    ids = [doc_id for doc_id, _ in index.search("quarterly revenue", 10)]
+
+    assert ids == ["a", "b"]
+
+
+def test_deleted_documents_are_not_returned(index):
+    index.delete(["a"])
+
+    assert [doc_id for doc_id, _ in index.search("revenue", 10)] == ["b"]
+    assert len(index) == 3
+
+
+def test_search_limited_to_attached_partitions(index):
+    partitions = PartitionIndex("tenant")
+    partitions.add(
+        [doc_id for doc_id, _ in DOCUMENTS],
+        [{"tenant": "x"}, {"tenant": "y"}, {"tenant": "x"}, {"tenant": "y"}],
+        np.eye(4, dtype=np.float32),
+    )
+    partitions.commit()
+    index.attach_partitions(partitions.members_path)
+
+    assert [doc_id for doc_id, _ in index.search("revenue", 10, ["y"])] == ["b"]
+    assert index.search("revenue", 10, []) == []
+
+
+def test_search_by_partition_needs_attached_partitions(index):
+    with pytest.raises(ValueError):
+        index.search("revenue", 10, ["x"])
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
@@ -0,0 +1,105 @@
+import json
+from typing import Dict, List
+import pytest
+from langchain.schema import Document
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Write source files and return a function chunking them by line."""
+    directory = tmp_path / "docs"
+    directory.mkdir()
+    files = {
+        "revenue.txt": "Revenue grew twelve percent\nMargins held steady",
+        "people.txt": "Headcount reached four hundred\nAttrition fell",
+        "travel.txt": "The offsite moved to the mountains",
+    }
+    for name, text in files.items():
+        (directory / name).write_text(text)
+
+    def chunks() -> List[Document]:
+        return [
+            Document(
+                page_content=line,
+                metadata={"source": str(path), "page": 0},
+            )
+            for path in sorted(directory.iterdir())
+            for line in path.read_text().splitlines()
+        ]
+
+    chunks.directory = directory
+    return chunks
+
+
+def _manifest(store) -> Dict:
+    return json.loads(store._manifest_path().read_text())
+
+
+def _sources(store, query: str) -> List[str]:
+    return [doc.metadata["source"] for doc in store.retrieve(query).documents]
+
+
+def test_first_build_embeds_every_chunk(make_store, embeddings, corpus):
+    store = make_store()
+    store.create_vector_store(corpus())
+
+    assert len(embeddings.embedded) == 5
+    manifest = _manifest(store)
+    assert set(manifest["files"]) == {doc.metadata["source"] for doc in corpus()}
+    assert sum(len(entry["chunks"]) for entry in manifest["files"].values()) == 5
+
+
+def test_unchanged_corpus_is_loaded_without_embedding(make_store, embeddings, corpus):
+    make_store().create_vector_store(corpus())
+    embeddings.embedded.clear()
+
+    store = make_store()
+    store.create_vector_store(corpus())
+
+    assert embeddings.embedded == []
+    assert str(corpus.directory / "travel.txt") in _sources(store, "offsite mountains")
+
+
+def test_changed_file_embeds_only_its_new_chunks(make_store, embeddings, corpus):
+    make_store().create_vector_store(corpus())
+    embeddings.embedded.clear()
+    (corpus.directory / "revenue.txt").write_text(
+        "Revenue grew twelve percent\nMargins narrowed sharply"
+    )
+
+    store = make_store()
+    store.create_vector_store(corpus())
+
+    assert embeddings.embedded == ["Margins narrowed sharply"]
+    texts = [doc.page_content for doc in store.retrieve("margins").documents]
+    assert "Margins narrowed sharply" in texts
+    assert "Margins held steady" not in texts
+    assert (
+        len(_manifest(store)["files"][str(corpus.directory / "revenue.txt")]["chunks"])
+        == 2
+    )
+
+
+def test_deleted_file_is_pruned_under_the_loaded_directory(make_store, corpus):
+    make_store().create_vector_store(corpus())
+    removed = str(corpus.directory / "travel.txt")
+    (corpus.directory / "travel.txt").unlink()
+
+    store = make_store()
+    store.create_vector_store(corpus(), prune=[str(corpus.directory)])
+
+    assert removed not in _manifest(store)["files"]
+    assert removed not in _sources(store, "offsite mountains")
+
+
+def test_sources_outside_prune_are_kept(make_store, corpus):
+    make_store().create_vector_store(corpus())
+    revenue = str(corpus.directory / "revenue.txt")
+
+    store = make_store()
+    store.create_vector_store(
+        [doc for doc in corpus() if doc.metadata["source"] == revenue],
+        prune=[revenue],
+    )
+
+    assert len(_manifest(store)["files"]) == 3